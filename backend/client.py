@@ -0,0 +1,64 @@
+import importlib.util
+
+import httpx
+from backend.config import BackendConfig, BackendPoolConfig
+from util.value_util import get_env_or_default
+
+
+def read_config_from_system() -> BackendConfig:
+    return BackendConfig(
+        url=get_env_or_default("TELEGRAM_BACKEND_URL", "http://docker-prod-1:8080/service/model/chat"),
+        timeout=float(get_env_or_default("TELEGRAM_BACKEND_TIMEOUT", "300")),
+        http2=get_env_or_default("TELEGRAM_BACKEND_HTTP2", "false").lower() in ['1', 'true', 'yes'],
+    )
+
+
+def read_pool_config_from_system() -> BackendPoolConfig:
+    return BackendPoolConfig(
+        max_connections=int(get_env_or_default("TELEGRAM_BACKEND_MAX_CONNECTIONS", "100")),
+        max_keepalive=int(get_env_or_default("TELEGRAM_BACKEND_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(get_env_or_default("TELEGRAM_BACKEND_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def create_client_from_config(config: BackendConfig, pool: BackendPoolConfig) -> httpx.AsyncClient:
+    http2 = config.http2
+    # http2 依赖 h2 包, 未安装时退回 http/1.1
+    if http2 and importlib.util.find_spec("h2") is None:
+        print('h2 package not found, fallback to http/1.1')
+        http2 = False
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout=config.timeout),
+        limits=httpx.Limits(
+            max_connections=pool.max_connections,
+            max_keepalive_connections=pool.max_keepalive,
+            keepalive_expiry=pool.keepalive_expiry,
+        ),
+        http2=http2,
+        headers={
+            "Cache-control": "no-cache",
+        },
+    )
+
+
+class BackendClientManager:
+    def __init__(self, config: BackendConfig, pool: BackendPoolConfig):
+        self.config = config
+        self.pool = pool
+        self.client: httpx.AsyncClient | None = None
+
+    def configure(self, config: BackendConfig, pool: BackendPoolConfig):
+        self.config = config
+        self.pool = pool
+
+    # 借用共享客户端 (应用生命周期内复用连接池)
+    def borrow_client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = create_client_from_config(self.config, self.pool)
+        return self.client
+
+    async def shutdown(self):
+        client = self.client
+        self.client = None
+        if client is not None and not client.is_closed:
+            await client.aclose()
@@ -0,0 +1,12 @@
+class BackendConfig:
+    def __init__(self, url: str, timeout: float, http2: bool):
+        self.url = url
+        self.timeout = timeout
+        self.http2 = http2
+
+
+class BackendPoolConfig:
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
@@ -0,0 +1,243 @@
+from collections import OrderedDict
+
+from model.data.d_chat import ChatContent, ChatMessage
+
+
+# 单个问题节点及其回复
+class ContextNode:
+    # 估算内存占用时每个节点的固定开销
+    OVERHEAD = 200
+
+    def __init__(self, id: int, parent_id: int, type: int, content: str):
+        self.id = id
+        self.parent_id = parent_id
+        self.type = type
+        self.content = content
+        self.answer_type: int | None = None
+        self.answer: str | None = None
+        # 覆盖本问题及其全部祖先问题的最新摘要问题 id
+        self.summary_id: int | None = None
+
+    def size(self) -> int:
+        size = self.OVERHEAD + len(self.content or '')
+        if self.answer is not None:
+            size += len(self.answer)
+        return size
+
+
+# 摘要问题/回复的数据类型
+SUMMARY_TYPE = 2
+
+
+def to_chat_content(t: int, content: str) -> ChatContent | None:
+    match t:
+        case 0 | 2:
+            return ChatContent(t='text', text=content)
+        case 1:
+            return ChatContent(t='image_url', image_url=content)
+    return None
+
+
+# 单个会话的问题树
+class SessionContext:
+    # 按分支加载, 只包含已访问过的分支
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.nodes: dict[int, ContextNode] = {}
+        self.size = 0
+
+    def add_question(self, id: int, parent_id: int, type: int, content: str) -> ContextNode:
+        node = self.nodes.get(id)
+        if node is not None:
+            return node
+        node = ContextNode(id, parent_id, type, content)
+        self.nodes[id] = node
+        self.size += node.size()
+        if type == SUMMARY_TYPE:
+            self.link_summary(node)
+        return node
+
+    # 摘要问题挂在被覆盖的最后一个问题下
+    def link_summary(self, node: ContextNode):
+        parent = self.nodes.get(node.parent_id)
+        if parent is not None and (parent.summary_id is None or parent.summary_id < node.id):
+            parent.summary_id = node.id
+
+    def summary_of(self, node: ContextNode) -> ContextNode | None:
+        if node.summary_id is None:
+            return None
+        summary = self.nodes.get(node.summary_id)
+        if summary is None or summary.answer is None:
+            return None
+        return summary
+
+    # 回复到达时问题不在树中 (例如被淘汰后重新加载前), 忽略即可
+    def add_answer(self, question_id: int, type: int, content: str) -> bool:
+        node = self.nodes.get(question_id)
+        if node is None:
+            return False
+        self.size -= node.size()
+        node.answer_type = type
+        node.answer = content
+        self.size += node.size()
+        return True
+
+    @staticmethod
+    def to_messages(node: ContextNode, content_type: str) -> list[dict]:
+        result = []
+        content = to_chat_content(node.type, node.content)
+        if content is None:
+            return result
+        if content_type == 'multiple':
+            result.append(ChatMessage(role='user', content=[content]).to_map())
+        else:
+            result.append(ChatMessage(role='user', content=content.text).to_map())
+        if node.answer is not None:
+            answer = to_chat_content(node.answer_type, node.answer)
+            if content_type == 'multiple':
+                result.append(ChatMessage(role='assistant', content=[answer]).to_map())
+            else:
+                result.append(ChatMessage(role='assistant', content=answer.text).to_map())
+        return result
+
+    # 从指定问题沿 parent_id 回溯, 返回按顺序排列的分支节点; 遇到已生成摘要的问题时以摘要代替它和全部祖先
+    # 分支上有问题不在树中时返回 None
+    def path_nodes(self, question_id: int) -> list[ContextNode] | None:
+        nodes = []
+        ptr = question_id
+        while ptr is not None and ptr != 0:
+            node = self.nodes.get(ptr)
+            if node is None:
+                return None
+            summary = self.summary_of(node)
+            if summary is not None:
+                nodes.append(summary)
+                break
+            nodes.append(node)
+            if len(nodes) > len(self.nodes):
+                # parent_id 成环, 数据异常
+                return None
+            ptr = node.parent_id
+        nodes.reverse()
+        return nodes
+
+    def path(self, question_id: int, content_type: str = 'multiple') -> list[dict] | None:
+        nodes = self.path_nodes(question_id)
+        if nodes is None:
+            return None
+        result = []
+        for node in nodes:
+            result.extend(self.to_messages(node, content_type))
+        return result
+
+
+# 会话上下文 LRU 缓存
+class ContextCache:
+    """
+    按会话 id 缓存问题树, 避免每条消息都全量加载会话
+    - 首次访问时由调用方加载并 put(), 之后保存问题/回复时追加到缓存
+    - 加载前调用 begin_load() 取得版本, 加载期间该会话有写入 (追加/失效) 时 put() 放弃缓存, 避免丢失并发写入的行
+    - 会话数超过 max_sessions 或估算内存超过 max_bytes 时淘汰最久未使用的会话
+    - 单个会话超过 max_bytes 时不缓存
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sessions: OrderedDict[int, SessionContext] = OrderedDict()
+        self.size = 0
+        # 正在加载的会话: 会话 id -> 进行中的加载数 / 写入版本
+        self.loading: dict[int, int] = {}
+        self.versions: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # 开始从数据库加载会话, 返回当前写入版本
+    def begin_load(self, session_id: int) -> int:
+        self.loading[session_id] = self.loading.get(session_id, 0) + 1
+        return self.versions.setdefault(session_id, 0)
+
+    # 结束加载 (加载失败时也需调用)
+    def end_load(self, session_id: int):
+        count = self.loading.get(session_id, 0) - 1
+        if count > 0:
+            self.loading[session_id] = count
+        else:
+            self.loading.pop(session_id, None)
+            self.versions.pop(session_id, None)
+
+    def _touch(self, session_id: int):
+        if session_id in self.loading:
+            self.versions[session_id] = self.versions.get(session_id, 0) + 1
+
+    def get(self, session_id: int) -> SessionContext | None:
+        context = self.sessions.get(session_id)
+        if context is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.sessions.move_to_end(session_id)
+        return context
+
+    # 放入加载完成的会话, version 为 begin_load() 的返回值
+    def put(self, context: SessionContext, version: int = None):
+        session_id = context.session_id
+        changed = version is not None and self.versions.get(session_id, 0) != version
+        if version is not None:
+            self.end_load(session_id)
+        self._drop(session_id)
+        if changed or context.size > self.max_bytes:
+            return
+        self.sessions[context.session_id] = context
+        self.size += context.size
+        self._evict()
+
+    def append_question(self, session_id: int, id: int, parent_id: int, type: int, content: str):
+        self._touch(session_id)
+        context = self.sessions.get(session_id)
+        if context is None:
+            return
+        before = context.size
+        context.add_question(id, parent_id, type, content)
+        self.size += context.size - before
+        self._evict()
+
+    def append_answer(self, session_id: int, question_id: int, type: int, content: str):
+        self._touch(session_id)
+        context = self.sessions.get(session_id)
+        if context is None:
+            return
+        before = context.size
+        if not context.add_answer(question_id, type, content):
+            # 树不完整, 下次访问时重新加载
+            self.invalidate(session_id)
+            return
+        self.size += context.size - before
+        self._evict()
+
+    def invalidate(self, session_id: int):
+        self._touch(session_id)
+        self._drop(session_id)
+
+    def _drop(self, session_id: int):
+        context = self.sessions.pop(session_id, None)
+        if context is not None:
+            self.size -= context.size
+
+    def _evict(self):
+        while len(self.sessions) > 0 and (len(self.sessions) > self.max_sessions or self.size > self.max_bytes):
+            _, context = self.sessions.popitem(last=False)
+            self.size -= context.size
+            self.evictions += 1
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'sessions': len(self.sessions),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'evictions': self.evictions,
+        }
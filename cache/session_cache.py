@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+
+
+# 会话目录项
+class SessionEntry:
+    def __init__(self, id: int, name: str, factory: str, model: str, latest_question_id: int | None = None):
+        self.id = id
+        self.name = name
+        self.factory = factory
+        self.model = model
+        # 最新 (非摘要) 问题 id, None 表示未加载
+        self.latest_question_id = latest_question_id
+
+
+# 单个用户在单个工厂下的会话目录
+class SessionDirectory:
+    def __init__(self, user_id: int, factory: str, entries: list[SessionEntry], complete: bool = True):
+        self.user_id = user_id
+        self.factory = factory
+        self.loaded_at = time.monotonic()
+        # 是否包含该用户的全部会话 (会话过多时只缓存最近的部分)
+        self.complete = complete
+        # 名称按 casefold 后的值索引, 与 MySQL _ci 排序规则下的等值比较一致
+        self.by_name: dict[str, SessionEntry] = {}
+        self.by_id: dict[int, SessionEntry] = {}
+        # 按 id 倒序 (最近创建的在前)
+        self.recent: list[SessionEntry] = []
+        for entry in sorted(entries, key=lambda e: e.id, reverse=True):
+            self.by_name.setdefault(entry.name.casefold(), entry)
+            self.by_id[entry.id] = entry
+            self.recent.append(entry)
+
+    def add(self, entry: SessionEntry):
+        self.by_name[entry.name.casefold()] = entry
+        self.by_id[entry.id] = entry
+        self.recent.insert(0, entry)
+
+    # 按名称查找 (不区分大小写)
+    def find(self, name: str) -> SessionEntry | None:
+        return self.by_name.get(name.casefold())
+
+    def last(self) -> SessionEntry | None:
+        return self.recent[0] if len(self.recent) > 0 else None
+
+    # 按 id 倒序的游标分页, 与 session_repo.get_session_page 语义一致 (名称匹配不区分大小写, 同 LIKE)
+    def page(self, limit: int, before_id: int = None, search: str = None) -> tuple[list[SessionEntry], bool]:
+        result = []
+        if search is not None:
+            search = search.casefold()
+        for entry in self.recent:
+            if before_id is not None and entry.id >= before_id:
+                continue
+            if search is not None and search != '' and search not in entry.name.casefold():
+                continue
+            result.append(entry)
+            if len(result) > limit:
+                break
+        return result[:limit], len(result) > limit
+
+
+# 会话目录缓存
+class SessionDirectoryCache:
+    """
+    按 (用户 id, 工厂) 缓存会话名称/id/模型和最近问题, 菜单操作无需每步查询数据库
+    - 首次访问时由调用方加载并 put(), 新建会话/保存问题时写穿到缓存
+    - 目录超过 ttl 秒后失效重新加载, 以感知其他实例的写入
+    - 目录数超过 max_users 时淘汰最久未使用的目录
+    - 目录不完整 (complete=False) 时, 未命中的名称查询仍需回查数据库
+    """
+
+    def __init__(self, max_users: int = 10000, ttl: float = 600, max_entries: int = 500):
+        self.max_users = max_users
+        self.ttl = ttl
+        # 单个目录最多缓存的会话数
+        self.max_entries = max_entries
+        self.directories: OrderedDict[tuple[int, str], SessionDirectory] = OrderedDict()
+        # 会话 id -> 目录键, 用于按会话写穿最近问题
+        self.session_keys: dict[int, tuple[int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int, factory: str) -> SessionDirectory | None:
+        key = (user_id, factory)
+        directory = self.directories.get(key)
+        if directory is not None and time.monotonic() - directory.loaded_at > self.ttl:
+            self.invalidate(user_id, factory)
+            directory = None
+        if directory is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.directories.move_to_end(key)
+        return directory
+
+    def put(self, directory: SessionDirectory):
+        self.invalidate(directory.user_id, directory.factory)
+        key = (directory.user_id, directory.factory)
+        self.directories[key] = directory
+        for session_id in directory.by_id:
+            self.session_keys[session_id] = key
+        while len(self.directories) > self.max_users:
+            _, evicted = self.directories.popitem(last=False)
+            self._forget(evicted)
+            self.evictions += 1
+
+    def add_session(self, user_id: int, entry: SessionEntry):
+        directory = self.directories.get((user_id, entry.factory))
+        if directory is None:
+            return
+        directory.add(entry)
+        self.session_keys[entry.id] = (user_id, entry.factory)
+
+    # 按会话 id 查找已缓存的目录项 (不计入命中率)
+    def entry(self, session_id: int) -> SessionEntry | None:
+        key = self.session_keys.get(session_id)
+        if key is None:
+            return None
+        return self.directories[key].by_id.get(session_id)
+
+    def set_latest_question(self, session_id: int, question_id: int):
+        entry = self.entry(session_id)
+        if entry is not None and (entry.latest_question_id is None or entry.latest_question_id < question_id):
+            entry.latest_question_id = question_id
+
+    def invalidate(self, user_id: int, factory: str):
+        directory = self.directories.pop((user_id, factory), None)
+        if directory is not None:
+            self._forget(directory)
+
+    def _forget(self, directory: SessionDirectory):
+        for session_id in directory.by_id:
+            self.session_keys.pop(session_id, None)
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'directories': len(self.directories),
+            'sessions': len(self.session_keys),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'evictions': self.evictions,
+        }
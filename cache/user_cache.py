@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+
+# 用户资料指纹: 名称/语言等会被 upsert 覆盖的字段
+def profile_fingerprint(first_name: str, last_name: str, full_name: str, is_bot: int, language_code: str) -> int:
+    return hash((first_name, last_name, full_name, is_bot, language_code))
+
+
+# 用户资料指纹 LRU 缓存
+class UserProfileCache:
+    """
+    按 Telegram 用户 id 记录最近一次写入数据库的资料指纹
+    - 指纹未变化的用户无需再次 upsert
+    - 只在写入成功后记录, 写入失败时清除, 保证缓存不领先于数据库
+    - 进程重启后缓存为空, 每个用户首次访问时写入一次
+    """
+
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self.users: OrderedDict[int, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def is_changed(self, user_id: int, fingerprint: int) -> bool:
+        if self.users.get(user_id) == fingerprint:
+            self.hits += 1
+            self.users.move_to_end(user_id)
+            return False
+        self.misses += 1
+        return True
+
+    def remember(self, user_id: int, fingerprint: int):
+        self.users[user_id] = fingerprint
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+    def forget(self, user_id: int):
+        self.users.pop(user_id, None)
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'users': len(self.users),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+        }
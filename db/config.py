@@ -8,6 +8,9 @@ class DBConfig:
         self.database = database
 
     def get_link(self) -> str:
+        # sqlite 只需要文件路径
+        if self.db_type is not None and self.db_type.startswith("sqlite"):
+            return f"{self.db_type}:///{self.database}"
         link = f"{self.db_type}://{self.username}:{self.password}@{self.host}$port/{self.database}"
         mask = ""
         if self.port is not None and self.port != 0:
@@ -25,3 +28,24 @@ class DBPoolConfig:
 class DBConnConfig:
     def __init__(self, limit: int):
         self.limit = limit
+
+
+class DBWriteConfig:
+    def __init__(self, max_rows: int, max_delay: float, maxsize: int):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+
+
+class DBRouterConfig:
+    def __init__(self, replicas: list[str], sticky: float, max_lag: float, retry: float, interval: float):
+        # 只读副本连接串
+        self.replicas = replicas
+        # 用户写入后读主库的时长 (秒)
+        self.sticky = sticky
+        # 副本允许的最大复制延迟 (秒)
+        self.max_lag = max_lag
+        # 副本故障后暂停使用的时长 (秒)
+        self.retry = retry
+        # 复制延迟检测间隔 (秒)
+        self.interval = interval
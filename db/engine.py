@@ -1,22 +1,70 @@
-import atexit
+import asyncio
 import os
-import threading
 import time
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from db.config import DBConfig
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from db.config import DBConfig, DBPoolConfig, DBConnConfig
+from util.value_util import get_env_or_default
 
+# 同步驱动 -> asyncio 驱动
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
 
-def create_engine_from_config(config: DBConfig):
+# asyncio 驱动 -> 同步驱动 (租约等同步代码使用)
+SYNC_DRIVERS = {
+    "mysql+aiomysql": "mysql+pymysql",
+    "mysql+asyncmy": "mysql+pymysql",
+    "sqlite+aiosqlite": "sqlite",
+}
+
+
+def to_async_config(config: DBConfig) -> DBConfig:
+    db_type = ASYNC_DRIVERS.get(config.db_type, config.db_type)
+    return DBConfig(
+        username=config.username,
+        password=config.password,
+        host=config.host,
+        port=config.port,
+        database=config.database,
+        db_type=db_type,
+    )
+
+
+# 将连接串的同步驱动替换为 asyncio 驱动
+def to_async_link(link: str) -> str:
+    scheme, rest = link.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+# 将连接串的 asyncio 驱动替换为同步驱动
+def to_sync_link(link: str) -> str:
+    scheme, rest = link.split("://", 1)
+    return f"{SYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def create_engine_from_config(config: DBConfig, pool: DBPoolConfig, conn: DBConnConfig) -> AsyncEngine:
+    config = to_async_config(config)
     print(config.get_link())
-    return create_engine(
-        config.get_link(),
-        echo=True,
-        max_overflow=0,
-        pool_size=40,
-        pool_timeout=30,
-        pool_recycle=10
+    return create_engine_from_link(config.get_link(), pool, conn)
+
+
+def create_engine_from_link(link: str, pool: DBPoolConfig, conn: DBConnConfig) -> AsyncEngine:
+    link = to_async_link(link)
+    if link.startswith("sqlite"):
+        return create_async_engine(link)
+    # 常驻连接数为 size, 突发时最多扩展到 limit
+    return create_async_engine(
+        link,
+        pool_size=pool.size,
+        max_overflow=max(conn.limit - pool.size, 0),
+        pool_timeout=pool.timeout,
+        pool_recycle=pool.recycle,
+        pool_pre_ping=True,
     )
 
 
@@ -39,52 +87,98 @@ def read_config_from_system() -> DBConfig:
     return conf
 
 
+def read_pool_config_from_system() -> DBPoolConfig:
+    return DBPoolConfig(
+        size=int(get_env_or_default("TELEGRAM_DB_CORE_POOL_SIZE", "4")),
+        timeout=float(get_env_or_default("TELEGRAM_DB_POOL_TIMEOUT", "30")),
+        recycle=int(get_env_or_default("TELEGRAM_DB_POOL_RECYCLE", "3600")),
+    )
+
+
+def read_conn_config_from_system() -> DBConnConfig:
+    return DBConnConfig(
+        limit=int(get_env_or_default("TELEGRAM_DB_MAX_POOL_SIZE", "100")),
+    )
+
+
 class DBSessionManager:
-    def __init__(self, core: int = 4, limit: int = 100):
-        self.engine = create_engine_from_config(read_config_from_system())
-        self.db_session = sessionmaker(bind=self.engine)
-        self.session_pool = []
-        self.core = core
-        self.used = core
-        for i in range(core):
-            self.session_pool.append(self.db_session())
-        self.lock = threading.Lock()
-        self.limit = limit
-        atexit.register(self.shutdown)
-
-    def borrow_session(self) -> Session | None:
+    """
+    数据库会话管理: 应用内唯一的引擎与连接池在首次借用时创建,
+    借出的会话数受 DBConnConfig.limit 约束, 超出时等待归还 (最长 DBPoolConfig.timeout 秒)
+    - link 为空时使用 TELEGRAM_DB_* 配置的主库, 否则连接指定的库 (只读副本)
+    """
+    def __init__(self, pool: DBPoolConfig, conn: DBConnConfig, link: str = None):
+        self.pool = pool
+        self.conn = conn
+        self.link = link
+        self.engine: AsyncEngine | None = None
+        self.db_session: async_sessionmaker | None = None
+        self.semaphore = asyncio.Semaphore(conn.limit)
+        # 指标: 借用次数, 累计/最大等待时间, 当前借出数, 最大借出数, 超时次数
+        self.borrowed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+        self.in_use_max = 0
+        self.timeouts = 0
+
+    def configure(self, pool: DBPoolConfig, conn: DBConnConfig):
+        self.pool = pool
+        self.conn = conn
+        self.semaphore = asyncio.Semaphore(conn.limit)
+
+    def get_engine(self) -> AsyncEngine:
+        if self.engine is None:
+            if self.link is None:
+                self.engine = create_engine_from_config(read_config_from_system(), self.pool, self.conn)
+            else:
+                self.engine = create_engine_from_link(self.link, self.pool, self.conn)
+            self.db_session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        return self.engine
+
+    # 借用会话, 借出数达到上限时等待
+    async def borrow_session(self) -> AsyncSession:
+        self.get_engine()
+        begin = time.monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.pool.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        wait = time.monotonic() - begin
+        self.borrowed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.in_use += 1
+        self.in_use_max = max(self.in_use_max, self.in_use)
         return self.db_session()
-        # self.lock.acquire()
-        # try:
-        #     if len(self.session_pool) <= 0:
-        #         if self.used < self.limit:
-        #             self.used += 1
-        #             return self.db_session()
-        #         return None
-        #     session = self.session_pool[0]
-        #     self.session_pool = self.session_pool[1:]
-        # finally:
-        #     self.lock.release()
-        # return session
-
-    def return_session(self, session: Session):
-        session.flush()
-        session.close()
-        # self.lock.acquire()
-        # try:
-        #     if len(self.session_pool) > self.core:
-        #         session.flush()
-        #         session.close()
-        #         self.used -= 1
-        #     else:
-        #         self.session_pool.append(session)
-        # finally:
-        #     self.lock.release()
-
-    def shutdown(self):
-        def clean_up():
-            while len(self.session_pool) < self.used:
-                time.sleep(1000)
-            for session in self.session_pool:
-                session.close()
-        return clean_up
+
+    async def return_session(self, session: AsyncSession):
+        try:
+            await session.close()
+        finally:
+            self.in_use -= 1
+            self.semaphore.release()
+
+    # 连接池指标
+    def metrics(self) -> dict:
+        result = {
+            'limit': self.conn.limit,
+            'in_use': self.in_use,
+            'in_use_max': self.in_use_max,
+            'utilisation': self.in_use / self.conn.limit if self.conn.limit > 0 else 0.0,
+            'borrowed': self.borrowed,
+            'wait_avg': self.wait_total / self.borrowed if self.borrowed > 0 else 0.0,
+            'wait_max': self.wait_max,
+            'timeouts': self.timeouts,
+        }
+        if self.engine is not None:
+            result['pool'] = self.engine.pool.status()
+        return result
+
+    async def shutdown(self):
+        engine = self.engine
+        self.engine = None
+        self.db_session = None
+        if engine is not None:
+            await engine.dispose()
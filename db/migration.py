@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import sys
+from typing import Callable
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# 版本表
+version_metadata = MetaData()
+t_schema_version = Table(
+    't_schema_version', version_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),  # 版本号
+    Column('name', String(100), nullable=False),  # 迁移名称
+    Column('applied_at', DateTime, nullable=False),  # 执行时间
+)
+
+
+# 单个迁移
+class Migration:
+    """
+    - upgrade/downgrade 接收同步 Connection, 在同一事务中执行 (MySQL DDL 会隐式提交)
+    - 迁移需要可重复执行: 建表/建索引使用 checkfirst, 以兼容按 README 手工建好的库
+    """
+
+    def __init__(self, version: int, name: str, upgrade: Callable[[Connection], None],
+                 downgrade: Callable[[Connection], None]):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.downgrade = downgrade
+
+
+# 迁移执行器
+class Migrator:
+    def __init__(self, engine: AsyncEngine, migrations: list[Migration]):
+        self.engine = engine
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+
+    def latest(self) -> int:
+        return self.migrations[-1].version if len(self.migrations) > 0 else 0
+
+    @staticmethod
+    def _current(conn: Connection) -> int:
+        version_metadata.create_all(conn, checkfirst=True)
+        versions = conn.execute(select(t_schema_version.c.version)).scalars().all()
+        return max(versions) if len(versions) > 0 else 0
+
+    async def current(self) -> int:
+        async with self.engine.begin() as conn:
+            return await conn.run_sync(self._current)
+
+    # 升级到 target (默认最新版本), 返回执行的迁移版本
+    async def upgrade(self, target: int = None) -> list[int]:
+        if target is None:
+            target = self.latest()
+        applied = []
+        current = await self.current()
+        for migration in self.migrations:
+            if migration.version <= current or migration.version > target:
+                continue
+            async with self.engine.begin() as conn:
+                await conn.run_sync(migration.upgrade)
+                await conn.execute(t_schema_version.insert().values(
+                    version=migration.version, name=migration.name, applied_at=datetime.datetime.now()))
+            print(f'migration {migration.version} {migration.name} applied')
+            applied.append(migration.version)
+        return applied
+
+    # 回退到 target (不含), 返回回退的迁移版本
+    async def downgrade(self, target: int) -> list[int]:
+        reverted = []
+        current = await self.current()
+        for migration in reversed(self.migrations):
+            if migration.version > current or migration.version <= target:
+                continue
+            async with self.engine.begin() as conn:
+                await conn.run_sync(migration.downgrade)
+                await conn.execute(t_schema_version.delete().where(t_schema_version.c.version == migration.version))
+            print(f'migration {migration.version} {migration.name} reverted')
+            reverted.append(migration.version)
+        return reverted
+
+
+# python -m db.migration [current | upgrade [version] | downgrade version]
+async def run_command(args: list[str]):
+    from db.migrations import MIGRATIONS
+    from provider.db import TelegramBotDBManager
+    from provider.id import init_id_lease, shutdown_id_lease
+    migrator = Migrator(TelegramBotDBManager.get_engine(), MIGRATIONS)
+    # 与机器人进程一样先获取 worker id 租约, 迁移中分配的主键不会与在线实例冲突
+    await init_id_lease()
+    try:
+        command = args[0] if len(args) > 0 else 'upgrade'
+        match command:
+            case 'current':
+                print(await migrator.current())
+            case 'upgrade':
+                await migrator.upgrade(int(args[1]) if len(args) > 1 else None)
+            case 'downgrade':
+                await migrator.downgrade(int(args[1]))
+            case _:
+                print(f'unknown command: {command}')
+    finally:
+        await shutdown_id_lease()
+        await TelegramBotDBManager.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(run_command(sys.argv[1:]))
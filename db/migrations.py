@@ -0,0 +1,102 @@
+from sqlalchemy import Connection, func, inspect, select, text
+
+from db.migration import Migration
+from db.router import HEARTBEAT_TABLE
+from model.db.t_answer import TAnswer
+from model.db.t_question import TQuestion
+from model.db.t_search_backfill import TSearchBackfill
+from model.db.t_session import TSession
+from model.db.t_user import TUser
+from search.index import MySQLFullTextIndex, SQLiteFTSIndex, SearchIndex, KIND_SESSION, KIND_QUESTION, KIND_ANSWER
+
+CORE_TABLES = [TUser.__table__, TSession.__table__, TQuestion.__table__, TAnswer.__table__]
+
+
+def create_core_tables(conn: Connection):
+    for table in CORE_TABLES:
+        table.create(conn, checkfirst=True)
+
+
+def drop_core_tables(conn: Connection):
+    for table in reversed(CORE_TABLES):
+        table.drop(conn, checkfirst=True)
+
+
+def create_search_table(conn: Connection):
+    index = SQLiteFTSIndex(None) if conn.dialect.name == 'sqlite' else MySQLFullTextIndex(None)
+    for statement in index.schema():
+        conn.execute(text(statement))
+
+
+def drop_search_table(conn: Connection):
+    conn.execute(text(f"DROP TABLE IF EXISTS {SearchIndex.TABLE}"))
+
+
+# 热点查询使用的复合索引: (表, 索引名, 列)
+# 迁移内容固定为执行时的结构, 不直接引用模型上的索引定义
+HOT_QUERY_INDEXES = [
+    # get_latest_question / 按会话加载问题: session_id + is_deleted 过滤, 按 id 排序
+    ('t_question', 'idx_question_session', ['session_id', 'is_deleted', 'id']),
+    # 摘要问题查找: session_id + parent_id
+    ('t_question', 'idx_question_parent', ['session_id', 'parent_id']),
+    # 按会话加载回复
+    ('t_answer', 'idx_answer_session', ['session_id']),
+    # 按问题加载回复 (分支加载)
+    ('t_answer', 'idx_answer_question', ['question_id']),
+    # get_last_session / 会话分页: user_id + factory 过滤, 按 id 倒序
+    ('t_session', 'idx_session_user_factory', ['user_id', 'factory', 'id']),
+]
+
+
+def index_names(conn: Connection, table: str) -> set[str]:
+    return {index['name'] for index in inspect(conn).get_indexes(table)}
+
+
+def create_hot_query_indexes(conn: Connection):
+    for table, name, columns in HOT_QUERY_INDEXES:
+        if name not in index_names(conn, table):
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+
+
+def drop_hot_query_indexes(conn: Connection):
+    for table, name, _ in reversed(HOT_QUERY_INDEXES):
+        if name in index_names(conn, table):
+            drop = f"DROP INDEX {name}" if conn.dialect.name == 'sqlite' else f"DROP INDEX {name} ON {table}"
+            conn.execute(text(drop))
+
+
+# 复制延迟检测心跳表, 只有一行
+def create_heartbeat_table(conn: Connection):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {HEARTBEAT_TABLE} (id INTEGER NOT NULL PRIMARY KEY, beat_at BIGINT NOT NULL)"))
+    if conn.execute(text(f"SELECT id FROM {HEARTBEAT_TABLE} WHERE id = 1")).first() is None:
+        conn.execute(text(f"INSERT INTO {HEARTBEAT_TABLE} (id, beat_at) VALUES (1, 0)"))
+
+
+def drop_heartbeat_table(conn: Connection):
+    conn.execute(text(f"DROP TABLE IF EXISTS {HEARTBEAT_TABLE}"))
+
+
+# 检索文档回填进度: 记录每种文档来源表当前的最大 id 作为截止 id, 之后的行由增量索引写入
+# 回填本身由 search.backfill 在启动后分批执行, 不在迁移事务中进行
+def create_search_backfill_table(conn: Connection):
+    table = TSearchBackfill.__table__
+    table.create(conn, checkfirst=True)
+    sources = {KIND_SESSION: TSession.__table__, KIND_QUESTION: TQuestion.__table__, KIND_ANSWER: TAnswer.__table__}
+    for kind, source in sources.items():
+        if conn.execute(select(table.c.kind).where(table.c.kind == kind)).first() is not None:
+            continue
+        end_id = conn.execute(select(func.coalesce(func.max(source.c.id), 0))).scalar()
+        conn.execute(table.insert().values(kind=kind, last_id=0, end_id=end_id, done=0))
+
+
+def drop_search_backfill_table(conn: Connection):
+    TSearchBackfill.__table__.drop(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, 'create_core_tables', create_core_tables, drop_core_tables),
+    Migration(2, 'create_search_table', create_search_table, drop_search_table),
+    Migration(3, 'add_hot_query_indexes', create_hot_query_indexes, drop_hot_query_indexes),
+    Migration(4, 'create_heartbeat_table', create_heartbeat_table, drop_heartbeat_table),
+    Migration(5, 'create_search_backfill_table', create_search_backfill_table, drop_search_backfill_table),
+]
@@ -0,0 +1,57 @@
+import re
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+# 记录引擎执行的查询语句 (只记录 SELECT / WITH)
+class QueryRecorder:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.statements: list[tuple[str, object]] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine.sync_engine, 'before_cursor_execute', self._record)
+
+
+# 查询计划中的一次全表扫描
+class FullScan:
+    def __init__(self, statement: str, table: str, detail: str):
+        self.statement = statement
+        self.table = table
+        self.detail = detail
+
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)')
+
+
+# 对语句执行 EXPLAIN, 返回其中扫描了 tables 中数据表全部行的步骤
+# - sqlite: EXPLAIN QUERY PLAN 中不带索引的 "SCAN <table>"
+# - mysql: EXPLAIN 中 type = ALL 的行
+async def find_full_scans(engine: AsyncEngine, statement: str, parameters, tables: set[str]) -> list[FullScan]:
+    result = []
+    async with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = (await conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)).all()
+            for row in rows:
+                detail = row[-1]
+                match = _SQLITE_SCAN.match(detail)
+                if match is None or match.group(1) not in tables:
+                    continue
+                if 'INDEX' in detail or 'PRIMARY KEY' in detail or 'VIRTUAL TABLE' in detail:
+                    continue
+                result.append(FullScan(statement, match.group(1), detail))
+        else:
+            rows = (await conn.exec_driver_sql('EXPLAIN ' + statement, parameters)).mappings().all()
+            for row in rows:
+                if row.get('type') == 'ALL' and row.get('table') in tables:
+                    result.append(FullScan(statement, row['table'], str(dict(row))))
+    return result
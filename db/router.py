@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.config import DBRouterConfig
+from db.engine import DBSessionManager
+from util.value_util import get_env_or_default
+
+# 复制延迟检测使用的心跳表 (由迁移创建, 经复制同步到副本)
+HEARTBEAT_TABLE = 't_replica_heartbeat'
+
+# 当前处理的 Telegram 用户, 由每个更新开始时绑定
+current_user: contextvars.ContextVar[int | None] = contextvars.ContextVar('db_current_user', default=None)
+
+
+def read_router_config_from_system() -> DBRouterConfig:
+    replicas = get_env_or_default("TELEGRAM_DB_REPLICAS", "")
+    return DBRouterConfig(
+        replicas=[link.strip() for link in replicas.split(',') if link.strip() != ''],
+        sticky=float(get_env_or_default("TELEGRAM_DB_STICKY_SECONDS", "5")),
+        max_lag=float(get_env_or_default("TELEGRAM_DB_REPLICA_MAX_LAG", "2")),
+        retry=float(get_env_or_default("TELEGRAM_DB_REPLICA_RETRY", "30")),
+        interval=float(get_env_or_default("TELEGRAM_DB_REPLICA_CHECK", "1")),
+    )
+
+
+# 只读副本状态
+class Replica:
+    def __init__(self, manager: DBSessionManager):
+        self.manager = manager
+        # 最近一次检测到的复制延迟 (秒)
+        self.lag = 0.0
+        # 故障后在此时间之前不再使用
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    def available(self, now: float, max_lag: float) -> bool:
+        return now >= self.down_until and self.lag <= max_lag
+
+
+# 读写分离路由
+class DBRouter:
+    """
+    写入始终走主库, 读取在健康的只读副本间轮询
+    - 用户写入后 sticky 秒内, 该用户的读取走主库 (读己之写)
+    - 副本复制延迟超过 max_lag, 或借用连接失败时, 读取退回主库; 故障副本 retry 秒后再尝试
+    - 复制延迟通过主库心跳表检测: 每 interval 秒读取副本上的心跳, 再在主库写入新心跳
+    - 借出连接后查询中途失败不会重试, 由调用方按原有方式处理异常
+    - 未配置副本时所有读取走主库, 行为与直接使用主库一致
+    """
+
+    def __init__(self, primary: DBSessionManager, config: DBRouterConfig):
+        self.primary = primary
+        self.config = config
+        self.replicas = [Replica(DBSessionManager(primary.pool, primary.conn, link)) for link in config.replicas]
+        self._next = 0
+        # 用户 id -> 读主库截止时间
+        self._sticky: dict[int, float] = {}
+        self._last_beat: int | None = None
+        self._task: asyncio.Task | None = None
+        self.primary_reads = 0
+        self.sticky_reads = 0
+
+    def configure(self, config: DBRouterConfig):
+        self.config = config
+        self.replicas = [Replica(DBSessionManager(self.primary.pool, self.primary.conn, link))
+                         for link in config.replicas]
+
+    # 绑定当前更新的用户, 之后的读写按该用户路由
+    @staticmethod
+    def bind_user(user_id: int | None):
+        current_user.set(user_id)
+
+    # 记录用户写入, 开始读己之写窗口
+    def mark_write(self, user_id: int = None):
+        if user_id is None:
+            user_id = current_user.get()
+        if user_id is None or len(self.replicas) == 0:
+            return
+        now = time.monotonic()
+        if len(self._sticky) > 4096:
+            self._sticky = {uid: until for uid, until in self._sticky.items() if until > now}
+        self._sticky[user_id] = now + self.config.sticky
+
+    def is_sticky(self, user_id: int | None) -> bool:
+        if user_id is None:
+            return False
+        until = self._sticky.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def pick(self, user_id: int = None) -> Replica | None:
+        if len(self.replicas) == 0:
+            return None
+        if user_id is None:
+            user_id = current_user.get()
+        if self.is_sticky(user_id):
+            self.sticky_reads += 1
+            return None
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(self._next + offset) % len(self.replicas)]
+            if replica.available(now, self.config.max_lag):
+                self._next = (self._next + offset + 1) % len(self.replicas)
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica, error: Exception):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.config.retry
+        print(f'db replica {replica.manager.link} unavailable: {error}')
+
+    # 借用只读会话: 优先副本, 不可用时退回主库
+    async def borrow_read_session(self, user_id: int = None) -> AsyncSession:
+        replica = self.pick(user_id)
+        if replica is not None:
+            session = None
+            try:
+                session = await replica.manager.borrow_session()
+                # 立即取出连接, 副本不可达时在此处失败并退回主库
+                await session.connection()
+                session.info['db_manager'] = replica.manager
+                replica.reads += 1
+                return session
+            except Exception as e:
+                if session is not None:
+                    await replica.manager.return_session(session)
+                self.mark_down(replica, e)
+        self.primary_reads += 1
+        return await self.primary.borrow_session()
+
+    async def return_session(self, session: AsyncSession):
+        manager = session.info.pop('db_manager', self.primary)
+        await manager.return_session(session)
+
+    def start(self):
+        if len(self.replicas) > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.config.interval)
+            await self.check_lag()
+
+    # 延迟 = 上一次写入主库的心跳 - 副本上读到的心跳
+    async def check_lag(self):
+        now = time.monotonic()
+        for replica in self.replicas:
+            if now < replica.down_until:
+                # 故障暂停期间不检测, 到期后由读取或下一次检测重新尝试
+                continue
+            try:
+                beat = await asyncio.wait_for(self.read_beat(replica.manager), self.config.interval)
+                replica.lag = max(0, self._last_beat - beat) / 1000 if self._last_beat is not None else 0.0
+            except Exception as e:
+                self.mark_down(replica, e)
+        try:
+            now = int(time.time() * 1000)
+            async with self.primary.get_engine().begin() as conn:
+                await conn.execute(text(f"UPDATE {HEARTBEAT_TABLE} SET beat_at = :now WHERE id = 1"), {'now': now})
+            self._last_beat = now
+        except Exception as e:
+            print(f'db heartbeat failed: {e}')
+
+    @staticmethod
+    async def read_beat(manager: DBSessionManager) -> int:
+        session = await manager.borrow_session()
+        try:
+            return int((await session.execute(text(f"SELECT beat_at FROM {HEARTBEAT_TABLE} WHERE id = 1"))).scalar())
+        finally:
+            await manager.return_session(session)
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        return {
+            'primary_reads': self.primary_reads,
+            'sticky_reads': self.sticky_reads,
+            'replicas': [{
+                'link': replica.manager.link.split('@')[-1],
+                'reads': replica.reads,
+                'failures': replica.failures,
+                'lag': replica.lag,
+                'available': replica.available(now, self.config.max_lag),
+            } for replica in self.replicas],
+        }
+
+    async def shutdown(self):
+        task = self._task
+        self._task = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for replica in self.replicas:
+            await replica.manager.shutdown()
@@ -0,0 +1,162 @@
+import asyncio
+from typing import Callable
+
+from db.config import DBWriteConfig
+from db.engine import DBSessionManager
+from util.value_util import get_env_or_default
+
+
+def read_write_config_from_system() -> DBWriteConfig:
+    return DBWriteConfig(
+        max_rows=int(get_env_or_default("TELEGRAM_DB_WRITE_BATCH_ROWS", "200")),
+        max_delay=float(get_env_or_default("TELEGRAM_DB_WRITE_BATCH_MS", "20")) / 1000,
+        maxsize=int(get_env_or_default("TELEGRAM_DB_WRITE_QUEUE_SIZE", "10000")),
+    )
+
+
+class WriteJob:
+    def __init__(self, row, future: asyncio.Future, callback: Callable | None):
+        self.row = row
+        self.future = future
+        self.callback = callback
+
+
+# 写后批量提交队列
+class WriteBehindQueue:
+    """
+    插入行的组提交管线
+    - submit() 把 ORM 对象放入有界队列, 返回提交完成后才完成的 future (队列满时反压调用方)
+    - 单个写入任务每 max_delay 秒或攒够 max_rows 行时, 在一个事务中批量插入并提交
+    - 提交后 ORM 对象的主键已回填; 批次失败时逐行重试, 仍失败的行其 future 以异常完成
+    - 借不到会话 (连接池超时) 时整批 future 以该异常完成, 写入任务继续运行
+    - flush() 等待已提交的行全部落库, shutdown() 排空队列后停止写入任务
+    """
+
+    def __init__(self, manager: DBSessionManager, config: DBWriteConfig):
+        self.manager = manager
+        self.config = config
+        self.queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # 指标: 提交批次数, 写入行数, 失败行数
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+
+    def configure(self, config: DBWriteConfig):
+        self.config = config
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            # 写入任务退出后保留原队列, 未写入的行由新任务继续处理
+            if self.queue is None:
+                self.queue = asyncio.Queue(maxsize=self.config.maxsize)
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    # 提交一行, callback(row, error) 在落库 (或失败) 后调用
+    async def submit(self, row, callback: Callable = None) -> asyncio.Future:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(WriteJob(row, future, callback))
+        return future
+
+    # 等待当前已入队的行全部落库
+    async def flush(self):
+        if self._task is None or self._task.done():
+            return
+        await self.queue.join()
+
+    async def shutdown(self):
+        task = self._task
+        if task is None or task.done():
+            return
+        await self.queue.put(None)
+        await task
+        self._task = None
+        self.queue = None
+
+    # 在一个事务中插入全部行, 失败时返回异常
+    async def _insert(self, jobs: list[WriteJob]) -> Exception | None:
+        try:
+            session = await self.manager.borrow_session()
+        except Exception as e:
+            return e
+        try:
+            session.add_all([job.row for job in jobs])
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            return e
+        finally:
+            await self.manager.return_session(session)
+        return None
+
+    async def _commit(self, jobs: list[WriteJob]):
+        error = await self._insert(jobs)
+        if error is None:
+            self.batches += 1
+            self.rows += len(jobs)
+            self._resolve(jobs, None)
+            return
+        print(f'write batch of {len(jobs)} rows failed: {error}')
+        if len(jobs) == 1 or isinstance(error, asyncio.TimeoutError):
+            # 单行或借不到会话时整批失败
+            self.failed += len(jobs)
+            self._resolve(jobs, error)
+            return
+        # 逐行重试, 避免一行坏数据拖累同批次其他用户的行
+        for job in jobs:
+            error = await self._insert([job])
+            if error is None:
+                self.rows += 1
+            else:
+                self.failed += 1
+                print(f'write row failed: {error}')
+            self._resolve([job], error)
+
+    @staticmethod
+    def _resolve(jobs: list[WriteJob], error: Exception | None):
+        for job in jobs:
+            if not job.future.done():
+                if error is None:
+                    job.future.set_result(job.row)
+                else:
+                    job.future.set_exception(error)
+            if job.callback is not None:
+                try:
+                    job.callback(job.row, error)
+                except Exception as e:
+                    print(f'write callback failed: {e}')
+
+    async def run(self):
+        finished = False
+        while not finished:
+            job = await self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                break
+            jobs = [job]
+            # 从第一行入队开始最多等待 max_delay 秒凑批
+            deadline = asyncio.get_running_loop().time() + self.config.max_delay
+            try:
+                async with asyncio.timeout_at(deadline):
+                    while len(jobs) < self.config.max_rows:
+                        job = await self.queue.get()
+                        if job is None:
+                            finished = True
+                            break
+                        jobs.append(job)
+            except TimeoutError:
+                pass
+            # 超时后取走已就绪的行, 直到批次上限
+            while not finished and len(jobs) < self.config.max_rows and not self.queue.empty():
+                job = self.queue.get_nowait()
+                if job is None:
+                    finished = True
+                    break
+                jobs.append(job)
+            try:
+                await self._commit(jobs)
+            finally:
+                for _ in range(len(jobs) + (1 if finished else 0)):
+                    self.queue.task_done()
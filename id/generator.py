@@ -28,6 +28,13 @@ class DefaultIdGenerator:
 
         self.snowflake = snowflack_m1.SnowFlakeM1(option)
 
+    def suspend(self):
+        """
+        暂停发号 (worker id租约丢失时), 重新设置生成规则后恢复
+        """
+
+        self.snowflake = None
+
     def next_id(self) -> int:
         """
         获取新的UUID
@@ -36,3 +43,12 @@ class DefaultIdGenerator:
         if self.snowflake is None:
             raise ValueError("please set id generator at first.")
         return self.snowflake.next_id()
+
+    def next_ids(self, count: int) -> list[int]:
+        """
+        批量获取新的UUID, 整段预留只获取一次锁
+        """
+
+        if self.snowflake is None:
+            raise ValueError("please set id generator at first.")
+        return self.snowflake.next_ids(count)
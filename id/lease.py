@@ -0,0 +1,287 @@
+"""
+worker id 租约
+"""
+
+# !/usr/bin/python
+# coding=UTF-8
+
+
+import asyncio
+import fcntl
+import logging
+import os
+import time
+import uuid
+
+
+class WorkerLease:
+    """
+    worker id 租约接口
+    - max_worker_id worker_id的最大值(含)
+    - ttl 租约有效期(秒), 持有者需在过期前续期
+    """
+
+    def __init__(self, max_worker_id=63, ttl=15):
+        self.max_worker_id = max_worker_id
+        self.ttl = ttl
+        # 本实例的持有者标识, 续期/释放时只操作自己持有的租约
+        self.owner = uuid.uuid4().hex
+
+    def try_acquire(self, worker_id: int) -> bool:
+        """
+        尝试占用指定worker_id
+        """
+        return False
+
+    def renew(self, worker_id: int) -> bool:
+        """
+        续期, 租约已丢失时返回False
+        """
+        return False
+
+    def release(self, worker_id: int):
+        """
+        释放租约
+        """
+
+    def start_index(self) -> int:
+        """
+        扫描起点, 分散多个实例同时启动时的竞争
+        """
+        return 0
+
+    def acquire(self, rounds=3, backoff=0.2) -> int:
+        """
+        依次扫描所有worker_id, 占用第一个空闲的, 失败返回-1
+        """
+
+        size = self.max_worker_id + 1
+        for attempt in range(rounds):
+            start = self.start_index()
+            for offset in range(size):
+                worker_id = (start + offset) % size
+                try:
+                    if self.try_acquire(worker_id):
+                        return worker_id
+                except Exception as ept:
+                    logging.error(ept)
+            if attempt < rounds - 1:
+                time.sleep(backoff * (attempt + 1))
+        return -1
+
+
+class RedisLease(WorkerLease):
+    """
+    redis租约: 每个worker_id一个键, SET NX EX占用, 值为持有者标识
+    """
+
+    RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+    RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, redis_impl, max_worker_id=63, ttl=15, prefix="IdGen:WorkerId"):
+        super().__init__(max_worker_id, ttl)
+        self.redis_impl = redis_impl
+        self.prefix = prefix
+        self.renew_script = redis_impl.register_script(self.RENEW_SCRIPT)
+        self.release_script = redis_impl.register_script(self.RELEASE_SCRIPT)
+
+    def key(self, worker_id: int) -> str:
+        return f"{self.prefix}:Value:{worker_id}"
+
+    def start_index(self) -> int:
+        return self.redis_impl.incr(f"{self.prefix}:Index") % (self.max_worker_id + 1)
+
+    def try_acquire(self, worker_id: int) -> bool:
+        return bool(self.redis_impl.set(self.key(worker_id), self.owner, nx=True, ex=self.ttl))
+
+    def renew(self, worker_id: int) -> bool:
+        return bool(self.renew_script(keys=[self.key(worker_id)], args=[self.owner, self.ttl]))
+
+    def release(self, worker_id: int):
+        self.release_script(keys=[self.key(worker_id)], args=[self.owner])
+
+
+class TableLease(WorkerLease):
+    """
+    数据表租约 (MySQL, 测试时可用sqlite): 每个worker_id一行, 记录持有者和过期时间(毫秒)
+    - engine 同步SQLAlchemy引擎
+    """
+
+    def __init__(self, engine, max_worker_id=63, ttl=15, table="t_worker_lease"):
+        super().__init__(max_worker_id, ttl)
+        self.engine = engine
+        self.table = table
+        self.created = False
+
+    def create_table(self):
+        from sqlalchemy import text
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "worker_id INTEGER NOT NULL PRIMARY KEY, "
+                "owner VARCHAR(64) NOT NULL, "
+                "expire_at BIGINT NOT NULL)"
+            ))
+        self.created = True
+
+    def try_acquire(self, worker_id: int) -> bool:
+        from sqlalchemy import text
+        from sqlalchemy.exc import IntegrityError
+        if not self.created:
+            self.create_table()
+        now = int(time.time() * 1000)
+        params = {"id": worker_id, "owner": self.owner, "now": now, "expire": now + self.ttl * 1000}
+        # 行不存在时插入, 已存在时只接管已过期的租约
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(
+                    f"INSERT INTO {self.table} (worker_id, owner, expire_at) VALUES (:id, :owner, :expire)"
+                ), params)
+            return True
+        except IntegrityError:
+            pass
+        with self.engine.begin() as conn:
+            result = conn.execute(text(
+                f"UPDATE {self.table} SET owner = :owner, expire_at = :expire "
+                "WHERE worker_id = :id AND expire_at < :now"
+            ), params)
+            return result.rowcount == 1
+
+    def renew(self, worker_id: int) -> bool:
+        from sqlalchemy import text
+        params = {"id": worker_id, "owner": self.owner, "expire": int(time.time() * 1000) + self.ttl * 1000}
+        with self.engine.begin() as conn:
+            result = conn.execute(text(
+                f"UPDATE {self.table} SET expire_at = :expire WHERE worker_id = :id AND owner = :owner"
+            ), params)
+            return result.rowcount == 1
+
+    def release(self, worker_id: int):
+        from sqlalchemy import text
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f"DELETE FROM {self.table} WHERE worker_id = :id AND owner = :owner"
+            ), {"id": worker_id, "owner": self.owner})
+
+
+class FileLease(WorkerLease):
+    """
+    本地文件租约 (单机部署/测试): 每个worker_id一个锁文件, 以flock独占
+    进程退出时锁由操作系统释放, 无需续期
+    """
+
+    def __init__(self, directory, max_worker_id=63):
+        super().__init__(max_worker_id, ttl=0)
+        self.directory = directory
+        self.files = {}
+
+    def try_acquire(self, worker_id: int) -> bool:
+        os.makedirs(self.directory, exist_ok=True)
+        file = open(os.path.join(self.directory, f"worker-{worker_id}.lock"), "a+")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self.files[worker_id] = file
+        return True
+
+    def renew(self, worker_id: int) -> bool:
+        return worker_id in self.files
+
+    def release(self, worker_id: int):
+        file = self.files.pop(worker_id, None)
+        if file is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            file.close()
+
+
+class LeaseKeeper:
+    """
+    在asyncio中持有租约: 获取/续期/释放都在线程中执行, 不阻塞事件循环
+    - on_lost 租约丢失且无法重新获取同一worker_id时回调 (续期持续失败到过期前一个续期间隔也视为丢失)
+    - on_acquired 租约丢失后重新获取到新的worker_id时回调
+    """
+
+    def __init__(self, lease: WorkerLease, on_lost=None, on_acquired=None):
+        self.lease = lease
+        self.on_lost = on_lost
+        self.on_acquired = on_acquired
+        self.worker_id = -1
+        self.renewed_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> int:
+        begin = time.monotonic()
+        self.worker_id = await asyncio.to_thread(self.lease.acquire)
+        self.renewed_at = begin
+        if self.worker_id > -1 and self.lease.ttl > 0:
+            self._task = asyncio.create_task(self.run())
+        return self.worker_id
+
+    def _lost(self):
+        worker_id = self.worker_id
+        self.worker_id = -1
+        logging.error(f"worker id lease {worker_id} lost")
+        if self.on_lost is not None:
+            self.on_lost(worker_id)
+
+    async def run(self):
+        interval = self.lease.ttl / 3
+        # 续期持续失败时在租约过期前一个续期间隔即视为丢失, 避免其他实例接管后仍在发号
+        deadline = self.lease.ttl - interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.worker_id < 0:
+                    # 租约丢失后持续尝试获取新的worker_id
+                    begin = time.monotonic()
+                    worker_id = await asyncio.to_thread(self.lease.acquire)
+                    if worker_id > -1:
+                        self.worker_id = worker_id
+                        self.renewed_at = begin
+                        if self.on_acquired is not None:
+                            self.on_acquired(worker_id)
+                    continue
+                # 以发起续期的时间计算有效期, 续期卡住超过一个间隔按失败处理
+                begin = time.monotonic()
+                renewed = await asyncio.wait_for(asyncio.to_thread(self.lease.renew, self.worker_id), interval)
+                if not renewed:
+                    # 租约已过期, 同一worker_id仍空闲时直接重新占用
+                    renewed = await asyncio.wait_for(
+                        asyncio.to_thread(self.lease.try_acquire, self.worker_id), interval)
+                if renewed:
+                    self.renewed_at = begin
+                else:
+                    self._lost()
+            except Exception as exe:
+                logging.error(f"worker id lease {self.worker_id} renew failed: {exe!r}")
+                if self.worker_id > -1 and time.monotonic() - self.renewed_at >= deadline:
+                    self._lost()
+
+    async def shutdown(self):
+        task = self._task
+        self._task = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.worker_id > -1:
+            try:
+                await asyncio.to_thread(self.lease.release, self.worker_id)
+            except Exception as exe:
+                logging.error(exe)
+            self.worker_id = -1
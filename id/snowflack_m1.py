@@ -113,12 +113,14 @@ class SnowFlakeM1(SnowFlake):
         return self.__calc_id(self.__last_time_tick)
 
     def __calc_id(self, use_time_tick) -> int:
+        # 先取号再自增, 保证序列号不超过 max_seq_number (否则会进位到 worker_id 位)
+        result = (
+                         (use_time_tick << self.__timestamp_shift) +
+                         (self.worker_id << self.seq_bit_length) +
+                         self.__current_seq_number
+                 ) % int(1e64)
         self.__current_seq_number += 1
-        return (
-                       (use_time_tick << self.__timestamp_shift) +
-                       (self.worker_id << self.seq_bit_length) +
-                       self.__current_seq_number
-               ) % int(1e64)
+        return result
 
     def __calc_turn_back_id(self, use_time_tick) -> int:
         self.__turn_back_time_tick -= 1
@@ -139,10 +141,32 @@ class SnowFlakeM1(SnowFlake):
             temp_time_ticker = self.__get_current_time_tick()
         return temp_time_ticker
 
+    def __next_id(self) -> int:
+        if self.__is_over_cost:
+            return self.__next_over_cost_id()
+        return self.__next_normal_id()
+
     def next_id(self) -> int:
         with self.__id_lock:
-            if self.__is_over_cost:
-                nextid = self.__next_over_cost_id()
-            else:
-                nextid = self.__next_normal_id()
-            return nextid
+            return self.__next_id()
+
+    def next_ids(self, count: int) -> list[int]:
+        """
+        批量获取 count 个id, 只获取一次锁
+        每取到一个正常id后, 直接预留同一毫秒内剩余的连续序列号
+        """
+
+        result = []
+        with self.__id_lock:
+            while len(result) < count:
+                first = self.__next_id()
+                result.append(first)
+                # 时间回拨id不连续, 逐个获取
+                base = (self.__last_time_tick << self.__timestamp_shift) + (self.worker_id << self.seq_bit_length)
+                if first != base + self.__current_seq_number - 1:
+                    continue
+                reserve = min(count - len(result), self.max_seq_number - self.__current_seq_number + 1)
+                if reserve > 0:
+                    result.extend(range(first + 1, first + 1 + reserve))
+                    self.__current_seq_number += reserve
+        return result
@@ -17,3 +17,9 @@ class SnowFlake:
         获取新的UUID
         """
         return 0
+
+    def next_ids(self, count: int) -> list[int]:
+        """
+        批量获取新的UUID
+        """
+        return [self.next_id() for _ in range(count)]
@@ -6,37 +6,49 @@ import asyncio
 import logging
 import os
 import re
-import sys
 
-import telegramify_markdown
-from datetime import datetime, timedelta
 from typing import Callable, Awaitable
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update, Message
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
     ContextTypes,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters
 )
 from model.db.t_answer import TAnswer
 from model.db.t_question import TQuestion
 from model.db.t_session import TSession
 from model.db.t_user import TUser
-from module.chat.chatgpt.service.chatgpt_service import batch_get_chat_content_in_session_collection
-from module.repo.chat.answer_repo import batch_save_answer
-from module.repo.chat.question_repo import save_question, get_latest_question
-from module.repo.chat.session_repo import batch_get_session_in_user_collection, batch_save_session, \
-    get_session_id_by_name, count_user_sessions, get_session_by_name, get_last_session, is_exist_session
+from module.chat.chatgpt.service.search_service import index_document, search_sessions
+from module.chat.chatgpt.service.chatgpt_service import get_chat_history, save_chat_question, \
+    save_chat_answer
+from module.chat.chatgpt.service.session_service import create_session, get_session_page, get_session_by_name, \
+    get_last_session, is_exist_session, get_latest_question_id
 from module.repo.user.user_repo import batch_save_or_update
-from provider.db import init_db
+from module.service.message_service import send_message, edit_text, reply_text, delete_message
+from provider.backend import BackendClient, init_backend, shutdown_backend
+from provider.cache import init_context_cache, init_user_cache, init_session_cache, shutdown_cache
+from provider.context import ChatContextWindow, ChatCompactor, init_context_window, shutdown_compactor
+from provider.db import TelegramBotDBRouter, init_db, init_db_router, migrate_db, shutdown_db
+from provider.id import init_id_generator, init_id_lease, shutdown_id_lease
+from provider.search import init_search, shutdown_search
+from provider.message import TelegramMessageScheduler, EditCadenceConfig, shutdown_message_scheduler
+from provider.render import MarkdownRenderPool, shutdown_render_pool
 from util.array_util import reshape_options
+from util.buffer_util import AnswerBuffer
+from util.cadence_util import CadenceController
 from util.dict_util import save_in_dict_chain
 from util.lang_util import init_lang, get_with_lang
+from util.markdown_render_util import IncrementalMarkdownRenderer, render_markdown_async
+from util.message_split_util import TELEGRAM_MESSAGE_LIMIT, split_message, tail_message, utf16_len, find_seal_point
+from util.rate_limit_util import PRIORITY_FINAL
 from util.value_util import set_or_default
 from util.http_stream_util import stream_events
+from search.index import KIND_SESSION, KIND_QUESTION, KIND_ANSWER
 from multiprocessing import Value
 
 # cursor data cache
@@ -54,8 +66,8 @@ logger = logging.getLogger(__name__)
 (
     START, CHECK_HISTORY, CONTINUE_LAST, CHECK_MORE_HISTORY,
     PRODUCE_HISTORY, SELECT_HISTORY, NEW_CHAT, SET_CHAT_NAME,
-    SET_MODEL, CREATE_PROMPT, SEND_PROMPT_TEXT
-) = range(11)
+    SET_MODEL, CREATE_PROMPT, SEND_PROMPT_TEXT, SEARCH_HISTORY
+) = range(12)
 
 
 async def chatgpt_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -87,7 +99,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, factory: st
         user.id, user.full_name,
     )
     save_in_dict_chain(cursor, 0, [user.id, factory, 'parent_id'])
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         get_with_lang('cancel_reply', user.language_code),
         reply_markup=ReplyKeyboardRemove()
     )
@@ -104,7 +117,8 @@ async def readme(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         "User [id:%s, name:%s] ask for help.",
         user.id, user.full_name,
     )
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         get_with_lang('help_reply', user.language_code),
         parse_mode="Markdown",
         reply_markup=ReplyKeyboardMarkup(
@@ -164,17 +178,15 @@ async def chat_start(update: Update, context: ContextTypes.DEFAULT_TYPE, factory
     )
     if user.is_bot:
         current_user.is_bot = 1
-    batch_save_or_update([current_user])
-    save_in_dict_chain(cursor, 0, [user.id, factory, 'session_search_offset'])
+    await batch_save_or_update([current_user])
+    save_in_dict_chain(cursor, None, [user.id, factory, 'session_search_cursor'])
     # 预制选项
     options = ['/new_chat']
-    # 获取总会话数
-    total_sessions = count_user_sessions(user.id, factory)
-    save_in_dict_chain(cursor, total_sessions, [user.id, factory, 'total_sessions'])
-    if total_sessions > 0:
-        options.append('/history')  # 选择上次聊天历史
-    last_session = get_last_session(user.id, factory)
+    # 存在最近会话即存在历史会话, 无需统计总数
+    last_session = await get_last_session(user.id, factory)
     if last_session is not None:
+        options.append('/history')  # 选择上次聊天历史
+        options.append('/search')  # 检索聊天内容
         options.append('/continue')
         save_in_dict_chain(cursor, last_session.id, [user.id, factory, 'last_session', 'id'])
         save_in_dict_chain(cursor, last_session.name, [user.id, factory, 'last_session', 'chat_name'])
@@ -185,7 +197,8 @@ async def chat_start(update: Update, context: ContextTypes.DEFAULT_TYPE, factory
     for option in options:
         tips = tips + (option + "\n")
     save_in_dict_chain(cursor, options, [user.id, factory, 'start_options'])
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         tips,
         reply_markup=ReplyKeyboardMarkup(
             [options[i:i + 2] for i in range(0, len(options), 2)],
@@ -224,12 +237,14 @@ async def check_history(update: Update, context: ContextTypes.DEFAULT_TYPE, fact
     raw = update.message.text
     cmd = raw.split(' ')
     cmd_length = len(cmd)
-    if cmd_length == 0 or cmd_length > 2 or cmd[0] not in cursor[user.id][factory]['start_options']:
+    if cmd_length == 0 or (cmd_length > 2 and cmd[0] != '/search') or \
+            cmd[0] not in cursor[user.id][factory]['start_options']:
         tips = get_with_lang('invalid_command_reply', user.language_code)
         options = cursor[user.id][factory]['start_options']
         for option in options:
             tips += (option + '\n')
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             tips,
             reply_markup=ReplyKeyboardMarkup(
                 [options],
@@ -250,10 +265,11 @@ async def check_history(update: Update, context: ContextTypes.DEFAULT_TYPE, fact
                 [user.id, factory, 'model']
             )
             save_in_dict_chain(cursor, session_id, [user.id, factory, 'session_id'])
-            latest_question = get_latest_question(session_id)
-            if latest_question is not None:
-                save_in_dict_chain(cursor, latest_question.id, [user.id, factory, 'parent_id'])
-            await update.message.reply_text(
+            latest_question_id = await get_latest_question_id(session_id)
+            if latest_question_id is not None:
+                save_in_dict_chain(cursor, latest_question_id, [user.id, factory, 'parent_id'])
+            await reply_text(
+                update.message,
                 get_with_lang("continue_reply", user.language_code),
                 reply_markup=ReplyKeyboardMarkup(
                     [['/cancel']],
@@ -266,8 +282,11 @@ async def check_history(update: Update, context: ContextTypes.DEFAULT_TYPE, fact
             return SEND_PROMPT_TEXT
         case "/history":
             return await produce_history(update, context, factory)
+        case "/search":
+            return await search_history(update, context, factory)
         case "/new_chat":
-            await update.message.reply_text(
+            await reply_text(
+                update.message,
                 get_with_lang('new_chat_reply', user.language_code),
                 reply_markup=ReplyKeyboardMarkup(
                     [['/cancel']],
@@ -310,26 +329,95 @@ async def produce_history(update: Update, context: ContextTypes.DEFAULT_TYPE, fa
         arg1 = cmd[1]
     else:
         arg1 = None
-    if cmd[0] != '/history':
-        if cmd[0] == '/more':
-            cursor[user.id][factory]['session_search_offset'] += 4
-        else:
-            return await select_history(update, context, factory)
-    # 获取全部会话名
-    offset = cursor[user.id][factory]['session_search_offset']
-    sessions = batch_get_session_in_user_collection(
-        user_id_list=[user.id], factory=factory, limit=4, search=arg1, offset=offset)
-    total_sessions = count_user_sessions(user.id, factory, search=arg1, offset=offset)
+    if cmd[0] == '/search':
+        return await search_history(update, context, factory)
+    if cmd[0] == '/history':
+        # 新的查询从第一页开始
+        save_in_dict_chain(cursor, None, [user.id, factory, 'session_search_cursor'])
+        save_in_dict_chain(cursor, arg1, [user.id, factory, 'session_search_term'])
+    elif cmd[0] != '/more':
+        return await select_history(update, context, factory)
+    # 从上一页最后一个会话 id 之后继续查询
+    before_id = cursor[user.id][factory].get('session_search_cursor')
+    search = cursor[user.id][factory].get('session_search_term')
+    sessions, has_more = await get_session_page(user.id, factory, 4, before_id=before_id, search=search)
+    if len(sessions) > 0:
+        save_in_dict_chain(cursor, sessions[-1].id, [user.id, factory, 'session_search_cursor'])
     chat_names = []
     for s in sessions:
         chat_names.append("/" + s.name)
-    if total_sessions > 4:
+    if has_more:
         chat_names.append("/more")
     chat_names.append('/cancel')
     tips = get_with_lang('history_reply', user.language_code)
     for chat_name in chat_names:
         tips += (chat_name + "\n")
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
+        tips,
+        reply_markup=ReplyKeyboardMarkup(
+            [chat_names[i:i + 2] for i in range(0, len(chat_names), 2)],
+            resize_keyboard=True,
+            is_persistent=True,
+            one_time_keyboard=True,
+            input_field_placeholder=get_with_lang('history_placeholder', user.language_code)
+        ),
+    )
+    return PRODUCE_HISTORY
+
+
+async def chatgpt_search_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await search_history(update, context, 'ChatGPT')
+
+
+async def deepseek_search_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await search_history(update, context, 'DeepSeek')
+
+
+async def bytedance_search_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await search_history(update, context, 'ByteDance')
+
+
+async def sc_net_search_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await search_history(update, context, 'SCNet')
+
+
+async def claude_search_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await search_history(update, context, 'Claude')
+
+
+# 检索会话名与聊天内容: /search 关键词, 未带关键词时等待用户输入
+async def search_history(update: Update, context: ContextTypes.DEFAULT_TYPE, factory: str) -> int:
+    user = update.message.from_user
+    raw = update.message.text.strip()
+    term = raw
+    if raw == '/search' or raw.startswith('/search '):
+        term = raw[len('/search'):].strip()
+    if term == '':
+        await reply_text(
+            update.message,
+            get_with_lang('search_reply', user.language_code),
+            reply_markup=ReplyKeyboardMarkup(
+                [['/cancel']],
+                resize_keyboard=True,
+                is_persistent=True,
+                one_time_keyboard=True,
+                input_field_placeholder=get_with_lang('search_placeholder', user.language_code)
+            ),
+        )
+        return SEARCH_HISTORY
+    results = await search_sessions(user.id, factory, term)
+    if len(results) == 0:
+        await reply_text(update.message, get_with_lang('search_empty_reply', user.language_code))
+        return SEARCH_HISTORY
+    chat_names = []
+    tips = get_with_lang('history_reply', user.language_code)
+    for s, snippet in results:
+        chat_names.append("/" + s.name)
+        tips += ("/" + s.name + "\n" + snippet + "\n\n")
+    chat_names.append('/cancel')
+    await reply_text(
+        update.message,
         tips,
         reply_markup=ReplyKeyboardMarkup(
             [chat_names[i:i + 2] for i in range(0, len(chat_names), 2)],
@@ -366,7 +454,6 @@ async def check_more_history(update: Update, context: ContextTypes.DEFAULT_TYPE,
     cmd = update.message.text
     user = update.message.from_user
     if cmd == '/more':
-        cursor[user.id][factory]['total_sessions'] += 4
         return await produce_history(update, context, factory)
     else:
         return await select_history(update, context, factory)
@@ -405,7 +492,8 @@ async def set_chat_name(
     # 格式检查
     length = len(chat_name)
     if len(chat_name) == 0:
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             get_with_lang('chat_name_empty_reply', user.language_code),
             reply_markup=ReplyKeyboardMarkup(
                 [['/cancel']],
@@ -417,7 +505,8 @@ async def set_chat_name(
         )
         return SET_CHAT_NAME
     if length >= 50:
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             get_with_lang('chat_name_too_long_reply', user.language_code),
             reply_markup=ReplyKeyboardMarkup(
                 [['/cancel']],
@@ -429,7 +518,8 @@ async def set_chat_name(
         )
         return SET_CHAT_NAME
     if not re.match(pattern, chat_name):
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             get_with_lang('chat_name_invalid_reply', user.language_code),
             reply_markup=ReplyKeyboardMarkup(
                 [['/cancel']],
@@ -441,8 +531,9 @@ async def set_chat_name(
         )
         return SET_CHAT_NAME
     # 重复名称检查
-    if is_exist_session(user.id, factory, chat_name):
-        await update.message.reply_text(
+    if await is_exist_session(user.id, factory, chat_name):
+        await reply_text(
+            update.message,
             get_with_lang('chat_name_duplicate_reply', user.language_code),
             reply_markup=ReplyKeyboardMarkup(
                 [['/cancel']],
@@ -453,7 +544,8 @@ async def set_chat_name(
             ),
         )
         return SET_CHAT_NAME
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         "OK.",
     )
     return await next_step(update, context)
@@ -521,7 +613,8 @@ async def new_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, models: l
     reply_keyboard = models
     reply_keyboard.append('/cancel')
     reply_keyboard = [reply_keyboard[i:i + 2] for i in range(0, len(reply_keyboard), 2)]
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         tips,
         reply_markup=ReplyKeyboardMarkup(
             keyboard=reply_keyboard,
@@ -558,12 +651,13 @@ async def select_history(update: Update, context: ContextTypes.DEFAULT_TYPE, fac
     session = update.message.text.replace("/", "")
     user = update.message.from_user
     save_in_dict_chain(cursor, session, [user.id, factory, 'chat_name'])
-    selected = get_session_by_name(user.id, session, factory)
+    selected = await get_session_by_name(user.id, session, factory)
     save_in_dict_chain(cursor, selected.model, [user.id, factory, 'model'])
     save_in_dict_chain(cursor, selected.id, [user.id, factory, 'session_id'])
-    latest_question = get_latest_question(selected.id)
-    save_in_dict_chain(cursor, latest_question.id, [user.id, factory, 'parent_id'])
-    await update.message.reply_text(
+    latest_question_id = await get_latest_question_id(selected.id)
+    save_in_dict_chain(cursor, latest_question_id, [user.id, factory, 'parent_id'])
+    await reply_text(
+        update.message,
         get_with_lang('select_history_reply', user.language_code).replace("$session", session),
         reply_markup=ReplyKeyboardMarkup(
             [['/cancel']],
@@ -608,7 +702,8 @@ async def set_model(update: Update, context: ContextTypes.DEFAULT_TYPE, factory:
             tips = generate_info_claude(text, model)
         for m in selectable_models:
             tips += (m + '\n')
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             tips,
             reply_markup=ReplyKeyboardMarkup(
                 keyboard=reshape_options(selectable_models),
@@ -681,22 +776,23 @@ async def create_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, fact
         [user.id, factory, 'model']
     )
     chat_name = cursor[user.id][factory]['chat_name']
-    # 新建会话
-    batch_save_session([
-        TSession(
-            user_id=user.id,
-            name=chat_name,
-            factory=factory,
-            model=model,
-        )
-    ])
+    # 新建会话 (主键在构造时已分配)
+    new_session = TSession(
+        user_id=user.id,
+        name=chat_name,
+        factory=factory,
+        model=model,
+    )
+    await create_session(new_session)
+    await index_document(user.id, factory, new_session.id, KIND_SESSION, new_session.id, chat_name)
     # 保存会话 id
     save_in_dict_chain(
         cursor,
-        get_session_id_by_name(user.id, chat_name, factory)[0],
+        new_session.id,
         [user.id, factory, 'session_id']
     )
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         get_with_lang('create_prompt_reply', user.language_code).replace("$model", model),
         reply_markup=ReplyKeyboardMarkup(
             [['/cancel']],
@@ -812,157 +908,174 @@ async def claude_send_prompt_text(update: Update, context: ContextTypes.DEFAULT_
 
 # 保存事件流回复
 async def save_stream_answer(session_id, question_id, content, state: Value):
+    # 只在检查并占用保存标记时持锁, 数据库写入不在锁内等待
     with state.get_lock():
-        if state.value == 0:
-            state.value += 1
-            answer = TAnswer(
-                session_id=session_id,
-                question_id=question_id,
-                type=0,
-                content=content,
-            )
-            batch_save_answer([answer])
+        if state.value != 0:
+            return
+        state.value += 1
+    answer = TAnswer(
+        session_id=session_id,
+        question_id=question_id,
+        type=0,
+        content=content,
+    )
+    await save_chat_answer(answer)
 
 
-# 发送响应 chunk 片段回调检查
-async def send_reply_chunk_cb(update: Update, context: ContextTypes.DEFAULT_TYPE,
-                              state: dict, lock, save):
-    window: timedelta = state['limit_window']
-    await asyncio.sleep(window.total_seconds())
-    now = datetime.now()
-    updated: datetime = state['last_update']
-    if updated.timestamp() < now.timestamp():
-        await send_reply_chunk(update, context, state, lock, save)
+# 流式输出时单条消息的封存长度 (预留 MarkdownV2 转义膨胀空间)
+LIVE_MESSAGE_LIMIT = 3500
 
 
 # 处理获取响应错误
 async def handle_reply_error(update: Update, context: ContextTypes.DEFAULT_TYPE, state, error, lock):
     with lock.get_lock():
-        if lock.value == 0:
-            lock.value += 1
-            user = update.message.from_user
-            content = get_with_lang('server_busy_or_error_reply', user.language_code)
-            session_id = state['session_id']
-            question_id = state['question_id']
-            asyncio.create_task(save_stream_answer(session_id, question_id, content, Value('i', 0)))
-            if 'message' in error:
-                content = get_with_lang('server_busy_or_error_prefix', user.language_code) + error['message']
-            render_content: str = telegramify_markdown.markdownify(
-                content,
-                max_line_length=None,
-                normalize_whitespace=False
-            )
-            await update.message.reply_text(
-                render_content,
-                parse_mode="MarkdownV2",
-            )
+        if lock.value != 0:
+            return
+        lock.value += 1
+    state['failed'] = True
+    user = update.message.from_user
+    content = get_with_lang('server_busy_or_error_reply', user.language_code)
+    session_id = state['session_id']
+    question_id = state['question_id']
+    asyncio.create_task(save_stream_answer(session_id, question_id, content, Value('i', 0)))
+    if 'message' in error:
+        content = get_with_lang('server_busy_or_error_prefix', user.language_code) + error['message']
+    render_content: str = await render_markdown_async(content)
+    await reply_text(
+        update.message,
+        render_content,
+        priority=PRIORITY_FINAL,
+        parse_mode="MarkdownV2",
+    )
 
 
-# 发送响应 chunk 片段
-async def send_reply_chunk(update: Update, context: ContextTypes.DEFAULT_TYPE,
-                           state: dict, lock: asyncio.Lock, save: Value):
-    # 锁退避 (只有上锁成功才执行)
-    if await lock.acquire():
+# 以 MarkdownV2 最终渲染一段回复: 第 1 部分写入 send_msg (为空时新发), 超长部分补发
+# sent 不为空时记录补发的消息
+async def send_final_render(update: Update, context: ContextTypes.DEFAULT_TYPE, send_msg: Message | None,
+                            content: str, renderer: IncrementalMarkdownRenderer = None,
+                            sent: list[Message] = None) -> Message | None:
+    if renderer is not None:
+        rendered = await renderer.render_async(content)
+    else:
+        rendered = await render_markdown_async(content)
+    parts = await MarkdownRenderPool.run(split_message, rendered)
+    if len(parts) == 0:
+        return send_msg
+    if send_msg is None:
+        try:
+            send_msg = await send_message(
+                context.bot, update.effective_chat.id, parts[0], priority=PRIORITY_FINAL, parse_mode="MarkdownV2")
+        except BadRequest:
+            send_msg = await send_message(
+                context.bot, update.effective_chat.id, tail_message(content), priority=PRIORITY_FINAL)
+            return send_msg
+    else:
+        try:
+            await edit_text(send_msg, parts[0], priority=PRIORITY_FINAL, parse_mode="MarkdownV2")
+        except BadRequest as e:
+            if "specified new message content and reply markup are exactly the same as a current content" not in e.message:
+                print('error on edit message: ', e.message)
+    # 补发剩余消息
+    for part in parts[1:]:
+        try:
+            message = await reply_text(update.message, part, priority=PRIORITY_FINAL, parse_mode="MarkdownV2")
+        except BadRequest:
+            message = await reply_text(update.message, part, priority=PRIORITY_FINAL)
+        if sent is not None:
+            sent.append(message)
+    return send_msg
+
+
+# 流式编辑当前消息: 优先使用增量渲染的 MarkdownV2, 超长或解析失败时退回纯文本
+async def edit_live_message(state: dict):
+    text = live_message_text(state)
+    rendered = await state['markdown'].render_async(text)
+    if utf16_len(rendered) <= TELEGRAM_MESSAGE_LIMIT:
         try:
-            # 输出限流窗口检测
-            if state['last_update'] is not None and (state['finish'] is None or not state['finish']):
-                now = datetime.now()
-                limit: datetime = state['last_update'] + state['limit_window']
-                if now.timestamp() < limit.timestamp():
-                    print('hit limit window, ignore')
-                    return
-            state['last_update'] = datetime.now()
-            # 获取对话元数据
-            chat_id = update.effective_chat.id
-            send_msg: Message = state['send_msg']
-            content = state['content']
-
-            if state['finish'] is None or not state['finish']:
-                if send_msg is None:
-                    state['send_msg'] = await context.bot.send_message(chat_id, text=content)
-                else:
-                    if state['save'] != state['content']:
-                        msg = state['content']
-                        # 限制消息最大字符数为 4096
-                        if len(msg) > 4096:
-                            msg = msg[-4096:]
-                        # 限制消息大小为 512 字节以内
-                        while sys.getsizeof(msg) >= 512 and len(msg) > 0:
-                            msg = msg[:-100]
-                        try:
-                            await send_msg.edit_text(msg)
-                        except BadRequest as e:
-                            if "specified new message content and reply markup are exactly the same as a current content" not in e.message:
-                                print('error on edit message:', e.message)
-                        state['save'] = state['content']
-                if not state['finish']:
-                    asyncio.create_task(send_reply_chunk_cb(update, context, state, lock, save))
-            else:
-                session_id = state['session_id']
-                question_id = state['question_id']
-                asyncio.create_task(save_stream_answer(session_id, question_id, content, save))
-                if send_msg is None:
-                    state['send_msg'] = await context.bot.send_message(chat_id, text=content)
-                else:
-                    if state['save'] != state['content']:
-                        # 更新使用 telegram_markdown 解析包转义 markdown 到 markdownV2
-                        render_content: str = telegramify_markdown.markdownify(
-                            state['content'],
-                            max_line_length=None,
-                            normalize_whitespace=False
-                        )
-                        if len(render_content) < 4096:
-                            try:
-                                await send_msg.edit_text(
-                                    render_content,
-                                    parse_mode="MarkdownV2",
-                                )
-                            except BadRequest as e:
-                                if "specified new message content and reply markup are exactly the same as a current content" not in e.message:
-                                    print('error on edit message: ', e.message)
-                        else:
-                            content_buffer = []
-                            lines = render_content.splitlines(keepends=True)
-                            has_code_block = False
-                            line_cache = ''
-                            for line in lines:
-                                if "```" in line:
-                                    has_code_block = not has_code_block
-                                reserve = 6 if has_code_block else 0
-                                if len(line_cache) + len(line) + reserve < 4096:
-                                    line_cache += line
-                                else:
-                                    if has_code_block:
-                                        content_buffer.append(line_cache + '\n```')
-                                        line_cache = '```\n' + line
-                                    else:
-                                        content_buffer.append(line_cache)
-                                        line_cache = line
-                            if line_cache != '':
-                                content_buffer.append(line_cache)
-                            # 修改第 1 条消息
-                            try:
-                                await send_msg.edit_text(
-                                    content_buffer[0],
-                                    parse_mode="MarkdownV2",
-                                )
-                            except BadRequest as e:
-                                if "specified new message content and reply markup are exactly the same as a current content" not in e.message:
-                                    print('error on edit message: ', e.message)
-                            # 补发剩余消息
-                            for content in content_buffer[1:]:
-                                try:
-                                    await update.message.reply_text(
-                                        content,
-                                        parse_mode="MarkdownV2",
-                                    )
-                                except BadRequest:
-                                    await update.message.reply_text(
-                                        content,
-                                    )
-                        state['save'] = state['content']
-        finally:
-            lock.release()
+            await edit_text(state['send_msg'], rendered, parse_mode="MarkdownV2")
+            return
+        except BadRequest as e:
+            if "specified new message content and reply markup are exactly the same as a current content" in e.message:
+                return
+            print('error on edit markdown message:', e.message)
+    try:
+        await edit_text(state['send_msg'], tail_message(text))
+    except BadRequest as e:
+        if "specified new message content and reply markup are exactly the same as a current content" not in e.message:
+            print('error on edit message:', e.message)
+
+
+# 当前仍在增长的消息内容
+def live_message_text(state: dict) -> str:
+    return state['live_prefix'] + state['content'].text_from(state['live_offset'])
+
+
+# 封存已写满的消息: 最终渲染后在新消息中继续输出
+async def seal_live_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, state: dict):
+    content: AnswerBuffer = state['content']
+    while True:
+        raw = content.text_from(state['live_offset'])
+        prefix = state['live_prefix']
+        if utf16_len(prefix) + utf16_len(raw) <= LIVE_MESSAGE_LIMIT:
+            return
+        opener = prefix if prefix else None
+        cut, opener = find_seal_point(raw, LIVE_MESSAGE_LIMIT - utf16_len(prefix), opener)
+        sealed = prefix + raw[:cut]
+        if opener is not None:
+            sealed = sealed.rstrip('\n') + '\n```'
+        await send_final_render(update, context, state['send_msg'], sealed, state['markdown'], state['sealed'])
+        state['sealed'].append(state['send_msg'])
+        state['markdown'].reset()
+        state['live_offset'] += cut
+        state['live_prefix'] = opener if opener is not None else ''
+        state['send_msg'] = await send_message(context.bot, update.effective_chat.id, tail_message(live_message_text(state)))
+
+
+# 重试前删除失败请求已发出的消息 (已封存的消息与当前消息), 重试的回复从新消息开始
+async def reset_reply_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, state: dict):
+    messages = state['sealed']
+    if state['send_msg'] is not None:
+        messages.append(state['send_msg'])
+    state['sealed'] = []
+    state['send_msg'] = None
+    state['markdown'].reset()
+    for message in messages:
+        try:
+            await delete_message(message)
+        except TelegramError as e:
+            print('error on delete message:', e.message)
+
+
+# 发送响应 chunk 片段 (由回复的渲染任务串行调用)
+async def send_reply_chunk(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           state: dict, save: Value, final: bool):
+    # 获取对话元数据
+    chat_id = update.effective_chat.id
+    content: AnswerBuffer = state['content']
+    if len(content) == 0 and state['send_msg'] is None:
+        return
+    if not final:
+        if not content.changed_since(state['save']):
+            return
+        if state['send_msg'] is None:
+            state['send_msg'] = await send_message(context.bot, chat_id, tail_message(live_message_text(state)))
+        # 超出单条消息长度时封存当前消息, 后续内容在新消息中继续
+        await seal_live_messages(update, context, state)
+        await edit_live_message(state)
+        state['save'] = content.version
+    else:
+        session_id = state['session_id']
+        question_id = state['question_id']
+        asyncio.create_task(save_stream_answer(session_id, question_id, content.text(), save))
+        # 已按错误回复处理的回复 (内容不完整) 不建检索文档
+        if not state['failed']:
+            await index_document(
+                update.effective_user.id, state['factory'], session_id, KIND_ANSWER, question_id, content.text())
+        # 已封存的消息已完成渲染, 只需最终渲染最后一条
+        await seal_live_messages(update, context, state)
+        state['send_msg'] = await send_final_render(
+            update, context, state['send_msg'], live_message_text(state), state['markdown'])
+        state['save'] = content.version
 
 
 async def send_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYPE, factory: str, msg_type: str,
@@ -972,47 +1085,60 @@ async def send_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYPE, f
     model = cursor[user.id][factory]['model']
     # 获取消息
     session_id = int(cursor[user.id][factory]['session_id'])
-    message_chain: list = batch_get_chat_content_in_session_collection([session_id], content_type=msg_type)
-    messages: list = []
-    if len(message_chain) == 1:
-        messages = message_chain[0]
     parent_id = 0
     if 'parent_id' in cursor[user.id][factory] and cursor[user.id][factory]['parent_id'] is not None:
         parent_id = cursor[user.id][factory]['parent_id']
-    session_id = int(cursor[user.id][factory]['session_id'])
+    # 只取当前分支 (从 parent_id 回溯到根问题) 的历史
+    messages: list = await get_chat_history(session_id, parent_id, content_type=msg_type)
+    # 按模型 token 预算裁剪上下文
+    messages = ChatContextWindow.apply(messages, model, prompt)
     current_question = TQuestion(
         session_id=session_id,
         parent_id=parent_id,
         type=0,
         content=prompt,
     )
-    latest_question = save_question(current_question)
-    if latest_question is not None:
-        save_in_dict_chain(cursor, latest_question.id, [user.id, factory, 'parent_id'])
+    # 保存失败时抛出异常, 返回值不会为 None
+    latest_question = await save_chat_question(current_question)
+    await index_document(user.id, factory, session_id, KIND_QUESTION, latest_question.id, prompt)
+    save_in_dict_chain(cursor, latest_question.id, [user.id, factory, 'parent_id'])
     payload = fn(messages, prompt, model)
     # 发起流方式请求
     payload['stream'] = True
     print(payload)
     await stream_events(
-        target="http://docker-prod-1:8080/service/model/chat",
+        target=BackendClient.config.url,
         body=payload,
         on_receive=send_reply_chunk,
         on_error=handle_reply_error,
+        on_retry=reset_reply_messages,
         update=update,
         context=context,
         state={
             # 回复完成情况
             'finish': False,
+            # 是否已按错误回复处理
+            'failed': False,
             # 回复内容缓存
-            'content': '',
-            # 上次更新时间
-            'last_update': None,
-            # 编辑期限流窗口
-            'limit_window': timedelta(seconds=1),
-            # 消息缓存
+            'content': AnswerBuffer(),
+            # 自适应编辑节奏
+            'cadence': CadenceController(
+                EditCadenceConfig,
+                chat_type=update.effective_chat.type,
+                pressure=TelegramMessageScheduler.pressure,
+            ),
+            # 当前仍在增长的消息
             'send_msg': None,
-            # 已存储内容缓存
-            'save': '',
+            # 已封存的消息 (重试时删除)
+            'sealed': [],
+            # 当前消息在回复内容中的起始位置
+            'live_offset': 0,
+            # 当前消息的前缀 (跨消息重新打开的代码块开始行)
+            'live_prefix': '',
+            # 当前消息的增量 MarkdownV2 渲染缓存
+            'markdown': IncrementalMarkdownRenderer(),
+            # 已渲染内容版本
+            'save': 0,
             # 会话 id
             'session_id': session_id,
             # 问题 id
@@ -1022,6 +1148,8 @@ async def send_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYPE, f
         },
         save_lock=Value('i', 0),
     )
+    # 当前分支过长时在后台压缩较早的轮次
+    ChatCompactor.schedule(session_id, latest_question.id, factory, model, msg_type, fn)
     return SEND_PROMPT_TEXT
 
 
@@ -1056,6 +1184,8 @@ gpt_handler = ConversationHandler(
                         MessageHandler(filters.TEXT, chatgpt_create_prompt)],
         SEND_PROMPT_TEXT: [CommandHandler("cancel", chatgpt_cancel),
                            MessageHandler(filters.TEXT, chatgpt_send_prompt_text)],
+        SEARCH_HISTORY: [CommandHandler("cancel", chatgpt_cancel),
+                         MessageHandler(filters.TEXT, chatgpt_search_history)],
     },
     fallbacks=[],
 )
@@ -1084,6 +1214,8 @@ deepseek_handler = ConversationHandler(
                         MessageHandler(filters.TEXT, deepseek_create_prompt)],
         SEND_PROMPT_TEXT: [CommandHandler("cancel", deepseek_cancel),
                            MessageHandler(filters.TEXT, deepseek_send_prompt_text)],
+        SEARCH_HISTORY: [CommandHandler("cancel", deepseek_cancel),
+                         MessageHandler(filters.TEXT, deepseek_search_history)],
     },
     fallbacks=[],
 )
@@ -1112,6 +1244,8 @@ bytedance_handler = ConversationHandler(
                         MessageHandler(filters.TEXT, bytedance_create_prompt)],
         SEND_PROMPT_TEXT: [CommandHandler("cancel", bytedance_cancel),
                            MessageHandler(filters.TEXT, bytedance_send_prompt_text)],
+        SEARCH_HISTORY: [CommandHandler("cancel", bytedance_cancel),
+                         MessageHandler(filters.TEXT, bytedance_search_history)],
     },
     fallbacks=[],
 )
@@ -1140,6 +1274,8 @@ sc_net_handler = ConversationHandler(
                         MessageHandler(filters.TEXT, sc_net_create_prompt)],
         SEND_PROMPT_TEXT: [CommandHandler("cancel", sc_net_cancel),
                            MessageHandler(filters.TEXT, sc_net_send_prompt_text)],
+        SEARCH_HISTORY: [CommandHandler("cancel", sc_net_cancel),
+                         MessageHandler(filters.TEXT, sc_net_search_history)],
     },
     fallbacks=[],
 )
@@ -1168,6 +1304,8 @@ claude_handler = ConversationHandler(
                         MessageHandler(filters.TEXT, claude_create_prompt)],
         SEND_PROMPT_TEXT: [CommandHandler("cancel", claude_cancel),
                            MessageHandler(filters.TEXT, claude_send_prompt_text)],
+        SEARCH_HISTORY: [CommandHandler("cancel", claude_cancel),
+                         MessageHandler(filters.TEXT, claude_search_history)],
     },
     fallbacks=[],
 )
@@ -1289,14 +1427,43 @@ async def mentioned(update: Update, context: ContextTypes.DEFAULT_TYPE):
 mention_handler = MessageHandler(filters.TEXT & ~filters.COMMAND, mentioned)
 
 
+# 绑定当前更新的用户, 数据库读取按用户做读己之写路由
+async def bind_db_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    TelegramBotDBRouter.bind_user(user.id if user is not None else None)
+
+
+db_user_handler = TypeHandler(Update, bind_db_user)
+
+
+# 应用关闭钩子
+async def post_init(application: Application) -> None:
+    await init_id_lease()
+    await migrate_db()
+    await init_db_router()
+    await init_search()
+
+
+async def shutdown(application: Application) -> None:
+    await shutdown_message_scheduler()
+    await shutdown_backend()
+    await shutdown_render_pool()
+    await shutdown_compactor()
+    await shutdown_search()
+    await shutdown_cache()
+    await shutdown_db()
+    await shutdown_id_lease()
+
+
 # main entrypoint
 def main() -> None:
     token = os.environ.get('BOT_TOKEN')
     if token is None or token == "":
         print('BOT_TOKEN not found !')
         exit(1)
-    application = Application.builder().token(token).build()
+    application = Application.builder().token(token).post_init(post_init).post_shutdown(shutdown).build()
 
+    application.add_handler(db_user_handler, group=-1)
     application.add_handler(help_handler)
     application.add_handler(gpt_handler)
     application.add_handler(deepseek_handler)
@@ -1322,5 +1489,11 @@ def main() -> None:
 
 if __name__ == "__main__":
     init_lang()
+    init_id_generator()
+    init_context_cache()
+    init_user_cache()
+    init_session_cache()
+    init_context_window()
     init_db()
+    init_backend()
     main()
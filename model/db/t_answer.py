@@ -1,13 +1,14 @@
 import datetime
-from model.db.t_base import Base
+from model.db.t_base import Base, BigIntegerId, snowflake_id
 from sqlalchemy import Column, Integer, String, DateTime, BigInteger
 
 
 # 回复表
+@snowflake_id
 class TAnswer(Base):
     __tablename__ = 't_answer'
 
-    id = Column(BigInteger, primary_key=True, nullable=False)  # 回复 id
+    id = Column(BigIntegerId, primary_key=True, nullable=False)  # 回复 id
     session_id = Column(BigInteger, nullable=False)  # 关联会话 id
     question_id = Column(BigInteger, nullable=False)  # 关联问题 id
     type = Column(Integer, nullable=False, default=0)  # 回复数据类型
@@ -1,4 +1,19 @@
+from sqlalchemy import BigInteger, Integer, event
+from provider.id import TelegramIdGenerator
 from sqlalchemy.ext.declarative import declarative_base
 
 # 基础表
 Base = declarative_base()
+
+# 自增主键类型 (sqlite 只有 INTEGER 主键才会自增)
+BigIntegerId = BigInteger().with_variant(Integer, "sqlite")
+
+
+# 客户端生成主键: 构造时即分配雪花 id, 插入前已知主键, 无需插入后回查
+def snowflake_id(cls):
+    @event.listens_for(cls, 'init')
+    def assign_id(target, args, kwargs):
+        if kwargs.get('id') is None:
+            target.id = TelegramIdGenerator.next_id()
+
+    return cls
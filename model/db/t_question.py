@@ -1,13 +1,14 @@
 import datetime
-from model.db.t_base import Base
+from model.db.t_base import Base, BigIntegerId, snowflake_id
 from sqlalchemy import Column, Integer, String, DateTime, BigInteger
 
 
 # 问题表
+@snowflake_id
 class TQuestion(Base):
     __tablename__ = 't_question'
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)  # 问题 id
+    id = Column(BigIntegerId, primary_key=True, autoincrement=True)  # 问题 id
     session_id = Column(BigInteger, nullable=False)  # 关联会话 id
     parent_id = Column(BigInteger, nullable=False, default=0)  # 关联上个问题
     type = Column(Integer, nullable=False, default=0)  # 问题数据类型
@@ -0,0 +1,12 @@
+from model.db.t_base import Base
+from sqlalchemy import Column, Integer, BigInteger
+
+
+# 检索文档回填进度表 (每种文档类型一行, 由迁移创建)
+class TSearchBackfill(Base):
+    __tablename__ = 't_search_backfill'
+
+    kind = Column(Integer, primary_key=True, autoincrement=False)  # 文档类型 (0 会话名 1 问题 2 回复)
+    last_id = Column(BigInteger, nullable=False, default=0)  # 已回填到的来源行 id
+    end_id = Column(BigInteger, nullable=False, default=0)  # 截止 id (迁移时来源表的最大 id)
+    done = Column(Integer, nullable=False, default=0)  # 是否完成
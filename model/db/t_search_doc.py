@@ -0,0 +1,16 @@
+from model.db.t_base import Base, BigIntegerId, snowflake_id
+from sqlalchemy import Column, Integer, BigInteger, String, Text
+
+
+# 全文检索文档表 (表结构由 search 包按数据库类型创建: MySQL FULLTEXT ngram / SQLite FTS5 trigram)
+@snowflake_id
+class TSearchDoc(Base):
+    __tablename__ = 't_search_doc'
+
+    id = Column(BigIntegerId, primary_key=True, nullable=False)  # 文档 id
+    user_id = Column(BigInteger, nullable=False)  # 用户 id
+    factory = Column(String(50), nullable=False)  # 工厂
+    session_id = Column(BigInteger, nullable=False)  # 关联会话 id
+    kind = Column(Integer, nullable=False, default=0)  # 文档类型 (0 会话名 1 问题 2 回复)
+    ref_id = Column(BigInteger, nullable=False, default=0)  # 关联问题/回复 id
+    content = Column(Text, nullable=False)  # 检索内容
@@ -1,13 +1,14 @@
 import datetime
-from model.db.t_base import Base
+from model.db.t_base import Base, BigIntegerId, snowflake_id
 from sqlalchemy import Column, Integer, DateTime, BigInteger, String
 
 
 # 会话表
+@snowflake_id
 class TSession(Base):
     __tablename__ = 't_session'
 
-    id = Column(BigInteger, primary_key=True, nullable=False, autoincrement=True)  # id
+    id = Column(BigIntegerId, primary_key=True, nullable=False, autoincrement=True)  # id
     user_id = Column(BigInteger, nullable=False)  # 用户 id
     name = Column(String(50), nullable=False)  # 名称
     factory = Column(String(50), nullable=False)  # 工厂
@@ -1,87 +1,84 @@
 from typing import List
-from model.data.d_chat import ChatMessage, SessionInfo, ChatContent
-from module.repo.chat.answer_repo import batch_get_answer_in_session_collection
-from module.repo.chat.question_repo import batch_get_question_in_session_collection
+from model.data.d_chat import SessionInfo
+from cache.context_cache import SessionContext, SUMMARY_TYPE
+from model.db.t_answer import TAnswer
+from model.db.t_question import TQuestion
+from module.repo.chat.answer_repo import save_answer, batch_get_answer_in_question_collection
+from module.repo.chat.question_repo import save_question, get_question_path, \
+    batch_get_summary_question_in_parent_collection
 from module.repo.chat.session_repo import batch_get_session_in_user_collection
+from provider.cache import ChatContextCache, ChatSessionCache
 
 
-def batch_get_sessions_in_user_collection(
+async def batch_get_sessions_in_user_collection(
         user_id_list: List[int], factory: str = None, model: str = None) -> List[SessionInfo]:
-    sessions = batch_get_session_in_user_collection(user_id_list, factory, model)
+    sessions = await batch_get_session_in_user_collection(user_id_list, factory, model)
     result = []
     for session in sessions:
         result.append(SessionInfo(session.id, session.name))
     return result
 
 
-class QuestionPoint:
-    def __init__(self, message: ChatMessage, parent: int = 0, answer: ChatMessage = None,
-                 next_ptr: ChatMessage = None):
-        self.message = message
-        self.parent = parent
-        self.answer = answer
-        self.next_ptr = next_ptr
-
-
-def batch_get_chat_content_in_session_collection(session_id_list: List[int], content_type: str = 'multiple') \
-        -> list[list[dict]]:
-    questions = batch_get_question_in_session_collection(session_id_list)
-    answers = batch_get_answer_in_session_collection(session_id_list)
-    # 1.建问题图
-    question_map: dict[int, QuestionPoint] = {}
+# 加载包含当前分支的会话问题树: 优先使用缓存, 缓存缺失的分支用递归查询补齐
+async def get_branch_context(session_id: int, parent_id: int) -> SessionContext:
+    context = ChatContextCache.get(session_id)
+    if context is not None:
+        if context.path_nodes(parent_id) is not None:
+            return context
+        # 合并分支前先移出缓存, 合并后重新放入以更新内存占用
+        ChatContextCache.invalidate(session_id)
+    else:
+        context = SessionContext(session_id)
+    # 加载期间有并发写入时不放入缓存, 下次访问重新加载
+    version = ChatContextCache.begin_load(session_id)
+    try:
+        questions = await get_question_path(session_id, parent_id)
+        questions += await batch_get_summary_question_in_parent_collection(session_id, [q.id for q in questions])
+        answers = await batch_get_answer_in_question_collection([question.id for question in questions])
+    except BaseException:
+        ChatContextCache.end_load(session_id)
+        raise
     for question in questions:
-        content: ChatContent | None = None
-        match question.type:
-            case 0:
-                content = ChatContent(t='text', text=question.content)
-            case 1:
-                content = ChatContent(t='image_url', image_url=question.content)
-        if content is not None:
-            if content_type == 'multiple':
-                point = QuestionPoint(
-                    parent=question.parent_id,
-                    message=ChatMessage(role='user', content=[content])
-                )
-            else:
-                point = QuestionPoint(
-                    parent=question.parent_id,
-                    message=ChatMessage(role='user', content=content.text)
-                )
-            question_map[question.id] = point
-    # 2.倒转链条
-    raw_table = []
-    for point in question_map.values():
-        if point.parent is not None and point.parent in question_map:
-            prev_node = question_map[point.parent]
-            if prev_node is not None:
-                prev_node.next_ptr = point
-        else:
-            raw_table.append(point)
-    # 3.补充回复
+        context.add_question(question.id, question.parent_id, question.type, question.content)
     for answer in answers:
-        c = None
-        match answer.type:
-            case 0:
-                c = ChatContent(t='text', text=answer.content)
-            case 1:
-                c = ChatContent(t='image_url', image_url=answer.content)
-        if content_type == 'multiple':
-            ans = [c]
-        else:
-            ans = c.text
-        question_map[answer.question_id].answer = (
-            ChatMessage(role='assistant', content=ans)
-        )
-    # 4.提取链条
-    result: list[list[dict]] = []
-    for chain in raw_table:
-        chat_content = []
-        ptr = chain
-        while ptr is not None:
-            if ptr.message is not None:
-                chat_content.append(ptr.message.to_map())
-            if ptr.answer is not None:
-                chat_content.append(ptr.answer.to_map())
-            ptr = ptr.next_ptr
-        result.append(chat_content)
-    return result
+        context.add_answer(answer.question_id, answer.type, answer.content)
+    ChatContextCache.put(context, version)
+    return context
+
+
+# 获取当前分支的对话历史 (从 parent_id 回溯到根问题或最近的摘要)
+async def get_chat_history(session_id: int, parent_id: int, content_type: str = 'multiple') -> list[dict]:
+    if parent_id is None or parent_id == 0:
+        return []
+    context = await get_branch_context(session_id, parent_id)
+    history = context.path(parent_id, content_type)
+    if history is None:
+        # 分支中间的问题已删除, 只保留可用的部分
+        print(f'broken question path in session {session_id} from {parent_id}')
+        return []
+    return history
+
+
+# 保存问题并追加到会话缓存
+async def save_chat_question(question: TQuestion) -> TQuestion:
+    try:
+        question = await save_question(question)
+    except Exception:
+        ChatContextCache.invalidate(question.session_id)
+        raise
+    ChatContextCache.append_question(
+        question.session_id, question.id, question.parent_id, question.type, question.content)
+    if question.type != SUMMARY_TYPE:
+        ChatSessionCache.set_latest_question(question.session_id, question.id)
+    return question
+
+
+# 保存回复并追加到会话缓存
+async def save_chat_answer(answer: TAnswer) -> TAnswer:
+    try:
+        answer = await save_answer(answer)
+    except Exception:
+        ChatContextCache.invalidate(answer.session_id)
+        raise
+    ChatContextCache.append_answer(answer.session_id, answer.question_id, answer.type, answer.content)
+    return answer
@@ -0,0 +1,57 @@
+import asyncio
+
+from model.db.t_search_doc import TSearchDoc
+from model.db.t_session import TSession
+from module.repo.chat.session_repo import batch_get_session_in_id_collection
+from provider.search import SearchWriteQueue, get_search_index
+
+
+# 增量索引一条内容 (异步组提交, 不等待落库)
+async def index_document(user_id: int, factory: str, session_id: int, kind: int, ref_id: int, content: str):
+    if content is None or content.strip() == '':
+        return
+    future = await SearchWriteQueue.submit(TSearchDoc(
+        user_id=user_id,
+        factory=factory,
+        session_id=session_id,
+        kind=kind,
+        ref_id=ref_id,
+        content=content,
+    ))
+    future.add_done_callback(log_index_failure)
+
+
+# 检索文档写入失败只记录日志, 不影响对话
+def log_index_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f'index document failed: {future.exception()}')
+
+
+# 截取命中位置附近的片段
+def make_snippet(content: str, term: str, width: int = 40) -> str:
+    content = content.replace('\n', ' ')
+    index = content.lower().find(term.lower())
+    if index < 0:
+        return content[:width] + ('...' if len(content) > width else '')
+    start = max(index - width // 2, 0)
+    end = min(start + width, len(content))
+    return ('...' if start > 0 else '') + content[start:end] + ('...' if end < len(content) else '')
+
+
+# 按相关度检索会话: 每个会话取最相关的命中, 返回 (会话, 片段)
+async def search_sessions(user_id: int, factory: str, term: str, limit: int = 4) -> list[tuple[TSession, str]]:
+    hits = await get_search_index().search(user_id, factory, term, limit * 8)
+    best = {}
+    for hit in hits:
+        if hit.session_id not in best:
+            best[hit.session_id] = hit
+        if len(best) >= limit:
+            break
+    sessions = await batch_get_session_in_id_collection(list(best.keys()))
+    session_map = {s.id: s for s in sessions}
+    result = []
+    for session_id, hit in best.items():
+        session = session_map.get(session_id)
+        if session is not None:
+            result.append((session, make_snippet(hit.content, term)))
+    return result
@@ -0,0 +1,72 @@
+from cache.session_cache import SessionDirectory, SessionEntry
+from model.db.t_session import TSession
+from module.repo.chat import session_repo
+from module.repo.chat.question_repo import get_latest_question
+from provider.cache import ChatSessionCache
+
+
+def to_session_entry(session: TSession) -> SessionEntry:
+    return SessionEntry(session.id, session.name, session.factory, session.model)
+
+
+# 获取会话目录: 优先读缓存, 未命中时加载最近 max_entries 个会话
+async def get_session_directory(user_id: int, factory: str) -> SessionDirectory:
+    directory = ChatSessionCache.get(user_id, factory)
+    if directory is not None:
+        return directory
+    limit = ChatSessionCache.max_entries
+    sessions = await session_repo.batch_get_session_in_user_collection([user_id], factory=factory, limit=limit + 1)
+    directory = SessionDirectory(
+        user_id, factory, [to_session_entry(session) for session in sessions[:limit]], complete=len(sessions) <= limit)
+    ChatSessionCache.put(directory)
+    return directory
+
+
+async def get_last_session(user_id: int, factory: str) -> SessionEntry | None:
+    return (await get_session_directory(user_id, factory)).last()
+
+
+async def is_exist_session(user_id: int, factory: str, name: str) -> bool:
+    directory = await get_session_directory(user_id, factory)
+    if directory.find(name) is not None:
+        return True
+    if directory.complete:
+        return False
+    return await session_repo.is_exist_session(user_id, factory, name)
+
+
+async def get_session_by_name(user_id: int, name: str, factory: str) -> SessionEntry | None:
+    directory = await get_session_directory(user_id, factory)
+    entry = directory.find(name)
+    if entry is not None or directory.complete:
+        return entry
+    session = await session_repo.get_session_by_name(user_id, name, factory)
+    return to_session_entry(session) if session is not None else None
+
+
+# 按 id 倒序的游标分页: 目录完整时直接在缓存中分页
+async def get_session_page(user_id: int, factory: str, limit: int, before_id: int = None, search: str = None) \
+        -> tuple[list[SessionEntry], bool]:
+    directory = await get_session_directory(user_id, factory)
+    if directory.complete:
+        return directory.page(limit, before_id, search)
+    sessions, has_more = await session_repo.get_session_page(user_id, factory, limit, before_id, search)
+    return [to_session_entry(session) for session in sessions], has_more
+
+
+# 新建会话并写穿到会话目录
+async def create_session(session: TSession):
+    await session_repo.batch_save_session([session])
+    ChatSessionCache.add_session(session.user_id, to_session_entry(session))
+
+
+# 获取会话最新 (非摘要) 问题 id, 不存在时返回 None
+async def get_latest_question_id(session_id: int) -> int | None:
+    entry = ChatSessionCache.entry(session_id)
+    if entry is not None and entry.latest_question_id is not None:
+        return entry.latest_question_id
+    question = await get_latest_question(session_id)
+    if question is None:
+        return None
+    ChatSessionCache.set_latest_question(session_id, question.id)
+    return question.id
@@ -0,0 +1,127 @@
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from cache.context_cache import SessionContext, SUMMARY_TYPE
+from model.db.t_answer import TAnswer
+from model.db.t_question import TQuestion
+from module.chat.chatgpt.service.chatgpt_service import get_branch_context, save_chat_question, save_chat_answer
+from provider.backend import BackendClient
+from util.http_stream_util import collect_stream_text
+
+# 请求模型生成摘要的提示词 (同时作为摘要问题的内容保存)
+SUMMARY_PROMPT = 'Summarize the conversation above for your own future reference. ' \
+                 'Keep the facts, decisions, code and open questions that later turns may rely on. ' \
+                 'Reply with the summary only, in the language of the conversation.'
+
+
+# 会话摘要配置
+class SummaryConfig:
+    def __init__(self, threshold: int = 6000, keep_turns: int = 4, min_turns: int = 4):
+        # 当前分支估算 token 数超过阈值时触发摘要
+        self.threshold = threshold
+        # 保留最近的轮数不参与摘要
+        self.keep_turns = keep_turns
+        # 至少有这么多轮可摘要时才执行
+        self.min_turns = min_turns
+
+
+def read_summary_config_from_system() -> SummaryConfig:
+    env = os.environ
+    return SummaryConfig(
+        threshold=int(env.get("TELEGRAM_SUMMARY_THRESHOLD", "6000")),
+        keep_turns=int(env.get("TELEGRAM_SUMMARY_KEEP_TURNS", "4")),
+        min_turns=int(env.get("TELEGRAM_SUMMARY_MIN_TURNS", "4")),
+    )
+
+
+# 调用模型后端生成摘要: 复用各模型的请求体构造函数
+async def summarize_by_backend(messages: list[dict], factory: str, model: str,
+                               create_payload: Callable[[list, str, str], dict]) -> str:
+    payload = create_payload(messages, SUMMARY_PROMPT, model)
+    payload['stream'] = True
+    return await collect_stream_text(BackendClient.config.url, payload, factory)
+
+
+# 会话后台压缩
+class ConversationCompactor:
+    """
+    回复完成后检查当前分支的长度, 超过阈值时在后台把较早的轮次压缩为摘要
+    - 摘要保存为 type=2 的问题/回复, 问题挂在被覆盖的最后一个问题下
+    - 之后加载历史时遇到该问题即以摘要代替它和全部祖先问题
+    - 每个会话同时只运行一个压缩任务
+    """
+
+    def __init__(self, config: SummaryConfig, count: Callable[[list[dict]], int],
+                 summarize: Callable[..., Awaitable[str]] = summarize_by_backend):
+        self.config = config
+        self.count = count
+        self.summarize = summarize
+        self.running: set[int] = set()
+        self.tasks: set[asyncio.Task] = set()
+        # 指标: 生成的摘要数, 失败次数
+        self.summaries = 0
+        self.failures = 0
+
+    def schedule(self, session_id: int, question_id: int, factory: str, model: str, content_type: str,
+                 create_payload: Callable[[list, str, str], dict]) -> asyncio.Task | None:
+        if session_id in self.running:
+            return None
+        self.running.add(session_id)
+        task = asyncio.create_task(
+            self.compact(session_id, question_id, factory, model, content_type, create_payload))
+        self.tasks.add(task)
+
+        def done(t: asyncio.Task):
+            self.tasks.discard(t)
+            self.running.discard(session_id)
+
+        task.add_done_callback(done)
+        return task
+
+    async def compact(self, session_id: int, question_id: int, factory: str, model: str, content_type: str,
+                      create_payload: Callable[[list, str, str], dict]) -> bool:
+        try:
+            context = await get_branch_context(session_id, question_id)
+            nodes = context.path_nodes(question_id)
+            if nodes is None:
+                return False
+            covered = nodes[:len(nodes) - self.config.keep_turns]
+            if len(covered) < self.config.min_turns:
+                return False
+            if self.count(self.messages(nodes, content_type)) < self.config.threshold:
+                return False
+            summary = await self.summarize(self.messages(covered, content_type), factory, model, create_payload)
+            if summary is None or summary.strip() == '':
+                return False
+            question = await save_chat_question(TQuestion(
+                session_id=session_id,
+                parent_id=covered[-1].id,
+                type=SUMMARY_TYPE,
+                content=SUMMARY_PROMPT,
+            ))
+            await save_chat_answer(TAnswer(
+                session_id=session_id,
+                question_id=question.id,
+                type=SUMMARY_TYPE,
+                content=summary,
+            ))
+            self.summaries += 1
+            return True
+        except Exception as e:
+            self.failures += 1
+            print(f'summarize session {session_id} failed: {e}')
+            return False
+
+    @staticmethod
+    def messages(nodes: list, content_type: str) -> list[dict]:
+        result = []
+        for node in nodes:
+            result.extend(SessionContext.to_messages(node, content_type))
+        return result
+
+    async def shutdown(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if len(self.tasks) > 0:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -1,26 +1,49 @@
 from typing import List
+from sqlalchemy import select
 from model.db.t_answer import TAnswer
-from provider.db import TelegramBotDBManager
+from provider.db import TelegramBotDBManager, TelegramBotDBRouter, TelegramBotWriteQueue
 
 
-def batch_save_answer(t_answer_list: List[TAnswer]):
-    session = TelegramBotDBManager.borrow_session()
+async def batch_save_answer(t_answer_list: List[TAnswer]):
+    session = await TelegramBotDBManager.borrow_session()
     try:
         session.add_all(t_answer_list)
-        session.commit()
+        await session.commit()
+        TelegramBotDBRouter.mark_write()
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBManager.return_session(session)
 
 
-def batch_get_answer_in_session_collection(session_id_list: List[int]) -> list[TAnswer]:
-    session = TelegramBotDBManager.borrow_session()
+# 经写入队列组提交, 落库后返回带主键的回复
+async def save_answer(answer: TAnswer) -> TAnswer:
+    answer = await (await TelegramBotWriteQueue.submit(answer))
+    TelegramBotDBRouter.mark_write()
+    return answer
+
+
+async def batch_get_answer_in_session_collection(session_id_list: List[int]) -> list[TAnswer]:
+    session = await TelegramBotDBRouter.borrow_read_session()
     condition = TAnswer.session_id.in_(session_id_list)
     if len(session_id_list) == 1:
         condition = TAnswer.session_id == session_id_list[0]
     try:
-        answer_list = session.query(TAnswer).filter(condition, TAnswer.is_deleted == 0).all()
-        return answer_list
+        result = await session.execute(select(TAnswer).where(condition, TAnswer.is_deleted == 0))
+        answer_list = result.scalars().all()
+        return list(answer_list)
+    finally:
+        if session is not None:
+            await TelegramBotDBRouter.return_session(session)
+
+
+async def batch_get_answer_in_question_collection(question_id_list: List[int]) -> list[TAnswer]:
+    if len(question_id_list) == 0:
+        return []
+    session = await TelegramBotDBRouter.borrow_read_session()
+    try:
+        result = await session.execute(
+            select(TAnswer).where(TAnswer.question_id.in_(question_id_list), TAnswer.is_deleted == 0).order_by(TAnswer.id))
+        return list(result.scalars().all())
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
@@ -1,52 +1,82 @@
 from typing import List
-from sqlalchemy import desc
+from sqlalchemy import desc, select
+from cache.context_cache import SUMMARY_TYPE
 from model.db.t_question import TQuestion
-from provider.db import TelegramBotDBManager
+from provider.db import TelegramBotDBManager, TelegramBotDBRouter, TelegramBotWriteQueue
 
 
-def batch_save_question(t_question_list: List[TQuestion]):
-    session = TelegramBotDBManager.borrow_session()
+async def batch_save_question(t_question_list: List[TQuestion]):
+    session = await TelegramBotDBManager.borrow_session()
     try:
         session.add_all(t_question_list)
-        session.bulk_save_objects()
-        session.commit()
-        session.flush()
+        await session.commit()
+        TelegramBotDBRouter.mark_write()
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBManager.return_session(session)
 
 
-def save_question(question: TQuestion):
-    session = TelegramBotDBManager.borrow_session()
-    try:
-        session.add(question)
-        session.commit()
-        result = session.query(TQuestion).filter(TQuestion.session_id == question.session_id,
-                                                 TQuestion.is_deleted == 0).order_by(desc(TQuestion.id)).first()
-        return result
-    finally:
-        if session is not None:
-            TelegramBotDBManager.return_session(session)
+# 经写入队列组提交, 落库后返回带主键的问题
+async def save_question(question: TQuestion) -> TQuestion:
+    question = await (await TelegramBotWriteQueue.submit(question))
+    TelegramBotDBRouter.mark_write()
+    return question
 
 
-def batch_get_question_in_session_collection(session_id_list: List[int]) -> list[TQuestion]:
-    session = TelegramBotDBManager.borrow_session()
+async def batch_get_question_in_session_collection(session_id_list: List[int]) -> list[TQuestion]:
+    session = await TelegramBotDBRouter.borrow_read_session()
     try:
         condition = TQuestion.session_id.in_(session_id_list)
         if len(session_id_list) == 1:
             condition = TQuestion.session_id == session_id_list[0]
-        session_list = session.query(TQuestion).filter(condition, TQuestion.is_deleted == 0).all()
-        return session_list
+        result = await session.execute(select(TQuestion).where(condition, TQuestion.is_deleted == 0))
+        session_list = result.scalars().all()
+        return list(session_list)
+    finally:
+        if session is not None:
+            await TelegramBotDBRouter.return_session(session)
+
+
+async def get_latest_question(session_id: int):
+    session = await TelegramBotDBRouter.borrow_read_session()
+    try:
+        result = await session.execute(
+            select(TQuestion).where(TQuestion.session_id == session_id, TQuestion.type != SUMMARY_TYPE,
+                                    TQuestion.is_deleted == 0).order_by(desc(TQuestion.id)).limit(1))
+        return result.scalars().first()
+    finally:
+        if session is not None:
+            await TelegramBotDBRouter.return_session(session)
+
+
+# 递归 CTE 从指定问题沿 parent_id 回溯到根问题, 只返回该分支上的问题
+async def get_question_path(session_id: int, question_id: int) -> list[TQuestion]:
+    session = await TelegramBotDBRouter.borrow_read_session()
+    try:
+        path = select(TQuestion.id, TQuestion.parent_id).where(
+            TQuestion.session_id == session_id, TQuestion.id == question_id).cte('question_path', recursive=True)
+        path = path.union_all(
+            select(TQuestion.id, TQuestion.parent_id).join(path, TQuestion.id == path.c.parent_id).where(
+                TQuestion.session_id == session_id))
+        result = await session.execute(
+            select(TQuestion).join(path, TQuestion.id == path.c.id).where(TQuestion.is_deleted == 0).order_by(TQuestion.id))
+        return list(result.scalars().all())
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
 
 
-def get_latest_question(session_id: int):
-    session = TelegramBotDBManager.borrow_session()
+# 获取挂在指定问题下的摘要问题
+async def batch_get_summary_question_in_parent_collection(session_id: int, parent_id_list: List[int]) -> list[TQuestion]:
+    if len(parent_id_list) == 0:
+        return []
+    session = await TelegramBotDBRouter.borrow_read_session()
     try:
-        return session.query(TQuestion).filter(TQuestion.session_id == session_id, TQuestion.is_deleted == 0).order_by(
-            desc(TQuestion.id)).first()
+        result = await session.execute(
+            select(TQuestion).where(TQuestion.session_id == session_id, TQuestion.type == SUMMARY_TYPE,
+                                    TQuestion.parent_id.in_(parent_id_list), TQuestion.is_deleted == 0)
+            .order_by(TQuestion.id))
+        return list(result.scalars().all())
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
@@ -1,83 +1,69 @@
 from typing import List
-from sqlalchemy import desc, func
+from sqlalchemy import desc, select
 from model.db.t_session import TSession
-from provider.db import TelegramBotDBManager
+from provider.db import TelegramBotDBManager, TelegramBotDBRouter
 
 
-def batch_save_session(t_session_list: List[TSession]):
-    session = TelegramBotDBManager.borrow_session()
+async def batch_save_session(t_session_list: List[TSession]):
+    session = await TelegramBotDBManager.borrow_session()
     try:
         session.add_all(t_session_list)
-        session.commit()
+        await session.commit()
+        for t_session in t_session_list:
+            TelegramBotDBRouter.mark_write(t_session.user_id)
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBManager.return_session(session)
 
 
-def get_session_id_by_name(user_id: int, name: str, factory: str):
-    session = TelegramBotDBManager.borrow_session()
+async def get_session_id_by_name(user_id: int, name: str, factory: str):
+    session = await TelegramBotDBRouter.borrow_read_session(user_id)
     conditions = [
         TSession.user_id == user_id,
         TSession.name == name,
         TSession.factory == factory,
     ]
     try:
-        return session.query(TSession.id).filter(*conditions).first()
+        result = await session.execute(select(TSession.id).where(*conditions).limit(1))
+        return result.first()
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
 
 
-def count_user_sessions(user_id: int, factory: str, search: str = None, offset: int = None):
-    session = TelegramBotDBManager.borrow_session()
-    conditions = [
-        TSession.user_id == user_id,
-        TSession.factory == factory
-    ]
-    if search is not None and search != '':
-        conditions.append(TSession.name.like('%'+search+'%'))
-    try:
-        result = session.query(func.count(TSession.id)).filter(*conditions).scalar()
-        if offset is not None and offset > 0:
-            result -= offset
-        return result
-    finally:
-        if session is not None:
-            TelegramBotDBManager.return_session(session)
-
-
-def is_exist_session(user_id: int, factory: str, name: str):
-    session = TelegramBotDBManager.borrow_session()
+async def is_exist_session(user_id: int, factory: str, name: str):
+    session = await TelegramBotDBRouter.borrow_read_session(user_id)
     conditions = [
         TSession.user_id == user_id,
         TSession.factory == factory,
         TSession.name == name,
     ]
     try:
-        result = session.query(TSession).filter(*conditions).first()
+        result = (await session.execute(select(TSession.id).where(*conditions).limit(1))).first()
         return result is not None
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
 
 
-def get_session_by_name(user_id: int, name: str, factory: str):
-    session = TelegramBotDBManager.borrow_session()
+async def get_session_by_name(user_id: int, name: str, factory: str):
+    session = await TelegramBotDBRouter.borrow_read_session(user_id)
     conditions = [
         TSession.user_id == user_id,
         TSession.name == name,
         TSession.factory == factory,
     ]
     try:
-        return session.query(TSession).filter(*conditions).first()
+        result = await session.execute(select(TSession).where(*conditions).limit(1))
+        return result.scalars().first()
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
 
 
-def batch_get_session_in_user_collection(
+async def batch_get_session_in_user_collection(
         user_id_list: List[int], factory: str = None, model: str = None, limit: int = None, search: str = None, offset: int = None) -> list[TSession]:
-    session = TelegramBotDBManager.borrow_session()
+    session = await TelegramBotDBRouter.borrow_read_session(user_id_list[0] if len(user_id_list) == 1 else None)
     conditions = []
     if factory is not None:
         conditions.append(TSession.factory == factory)
@@ -88,29 +74,68 @@ def batch_get_session_in_user_collection(
     else:
         if len(user_id_list) == 1:
             conditions.append(TSession.user_id == user_id_list[0])
+    # /history 只按名称子串筛选当前用户的会话: 先走 (user_id, factory, id) 索引缩小到单个用户,
+    # 保持与会话目录缓存相同的子串语义; 全文检索 (分词匹配, 按相关度排序) 由 /search 提供
     if search is not None and search != '':
         conditions.append(TSession.name.like('%'+search+'%'))
     try:
-        query = session.query(TSession).filter(*conditions).order_by(desc(TSession.id))
+        query = select(TSession).where(*conditions).order_by(desc(TSession.id))
         if limit is not None:
             query = query.limit(limit)
         if offset is not None and offset != 0:
             query = query.offset(offset)
-        session_list = query.all()
-        return session_list
+        session_list = (await session.execute(query)).scalars().all()
+        return list(session_list)
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
 
 
-def get_last_session(user_id: int, factory: str):
-    session = TelegramBotDBManager.borrow_session()
+async def get_last_session(user_id: int, factory: str):
+    session = await TelegramBotDBRouter.borrow_read_session(user_id)
     conditions = [
         TSession.user_id == user_id,
         TSession.factory == factory
     ]
     try:
-        return session.query(TSession).filter(*conditions).order_by(desc(TSession.id)).first()
+        result = await session.execute(select(TSession).where(*conditions).order_by(desc(TSession.id)).limit(1))
+        return result.scalars().first()
+    finally:
+        if session is not None:
+            await TelegramBotDBRouter.return_session(session)
+
+
+# 按 id 倒序的游标分页: 取 limit+1 行判断是否还有下一页, 不执行 COUNT
+async def get_session_page(user_id: int, factory: str, limit: int, before_id: int = None, search: str = None) \
+        -> tuple[list[TSession], bool]:
+    session = await TelegramBotDBRouter.borrow_read_session(user_id)
+    conditions = [
+        TSession.user_id == user_id,
+        TSession.factory == factory,
+    ]
+    if before_id is not None:
+        conditions.append(TSession.id < before_id)
+    # /history 只按名称子串筛选当前用户的会话: 先走 (user_id, factory, id) 索引缩小到单个用户,
+    # 保持与会话目录缓存相同的子串语义; 全文检索 (分词匹配, 按相关度排序) 由 /search 提供
+    if search is not None and search != '':
+        conditions.append(TSession.name.like('%'+search+'%'))
+    try:
+        query = select(TSession).where(*conditions).order_by(desc(TSession.id)).limit(limit + 1)
+        session_list = list((await session.execute(query)).scalars().all())
+        return session_list[:limit], len(session_list) > limit
+    finally:
+        if session is not None:
+            await TelegramBotDBRouter.return_session(session)
+
+
+async def batch_get_session_in_id_collection(session_id_list: List[int]) -> list[TSession]:
+    if len(session_id_list) == 0:
+        return []
+    session = await TelegramBotDBRouter.borrow_read_session()
+    try:
+        result = await session.execute(
+            select(TSession).where(TSession.id.in_(session_id_list), TSession.is_deleted == 0))
+        return list(result.scalars().all())
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
@@ -1,52 +1,84 @@
 import datetime
-from typing import List, Type
+from typing import List
+from sqlalchemy import select
+from cache.user_cache import profile_fingerprint
 from model.db.t_user import TUser
-from provider.db import TelegramBotDBManager
+from provider.cache import ChatUserCache
+from provider.db import TelegramBotDBManager, TelegramBotDBRouter
 from sqlalchemy.dialects.mysql import insert as mysql_upsert
-from util.dict_util import to_dict
+from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
 
 
-def batch_save_user(t_user_list: List[TUser]):
-    session = TelegramBotDBManager.borrow_session()
+async def batch_save_user(t_user_list: List[TUser]):
+    session = await TelegramBotDBManager.borrow_session()
     try:
         session.add_all(t_user_list)
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBManager.return_session(session)
 
 
-def batch_save_or_update(t_user_list: List[TUser]):
-    session = TelegramBotDBManager.borrow_session()
+def user_fingerprint(user: TUser) -> int:
+    return profile_fingerprint(user.first_name, user.last_name, user.full_name, user.is_bot, user.language_code)
+
+
+# 多行 upsert: mysql 使用 ON DUPLICATE KEY UPDATE, sqlite 使用 ON CONFLICT DO UPDATE
+def build_user_upsert(dialect: str, rows: list[dict]):
+    fields = ["first_name", "last_name", "full_name", "is_bot", "language_code", "updated_at"]
+    if dialect == 'sqlite':
+        stmt = sqlite_upsert(TUser).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[TUser.id], set_={field: stmt.excluded[field] for field in fields})
+    stmt = mysql_upsert(TUser).values(rows)
+    return stmt.on_duplicate_key_update({field: stmt.inserted[field] for field in fields})
+
+
+# 保存或更新用户, 资料指纹与上次写入一致的用户跳过
+async def batch_save_or_update(t_user_list: List[TUser]):
+    changed = {}
+    for user in t_user_list:
+        fingerprint = user_fingerprint(user)
+        if ChatUserCache.is_changed(user.id, fingerprint):
+            changed[user.id] = (user, fingerprint)
+    if len(changed) == 0:
+        return
+    now = datetime.datetime.now()
+    rows = [{
+        "id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "full_name": user.full_name,
+        "is_bot": user.is_bot,
+        "language_code": user.language_code,
+        "created_at": now,
+        "updated_at": now,
+    } for user, _ in changed.values()]
+    session = await TelegramBotDBManager.borrow_session()
     try:
-        for user in t_user_list:
-            stmt = mysql_upsert(TUser).values([to_dict(user)])
-            stmt = stmt.on_duplicate_key_update(
-                [
-                    ("first_name", user.first_name),
-                    ("last_name", user.last_name),
-                    ("full_name", user.full_name),
-                    ("is_bot", user.is_bot),
-                    ("language_code", user.language_code),
-                    ("updated_at", datetime.datetime.now()),
-                ]
-            )
-            session.execute(stmt)
-        session.commit()
+        await session.execute(build_user_upsert(TelegramBotDBManager.get_engine().dialect.name, rows))
+        await session.commit()
+        for user_id, (_, fingerprint) in changed.items():
+            ChatUserCache.remember(user_id, fingerprint)
+            TelegramBotDBRouter.mark_write(user_id)
+    except Exception:
+        for user_id in changed:
+            ChatUserCache.forget(user_id)
+        raise
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBManager.return_session(session)
 
 
-def batch_get_user_in_user_id_list(user_id_list: List[int]) -> list[Type[TUser]]:
+async def batch_get_user_in_user_id_list(user_id_list: List[int]) -> list[TUser]:
     if len(user_id_list) == 0:
         return []
-    session = TelegramBotDBManager.borrow_session()
+    session = await TelegramBotDBRouter.borrow_read_session()
     try:
         condition = TUser.id.in_(user_id_list)
         if len(user_id_list) == 1:
             condition = TUser.id == user_id_list[0]
-        user_list = session.query(TUser).filter(condition).all()
-        return user_list
+        user_list = (await session.execute(select(TUser).where(condition))).scalars().all()
+        return list(user_list)
     finally:
         if session is not None:
-            TelegramBotDBManager.return_session(session)
+            await TelegramBotDBRouter.return_session(session)
@@ -0,0 +1,40 @@
+from telegram import Bot, Message
+from provider.message import TelegramMessageScheduler
+from util.rate_limit_util import PRIORITY_EDIT, PRIORITY_REPLY
+
+
+# 发送消息
+async def send_message(bot: Bot, chat_id: int, text: str, priority: int = PRIORITY_REPLY, **kwargs) -> Message:
+    return await TelegramMessageScheduler.submit(
+        chat_id,
+        lambda: bot.send_message(chat_id, text=text, **kwargs),
+        priority,
+    )
+
+
+# 回复消息
+async def reply_text(message: Message, text: str, priority: int = PRIORITY_REPLY, **kwargs) -> Message:
+    return await TelegramMessageScheduler.submit(
+        message.chat_id,
+        lambda: message.reply_text(text, **kwargs),
+        priority,
+    )
+
+
+# 编辑消息 (同一条消息排队中的旧编辑会被新编辑覆盖, 被覆盖时返回 None)
+async def edit_text(message: Message, text: str, priority: int = PRIORITY_EDIT, **kwargs):
+    return await TelegramMessageScheduler.submit(
+        message.chat_id,
+        lambda: message.edit_text(text, **kwargs),
+        priority,
+        key=('edit', message.chat_id, message.message_id),
+    )
+
+
+# 删除消息
+async def delete_message(message: Message, priority: int = PRIORITY_REPLY):
+    return await TelegramMessageScheduler.submit(
+        message.chat_id,
+        lambda: message.delete(),
+        priority,
+    )
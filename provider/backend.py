@@ -0,0 +1,13 @@
+from backend.client import BackendClientManager, read_config_from_system, read_pool_config_from_system
+
+BackendClient = BackendClientManager(read_config_from_system(), read_pool_config_from_system())
+
+
+# 初始化模型后端客户端
+def init_backend():
+    BackendClient.configure(read_config_from_system(), read_pool_config_from_system())
+
+
+# 关闭模型后端客户端
+async def shutdown_backend(*args):
+    await BackendClient.shutdown()
@@ -0,0 +1,55 @@
+from cache.context_cache import ContextCache
+from cache.session_cache import SessionDirectoryCache
+from cache.user_cache import UserProfileCache
+from util.value_util import get_env_or_default
+
+
+def read_context_cache_config_from_system() -> dict:
+    return {
+        'max_sessions': int(get_env_or_default("TELEGRAM_CONTEXT_CACHE_SESSIONS", "1000")),
+        'max_bytes': int(get_env_or_default("TELEGRAM_CONTEXT_CACHE_BYTES", str(64 * 1024 * 1024))),
+    }
+
+
+ChatContextCache = ContextCache(**read_context_cache_config_from_system())
+
+
+# 初始化会话上下文缓存
+def init_context_cache():
+    config = read_context_cache_config_from_system()
+    ChatContextCache.max_sessions = config['max_sessions']
+    ChatContextCache.max_bytes = config['max_bytes']
+
+
+ChatUserCache = UserProfileCache(int(get_env_or_default("TELEGRAM_USER_CACHE_SIZE", "10000")))
+
+
+# 初始化用户资料缓存
+def init_user_cache():
+    ChatUserCache.max_users = int(get_env_or_default("TELEGRAM_USER_CACHE_SIZE", "10000"))
+
+
+def read_session_cache_config_from_system() -> dict:
+    return {
+        'max_users': int(get_env_or_default("TELEGRAM_SESSION_CACHE_USERS", "10000")),
+        'ttl': float(get_env_or_default("TELEGRAM_SESSION_CACHE_TTL", "600")),
+        'max_entries': int(get_env_or_default("TELEGRAM_SESSION_CACHE_ENTRIES", "500")),
+    }
+
+
+ChatSessionCache = SessionDirectoryCache(**read_session_cache_config_from_system())
+
+
+# 初始化会话目录缓存
+def init_session_cache():
+    config = read_session_cache_config_from_system()
+    ChatSessionCache.max_users = config['max_users']
+    ChatSessionCache.ttl = config['ttl']
+    ChatSessionCache.max_entries = config['max_entries']
+
+
+# 关闭时输出缓存指标
+async def shutdown_cache(*args):
+    print('context cache metrics:', ChatContextCache.metrics())
+    print('user cache metrics:', ChatUserCache.metrics())
+    print('session cache metrics:', ChatSessionCache.metrics())
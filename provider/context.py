@@ -0,0 +1,20 @@
+from module.chat.chatgpt.service.summary_service import ConversationCompactor, read_summary_config_from_system
+from util.context_window_util import ContextWindow, read_context_window_config_from_system
+
+# 上下文窗口裁剪策略
+ChatContextWindow = ContextWindow(read_context_window_config_from_system())
+
+# 会话后台摘要
+ChatCompactor = ConversationCompactor(read_summary_config_from_system(), ChatContextWindow.count)
+
+
+# 初始化上下文窗口配置
+def init_context_window():
+    ChatContextWindow.config = read_context_window_config_from_system()
+    ChatContextWindow._budget_cache.clear()
+    ChatCompactor.config = read_summary_config_from_system()
+
+
+# 停止后台摘要任务
+async def shutdown_compactor(*args):
+    await ChatCompactor.shutdown()
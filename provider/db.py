@@ -1,18 +1,45 @@
+import logging
 import os
-from db.engine import DBSessionManager
 
-env = os.environ
-TelegramBotDBManager = DBSessionManager(
-        core=int(env.get("TELEGRAM_DB_CORE_POOL_SIZE", "4")),
-        limit=int(env.get("TELEGRAM_DB_MAX_POOL_SIZE", "100"))
-)
+from db.engine import DBSessionManager, read_pool_config_from_system, read_conn_config_from_system
+from db.router import DBRouter, read_router_config_from_system
+from db.write_queue import WriteBehindQueue, read_write_config_from_system
+
+TelegramBotDBManager = DBSessionManager(read_pool_config_from_system(), read_conn_config_from_system())
+TelegramBotWriteQueue = WriteBehindQueue(TelegramBotDBManager, read_write_config_from_system())
+TelegramBotDBRouter = DBRouter(TelegramBotDBManager, read_router_config_from_system())
 
 
 # 初始化数据库
 def init_db():
-    e = os.environ
-    global TelegramBotDBManager
-    TelegramBotDBManager = DBSessionManager(
-        core=int(e.get("TELEGRAM_DB_CORE_POOL_SIZE", "4")),
-        limit=int(e.get("TELEGRAM_DB_MAX_POOL_SIZE", "100"))
-    )
+    TelegramBotDBManager.configure(read_pool_config_from_system(), read_conn_config_from_system())
+    TelegramBotWriteQueue.configure(read_write_config_from_system())
+    TelegramBotDBRouter.configure(read_router_config_from_system())
+
+
+# 启动只读副本延迟检测
+async def init_db_router(*args):
+    TelegramBotDBRouter.start()
+
+
+# 执行数据库迁移 (TELEGRAM_DB_MIGRATE=false 时跳过, 由运维手动执行 python -m db.migration)
+# 迁移失败时中止启动, 避免在不完整的表结构上运行
+async def migrate_db(*args):
+    if os.environ.get('TELEGRAM_DB_MIGRATE', 'true').lower() not in ['1', 'true', 'yes']:
+        return
+    from db.migration import Migrator
+    from db.migrations import MIGRATIONS
+    try:
+        await Migrator(TelegramBotDBManager.get_engine(), MIGRATIONS).upgrade()
+    except Exception:
+        logging.exception('migrate db failed')
+        raise
+
+
+# 关闭数据库连接池 (先排空写入队列)
+async def shutdown_db(*args):
+    await TelegramBotWriteQueue.shutdown()
+    print('db pool metrics:', TelegramBotDBManager.metrics())
+    print('db router metrics:', TelegramBotDBRouter.metrics())
+    await TelegramBotDBRouter.shutdown()
+    await TelegramBotDBManager.shutdown()
@@ -0,0 +1,82 @@
+import os
+from id.generator import DefaultIdGenerator
+from id.lease import WorkerLease, RedisLease, TableLease, FileLease, LeaseKeeper
+from id.options import IdGeneratorOptions
+from util.value_util import get_env_or_default
+
+
+def read_id_options_from_system(worker_id: int = None) -> IdGeneratorOptions:
+    if worker_id is None:
+        worker_id = int(get_env_or_default("TELEGRAM_ID_WORKER_ID", "0"))
+    return IdGeneratorOptions(
+        worker_id=worker_id,
+        worker_id_bit_length=int(get_env_or_default("TELEGRAM_ID_WORKER_BITS", "6")),
+        seq_bit_length=int(get_env_or_default("TELEGRAM_ID_SEQ_BITS", "6")),
+    )
+
+
+# 按 TELEGRAM_ID_LEASE 创建 worker id 租约 (redis / mysql / file), 未配置时使用固定的 TELEGRAM_ID_WORKER_ID
+def create_lease_from_system() -> WorkerLease | None:
+    kind = get_env_or_default("TELEGRAM_ID_LEASE", "").lower()
+    max_worker_id = (1 << int(get_env_or_default("TELEGRAM_ID_WORKER_BITS", "6"))) - 1
+    ttl = int(get_env_or_default("TELEGRAM_ID_LEASE_TTL", "15"))
+    if kind == 'redis':
+        import redis
+        redis_impl = redis.StrictRedis(
+            host=get_env_or_default("TELEGRAM_ID_REDIS_HOST", "localhost"),
+            port=int(get_env_or_default("TELEGRAM_ID_REDIS_PORT", "6379")),
+            password=os.environ.get("TELEGRAM_ID_REDIS_PASSWORD") or None,
+            db=0,
+        )
+        return RedisLease(redis_impl, max_worker_id, ttl)
+    if kind == 'mysql':
+        from sqlalchemy import create_engine
+        from db.engine import read_config_from_system, to_sync_link
+        # 租约在线程中同步执行, 配置为 asyncio 驱动时换成对应的同步驱动
+        link = to_sync_link(read_config_from_system().get_link())
+        engine = create_engine(link, pool_size=1, max_overflow=0, pool_pre_ping=True)
+        return TableLease(engine, max_worker_id, ttl)
+    if kind == 'file':
+        return FileLease(get_env_or_default("TELEGRAM_ID_LEASE_DIR", "/tmp/telegram-bot-worker-ids"), max_worker_id)
+    return None
+
+
+TelegramIdGenerator = DefaultIdGenerator()
+TelegramIdGenerator.set_id_generator(read_id_options_from_system())
+IdLeaseKeeper: LeaseKeeper | None = None
+
+
+# 初始化主键生成器
+def init_id_generator():
+    TelegramIdGenerator.set_id_generator(read_id_options_from_system())
+
+
+# worker id 租约丢失时停止发号, 避免与接管该 worker id 的实例生成重复主键
+def on_id_lease_lost(worker_id: int):
+    TelegramIdGenerator.suspend()
+
+
+# 重新获取到 worker id 后恢复发号
+def on_id_lease_acquired(worker_id: int):
+    print(f'worker id lease acquired: {worker_id}')
+    TelegramIdGenerator.set_id_generator(read_id_options_from_system(worker_id))
+
+
+# 获取 worker id 租约并重新设置主键生成器 (在事件循环中执行, 获取过程不阻塞循环)
+async def init_id_lease(*args):
+    global IdLeaseKeeper
+    lease = create_lease_from_system()
+    if lease is None:
+        return
+    IdLeaseKeeper = LeaseKeeper(lease, on_lost=on_id_lease_lost, on_acquired=on_id_lease_acquired)
+    worker_id = await IdLeaseKeeper.start()
+    if worker_id < 0:
+        raise RuntimeError('no worker id available')
+    print(f'worker id lease acquired: {worker_id}')
+    TelegramIdGenerator.set_id_generator(read_id_options_from_system(worker_id))
+
+
+# 释放 worker id 租约
+async def shutdown_id_lease(*args):
+    if IdLeaseKeeper is not None:
+        await IdLeaseKeeper.shutdown()
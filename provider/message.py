@@ -0,0 +1,23 @@
+import os
+from util.cadence_util import read_cadence_config_from_system
+from util.rate_limit_util import MessageScheduler
+
+
+def read_scheduler_from_system() -> MessageScheduler:
+    env = os.environ
+    return MessageScheduler(
+        global_rate=float(env.get("TELEGRAM_RATE_GLOBAL_PER_SECOND", "30")),
+        private_rate=float(env.get("TELEGRAM_RATE_PRIVATE_PER_SECOND", "1")),
+        group_rate=float(env.get("TELEGRAM_RATE_GROUP_PER_MINUTE", "20")) / 60,
+    )
+
+
+TelegramMessageScheduler = read_scheduler_from_system()
+
+# 流式编辑节奏策略
+EditCadenceConfig = read_cadence_config_from_system()
+
+
+# 关闭消息调度器
+async def shutdown_message_scheduler(*args):
+    await TelegramMessageScheduler.shutdown()
@@ -0,0 +1,8 @@
+from util.render_pool_util import RenderPool, read_render_pool_config_from_system
+
+MarkdownRenderPool = RenderPool(read_render_pool_config_from_system())
+
+
+# 关闭渲染池
+async def shutdown_render_pool(*args):
+    MarkdownRenderPool.shutdown()
@@ -0,0 +1,29 @@
+from db.write_queue import WriteBehindQueue, read_write_config_from_system
+from provider.db import TelegramBotDBManager
+from provider.id import TelegramIdGenerator
+from search.backfill import SearchBackfill
+from search.index import SearchIndex, create_search_index
+
+# 检索文档单独组提交, 写入失败不影响问题/回复的保存
+SearchWriteQueue = WriteBehindQueue(TelegramBotDBManager, read_write_config_from_system())
+ChatSearchIndex: SearchIndex | None = None
+SearchBackfillTask = SearchBackfill(TelegramBotDBManager, TelegramIdGenerator.next_ids)
+
+
+# 获取检索后端 (首次使用时按数据库类型创建)
+def get_search_index() -> SearchIndex:
+    global ChatSearchIndex
+    if ChatSearchIndex is None:
+        ChatSearchIndex = create_search_index(TelegramBotDBManager)
+    return ChatSearchIndex
+
+
+# 在后台回填检索表上线前的历史 (迁移与 worker id 租约之后调用)
+async def init_search(*args):
+    SearchBackfillTask.start()
+
+
+# 停止回填并排空检索文档写入队列
+async def shutdown_search(*args):
+    await SearchBackfillTask.shutdown()
+    await SearchWriteQueue.shutdown()
@@ -0,0 +1,119 @@
+import asyncio
+from typing import Callable
+
+from sqlalchemy import select, update
+
+from cache.context_cache import SUMMARY_TYPE
+from db.engine import DBSessionManager
+from model.db.t_answer import TAnswer
+from model.db.t_question import TQuestion
+from model.db.t_search_backfill import TSearchBackfill
+from model.db.t_search_doc import TSearchDoc
+from model.db.t_session import TSession
+from search.index import KIND_SESSION, KIND_QUESTION, KIND_ANSWER
+
+
+# 回填来源: 文档类型 -> (分页键, 查询 (id, user_id, factory, session_id, ref_id, content))
+# 摘要问题/回复不建索引, 回复文档以问题 id 关联, 与增量索引一致
+def backfill_sources() -> dict:
+    session, question, answer = TSession.__table__, TQuestion.__table__, TAnswer.__table__
+    return {
+        KIND_SESSION: (session.c.id, select(
+            session.c.id, session.c.user_id, session.c.factory, session.c.id, session.c.id, session.c.name,
+        ).where(session.c.is_deleted == 0)),
+        KIND_QUESTION: (question.c.id, select(
+            question.c.id, session.c.user_id, session.c.factory, question.c.session_id, question.c.id,
+            question.c.content,
+        ).join(session, session.c.id == question.c.session_id).where(
+            question.c.is_deleted == 0, question.c.type != SUMMARY_TYPE)),
+        KIND_ANSWER: (answer.c.id, select(
+            answer.c.id, session.c.user_id, session.c.factory, answer.c.session_id, answer.c.question_id,
+            answer.c.content,
+        ).join(session, session.c.id == answer.c.session_id).where(
+            answer.c.is_deleted == 0, answer.c.type != SUMMARY_TYPE)),
+    }
+
+
+# 检索文档回填
+class SearchBackfill:
+    """
+    为检索表上线前已有的会话名/问题/回复建立检索文档
+    - 迁移在 t_search_backfill 中为每种文档记录截止 id (之后的行由增量索引写入)
+    - 按来源表 id 键集分页, 每批一个事务: 删除该批已有的文档后插入, 并推进进度
+    - 启动后作为后台任务运行, 不阻塞启动; 中断后从上次提交的位置继续
+    - 文档 id 由 next_ids 分配, 应在获取 worker id 租约之后启动
+    """
+
+    def __init__(self, manager: DBSessionManager, next_ids: Callable[[int], list[int]], batch: int = 500,
+                 pause: float = 0.05):
+        self.manager = manager
+        self.next_ids = next_ids
+        self.batch = batch
+        # 批次之间的间隔 (秒), 为在线请求让出连接
+        self.pause = pause
+        self._task: asyncio.Task | None = None
+        # 指标: 提交批次数, 写入文档数
+        self.batches = 0
+        self.docs = 0
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        try:
+            async with self.manager.get_engine().connect() as conn:
+                progress = (await conn.execute(select(TSearchBackfill.kind, TSearchBackfill.end_id).where(
+                    TSearchBackfill.done == 0).order_by(TSearchBackfill.kind))).all()
+            sources = backfill_sources()
+            for row in progress:
+                key, query = sources[row.kind]
+                while not await self.copy_batch(row.kind, key, query, row.end_id):
+                    await asyncio.sleep(self.pause)
+            if len(progress) > 0:
+                print(f'search backfill finished: {self.batches} batches, {self.docs} docs')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 进度按批提交, 下次启动时继续
+            print(f'search backfill failed: {e}')
+
+    # 复制一批, 返回该类型是否已全部完成
+    async def copy_batch(self, kind: int, key, query, end_id: int) -> bool:
+        table = TSearchBackfill.__table__
+        docs = TSearchDoc.__table__
+        async with self.manager.get_engine().begin() as conn:
+            last_id = (await conn.execute(select(table.c.last_id).where(table.c.kind == kind))).scalar()
+            rows = (await conn.execute(
+                query.where(key > last_id, key <= end_id).order_by(key).limit(self.batch))).all()
+            if len(rows) == 0:
+                await conn.execute(update(table).where(table.c.kind == kind).values(done=1))
+                return True
+            last_id = rows[-1][0]
+            rows = [row for row in rows if row[5] is not None and row[5].strip() != '']
+            if len(rows) > 0:
+                # 删除已由增量索引写入的同一内容, 避免重复文档
+                await conn.execute(docs.delete().where(
+                    docs.c.user_id.in_({row[1] for row in rows}),
+                    docs.c.kind == kind,
+                    docs.c.ref_id.in_({row[4] for row in rows}),
+                ))
+                await conn.execute(docs.insert(), [{
+                    'id': doc_id, 'user_id': row[1], 'factory': row[2], 'session_id': row[3], 'kind': kind,
+                    'ref_id': row[4], 'content': row[5],
+                } for doc_id, row in zip(self.next_ids(len(rows)), rows)])
+            await conn.execute(update(table).where(table.c.kind == kind).values(last_id=last_id))
+        self.batches += 1
+        self.docs += len(rows)
+        return False
+
+    async def shutdown(self):
+        task = self._task
+        self._task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+
+from sqlalchemy import text
+
+from db.engine import DBSessionManager
+
+# 文档类型
+KIND_SESSION = 0
+KIND_QUESTION = 1
+KIND_ANSWER = 2
+
+
+# 检索结果
+class SearchHit:
+    def __init__(self, session_id: int, kind: int, ref_id: int, content: str, score: float):
+        self.session_id = session_id
+        self.kind = kind
+        self.ref_id = ref_id
+        self.content = content
+        # 相关度, 越大越相关
+        self.score = score
+
+
+# 全文检索后端
+class SearchIndex(ABC):
+    """
+    基于 t_search_doc 的全文检索
+    - 子类实现 schema() (建表语句, 由迁移执行) 与 match_query() (全文匹配查询)
+    - search() 返回按相关度排序的命中文档
+    - 检索词短于分词长度 (min_term) 时退回 LIKE 匹配
+    """
+
+    TABLE = 't_search_doc'
+    min_term = 1
+
+    def __init__(self, manager: DBSessionManager):
+        self.manager = manager
+
+    @abstractmethod
+    def schema(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    def match_query(self) -> str:
+        pass
+
+    def match_term(self, term: str) -> str:
+        return term
+
+    async def search(self, user_id: int, factory: str, term: str, limit: int = 20) -> list[SearchHit]:
+        term = term.strip()
+        if term == '':
+            return []
+        params = {'user_id': user_id, 'factory': factory, 'limit': limit}
+        if len(term) < self.min_term:
+            query = f"SELECT session_id, kind, ref_id, content, 0 AS score FROM {self.TABLE} " \
+                    "WHERE user_id = :user_id AND factory = :factory AND content LIKE :like ESCAPE '!' " \
+                    "ORDER BY session_id DESC LIMIT :limit"
+            params['like'] = '%' + term.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+        else:
+            query = self.match_query()
+            params['term'] = self.match_term(term)
+        session = await self.manager.borrow_session()
+        try:
+            rows = (await session.execute(text(query), params)).all()
+            return [SearchHit(int(row[0]), int(row[1]), int(row[2]), row[3], float(row[4])) for row in rows]
+        finally:
+            if session is not None:
+                await self.manager.return_session(session)
+
+
+# MySQL FULLTEXT 索引 (ngram 分词, 支持中文)
+class MySQLFullTextIndex(SearchIndex):
+    # 与 ngram_token_size 默认值一致
+    min_term = 2
+
+    def schema(self) -> list[str]:
+        return [
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            "id BIGINT NOT NULL PRIMARY KEY, "
+            "user_id BIGINT NOT NULL, "
+            "factory VARCHAR(50) NOT NULL, "
+            "session_id BIGINT NOT NULL, "
+            "kind INT NOT NULL DEFAULT 0, "
+            "ref_id BIGINT NOT NULL DEFAULT 0, "
+            "content TEXT NOT NULL, "
+            "KEY idx_search_doc_user (user_id, factory), "
+            "FULLTEXT KEY ft_search_doc_content (content) WITH PARSER ngram"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        ]
+
+    def match_query(self) -> str:
+        return f"SELECT session_id, kind, ref_id, content, " \
+               "MATCH(content) AGAINST(:term IN NATURAL LANGUAGE MODE) AS score " \
+               f"FROM {self.TABLE} WHERE user_id = :user_id AND factory = :factory " \
+               "AND MATCH(content) AGAINST(:term IN NATURAL LANGUAGE MODE) " \
+               "ORDER BY score DESC LIMIT :limit"
+
+
+# SQLite FTS5 索引 (trigram 分词, 本地/测试使用)
+class SQLiteFTSIndex(SearchIndex):
+    min_term = 3
+
+    def schema(self) -> list[str]:
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+            "content, id UNINDEXED, user_id UNINDEXED, factory UNINDEXED, "
+            "session_id UNINDEXED, kind UNINDEXED, ref_id UNINDEXED, tokenize='trigram')"
+        ]
+
+    # 作为短语匹配, 避免检索词中的 FTS5 语法字符
+    def match_term(self, term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
+
+    def match_query(self) -> str:
+        # bm25 越小越相关, 取负数与其他后端保持一致
+        return f"SELECT session_id, kind, ref_id, content, -bm25({self.TABLE}) AS score " \
+               f"FROM {self.TABLE} WHERE {self.TABLE} MATCH :term " \
+               "AND user_id = :user_id AND factory = :factory " \
+               "ORDER BY score DESC LIMIT :limit"
+
+
+# 按数据库类型创建检索后端
+def create_search_index(manager: DBSessionManager) -> SearchIndex:
+    dialect = manager.get_engine().dialect.name
+    if dialect == 'sqlite':
+        return SQLiteFTSIndex(manager)
+    return MySQLFullTextIndex(manager)
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from util.buffer_util import AnswerBuffer
+from util.cadence_util import CadenceConfig, CadenceController
+from util.stream_render_util import ReplyRenderer
+
+
+def test_min_interval_by_chat_type():
+    config = CadenceConfig(min_interval=0.6, group_min_interval=3.0, max_interval=5.0)
+    assert CadenceController(config).next_interval() == pytest.approx(0.6)
+    assert CadenceController(config, chat_type='supergroup').next_interval() == pytest.approx(3.0)
+    # 最长间隔不低于群组最短间隔
+    config = CadenceConfig(min_interval=0.6, group_min_interval=3.0, max_interval=1.0)
+    assert CadenceController(config, chat_type='group').next_interval() == pytest.approx(3.0)
+
+
+# 增长慢时拉长间隔, 积累够 target_bytes 后收窄
+def test_growth_rate():
+    controller = CadenceController(CadenceConfig(min_interval=0.5, max_interval=5.0, target_bytes=300,
+                                                 smoothing=1.0))
+    controller.observe(added=50, elapsed=1.0, rtt=0)
+    assert controller.next_interval(pending=50) == pytest.approx(5.0)
+    controller.observe(added=200, elapsed=1.0, rtt=0)
+    assert controller.next_interval(pending=50) == pytest.approx(1.5)
+    assert controller.next_interval(pending=300) == pytest.approx(0.5)
+    controller.observe(added=3000, elapsed=1.0, rtt=0)
+    assert controller.next_interval(pending=50) == pytest.approx(0.5)
+
+
+# 间隔不低于编辑耗时的 rtt_factor 倍, 耗时按指数平滑
+def test_rtt():
+    controller = CadenceController(CadenceConfig(min_interval=0.5, rtt_factor=2.0, smoothing=0.5))
+    controller.observe(added=1000, elapsed=0.1, rtt=1.0)
+    assert controller.next_interval(pending=1000) == pytest.approx(2.0)
+    controller.observe(added=1000, elapsed=0.1, rtt=0.2)
+    assert controller.rtt == pytest.approx(0.6)
+    assert controller.next_interval(pending=1000) == pytest.approx(1.2)
+
+
+# 全局调度压力放大间隔, 不超过最长间隔
+def test_pressure():
+    pressure = [0.0]
+    controller = CadenceController(CadenceConfig(min_interval=1.0, max_interval=5.0, pressure_factor=2.0),
+                                   pressure=lambda: pressure[0])
+    assert controller.next_interval() == pytest.approx(1.0)
+    pressure[0] = 0.5
+    assert controller.next_interval() == pytest.approx(2.0)
+    pressure[0] = 1.0
+    assert controller.next_interval() == pytest.approx(3.0)
+    controller.observe(added=1000, elapsed=0.1, rtt=2.0)
+    assert controller.next_interval(pending=1000) == pytest.approx(5.0)
+
+
+async def stream(config: CadenceConfig, edit_time: float = 0.0) -> tuple[int, str]:
+    buffer = AnswerBuffer()
+    rendered = []
+
+    async def render(final: bool):
+        await asyncio.sleep(edit_time)
+        rendered.append(buffer.text())
+
+    renderer = ReplyRenderer(render, buffer, CadenceController(config))
+    renderer.start()
+    # 匀速增长的回复: 每 10 毫秒 5 个字符, 共 300 个字符
+    for _ in range(60):
+        await renderer.push('x' * 5)
+        await asyncio.sleep(0.01)
+    await renderer.finish()
+    return renderer.renders, rendered[-1]
+
+
+# 自适应节奏比固定最短间隔编辑次数更少, 最终内容完整
+def test_fewer_edits():
+    async def main():
+        fixed, text = await stream(CadenceConfig(min_interval=0.02, max_interval=1.0, target_bytes=0))
+        assert text == 'x' * 300
+        adaptive, text = await stream(CadenceConfig(min_interval=0.02, max_interval=1.0, target_bytes=50))
+        assert text == 'x' * 300
+        assert adaptive * 2 < fixed
+        # 编辑较慢时同样减少编辑次数
+        slow, text = await stream(CadenceConfig(min_interval=0.02, max_interval=1.0, target_bytes=0), 0.03)
+        assert text == 'x' * 300
+        assert slow * 2 < fixed
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+
+# 使用临时 sqlite 库, 需在导入 provider 之前设置
+os.environ['TELEGRAM_DB_TYPE'] = 'sqlite+aiosqlite'
+os.environ['TELEGRAM_DB_DATABASE'] = os.path.join(tempfile.mkdtemp(), 'compactor.db')
+
+from cache.context_cache import SUMMARY_TYPE
+from model.db.t_answer import TAnswer
+from model.db.t_question import TQuestion
+from module.chat.chatgpt.service.chatgpt_service import save_chat_question, save_chat_answer, get_chat_history
+from module.chat.chatgpt.service.summary_service import ConversationCompactor, SummaryConfig, SUMMARY_PROMPT
+from provider.cache import ChatContextCache
+from provider.db import migrate_db, shutdown_db
+
+
+# 按字符数估算长度
+def count(messages: list[dict]) -> int:
+    return sum(len(message['content']) for message in messages)
+
+
+# 本地摘要桩: 记录请求的消息, 返回固定摘要
+class StubSummarizer:
+    def __init__(self, delay: float = 0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls: list[list[dict]] = []
+
+    async def __call__(self, messages: list[dict], factory: str, model: str, create_payload) -> str:
+        self.calls.append(messages)
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f'summary {len(self.calls)}'
+
+
+def run(case):
+    async def main():
+        await migrate_db()
+        try:
+            await case()
+        finally:
+            await shutdown_db()
+
+    asyncio.run(main())
+
+
+# 追加一轮问答, 返回问题 id
+async def add_turn(session_id: int, parent_id: int, index: int) -> int:
+    question = await save_chat_question(TQuestion(session_id=session_id, parent_id=parent_id, type=0,
+                                                  content=f'question {index}'))
+    await save_chat_answer(TAnswer(session_id=session_id, question_id=question.id, type=0,
+                                   content=f'answer {index}'))
+    return question.id
+
+
+async def add_turns(session_id: int, turns: int) -> int:
+    parent_id = 0
+    for index in range(turns):
+        parent_id = await add_turn(session_id, parent_id, index)
+    return parent_id
+
+
+def create_compactor(summarize: StubSummarizer, threshold: int = 50) -> ConversationCompactor:
+    return ConversationCompactor(SummaryConfig(threshold=threshold, keep_turns=2, min_turns=2), count, summarize)
+
+
+# 摘要较早的轮次, 加载历史时以摘要代替被覆盖的问题
+def test_compact():
+    async def case():
+        session_id = 1001
+        last_id = await add_turns(session_id, 6)
+        summarize = StubSummarizer()
+        compactor = create_compactor(summarize)
+        assert await compactor.compact(session_id, last_id, 'gpt', 'm', 'single', None)
+        assert compactor.summaries == 1
+        # 只摘要保留轮次之前的部分
+        assert [message['content'] for message in summarize.calls[0]][-2:] == ['question 3', 'answer 3']
+        assert len(summarize.calls[0]) == 8
+
+        expected = [SUMMARY_PROMPT, 'summary 1', 'question 4', 'answer 4', 'question 5', 'answer 5']
+        history = await get_chat_history(session_id, last_id, 'single')
+        assert [message['content'] for message in history] == expected
+        # 摘要已落库, 重新加载后结果相同
+        ChatContextCache.invalidate(session_id)
+        history = await get_chat_history(session_id, last_id, 'single')
+        assert [message['content'] for message in history] == expected
+
+    run(case)
+
+
+# 未超过阈值或可摘要轮数不足时不执行
+def test_skip():
+    async def case():
+        summarize = StubSummarizer()
+        last_id = await add_turns(1002, 6)
+        assert not await create_compactor(summarize, threshold=10000).compact(1002, last_id, 'gpt', 'm', 'single',
+                                                                             None)
+        last_id = await add_turns(1003, 3)
+        assert not await create_compactor(summarize, threshold=0).compact(1003, last_id, 'gpt', 'm', 'single',
+                                                                          None)
+        assert summarize.calls == []
+        history = await get_chat_history(1003, last_id, 'single')
+        assert len(history) == 6 and all(message['content'] != SUMMARY_PROMPT for message in history)
+
+    run(case)
+
+
+# 长会话反复压缩后每轮的历史长度保持稳定
+def test_bounded_history():
+    async def case():
+        session_id = 1004
+        compactor = create_compactor(StubSummarizer())
+        parent_id = 0
+        sizes = []
+        for index in range(20):
+            parent_id = await add_turn(session_id, parent_id, index)
+            await compactor.compact(session_id, parent_id, 'gpt', 'm', 'single', None)
+            sizes.append(len(await get_chat_history(session_id, parent_id, 'single')))
+        assert compactor.summaries > 3
+        assert max(sizes[5:]) <= 8
+        history = await get_chat_history(session_id, parent_id, 'single')
+        assert [message['content'] for message in history][-2:] == ['question 19', 'answer 19']
+
+    run(case)
+
+
+# 每个会话同时只运行一个压缩任务; 后端失败时不写入摘要
+def test_schedule_and_failure():
+    async def case():
+        last_id = await add_turns(1005, 6)
+        summarize = StubSummarizer(delay=0.05)
+        compactor = create_compactor(summarize)
+        task = compactor.schedule(1005, last_id, 'gpt', 'm', 'single', None)
+        assert task is not None
+        assert compactor.schedule(1005, last_id, 'gpt', 'm', 'single', None) is None
+        assert await task
+        assert len(summarize.calls) == 1
+        assert compactor.running == set() and compactor.tasks == set()
+
+        last_id = await add_turns(1006, 6)
+        compactor = create_compactor(StubSummarizer(error=ConnectionError('backend unavailable')))
+        assert not await compactor.compact(1006, last_id, 'gpt', 'm', 'single', None)
+        assert compactor.failures == 1 and compactor.summaries == 0
+        context = ChatContextCache.get(1006)
+        assert all(node.type != SUMMARY_TYPE for node in context.nodes.values())
+
+    run(case)
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+# 主库与副本各用一个 sqlite 文件, 复制文件模拟主从同步
+directory = tempfile.mkdtemp()
+primary_path = os.path.join(directory, 'primary.db')
+replica_path = os.path.join(directory, 'replica.db')
+os.environ['TELEGRAM_DB_TYPE'] = 'sqlite+aiosqlite'
+os.environ['TELEGRAM_DB_DATABASE'] = primary_path
+
+from db.config import DBRouterConfig
+from db.migration import Migrator
+from db.migrations import MIGRATIONS
+from model.db.t_session import TSession
+from module.repo.chat.session_repo import batch_save_session, batch_get_session_in_user_collection
+from provider.db import TelegramBotDBManager, TelegramBotDBRouter
+
+
+def replicate():
+    shutil.copy(primary_path, replica_path)
+
+
+async def session_names(user_id: int) -> list[str]:
+    return [s.name for s in await batch_get_session_in_user_collection([user_id], factory='gpt')]
+
+
+async def main():
+    router = TelegramBotDBRouter
+    try:
+        await Migrator(TelegramBotDBManager.get_engine(), MIGRATIONS).upgrade()
+        await batch_save_session([TSession(user_id=1, name='a', factory='gpt', model='m')])
+        replicate()
+        router.configure(DBRouterConfig([f'sqlite:///{replica_path}'], sticky=0.3, max_lag=0.5, retry=60, interval=0.1))
+
+        # 读取走副本
+        router.bind_user(1)
+        assert await session_names(1) == ['a']
+        assert router.replicas[0].reads == 1
+
+        # 写入后窗口内读主库 (读己之写), 其他用户仍读副本
+        await batch_save_session([TSession(user_id=1, name='b', factory='gpt', model='m')])
+        assert await session_names(1) == ['b', 'a']
+        router.bind_user(2)
+        await session_names(2)
+        assert router.replicas[0].reads == 2
+
+        # 窗口过后回到 (尚未同步的) 副本
+        router.bind_user(1)
+        await asyncio.sleep(0.35)
+        assert await session_names(1) == ['a']
+
+        # 副本延迟超过 max_lag 时退回主库, 追上后恢复
+        await router.check_lag()
+        await asyncio.sleep(0.6)
+        await router.check_lag()
+        assert router.replicas[0].lag > 0.5
+        assert await session_names(1) == ['b', 'a']
+        replicate()
+        await router.check_lag()
+        assert router.replicas[0].lag == 0
+        reads = router.replicas[0].reads
+        assert await session_names(1) == ['b', 'a']
+        assert router.replicas[0].reads == reads + 1
+        await router.shutdown()
+
+        # 副本不可用时退回主库, retry 秒内不再尝试
+        router.configure(DBRouterConfig([f'sqlite:///{directory}/missing/replica.db'],
+                                        sticky=0.3, max_lag=0.5, retry=60, interval=0.1))
+        assert await session_names(1) == ['b', 'a']
+        assert await session_names(1) == ['b', 'a']
+        assert router.replicas[0].failures == 1
+        print('router metrics:', router.metrics())
+        print('ok')
+    finally:
+        await router.shutdown()
+        await TelegramBotDBManager.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
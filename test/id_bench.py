@@ -0,0 +1,44 @@
+import threading
+import time
+
+from id.generator import DefaultIdGenerator
+from id.options import IdGeneratorOptions
+
+
+def create_generator(seq_bit_length: int) -> DefaultIdGenerator:
+    generator = DefaultIdGenerator()
+    generator.set_id_generator(IdGeneratorOptions(worker_id=1, seq_bit_length=seq_bit_length))
+    return generator
+
+
+# 单线程逐个/批量获取 total 个 id 的吞吐 (ids/sec)
+def bench(generator: DefaultIdGenerator, total: int, batch: int) -> float:
+    start = time.perf_counter()
+    if batch <= 1:
+        for _ in range(total):
+            generator.next_id()
+    else:
+        for _ in range(total // batch):
+            generator.next_ids(batch)
+    return total / (time.perf_counter() - start)
+
+
+# 多线程竞争同一把锁时的吞吐
+def bench_threads(generator: DefaultIdGenerator, total: int, batch: int, threads: int) -> float:
+    per_thread = total // threads
+    workers = [threading.Thread(target=bench, args=(generator, per_thread, batch)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    total = 200000
+    for seq_bits in [6, 12]:
+        for batch in [1, 16, 256]:
+            single = bench(create_generator(seq_bits), total, batch)
+            threaded = bench_threads(create_generator(seq_bits), total, batch, 4)
+            print(f'seq_bits={seq_bits:>2} batch={batch:>3}: {single:>12,.0f} ids/s, 4 threads {threaded:>12,.0f} ids/s')
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+from id.generator import DefaultIdGenerator
+from id.lease import WorkerLease, LeaseKeeper
+from id.options import IdGeneratorOptions
+
+
+# 续期一直抛异常的租约 (模拟 redis / 数据库不可用)
+class BrokenLease(WorkerLease):
+    def __init__(self, ttl: float):
+        super().__init__(max_worker_id=63, ttl=ttl)
+
+    def acquire(self) -> int:
+        return 5
+
+    def renew(self, worker_id: int) -> bool:
+        raise ConnectionError('lease store unavailable')
+
+    def try_acquire(self, worker_id: int) -> bool:
+        raise ConnectionError('lease store unavailable')
+
+    def release(self, worker_id: int):
+        pass
+
+
+def test_suspend_before_expiry():
+    async def main():
+        generator = DefaultIdGenerator()
+        generator.set_id_generator(IdGeneratorOptions(worker_id=5))
+        lease = BrokenLease(ttl=0.6)
+        lost_at = []
+
+        def on_lost(worker_id: int):
+            lost_at.append(time.monotonic())
+            generator.suspend()
+
+        keeper = LeaseKeeper(lease, on_lost=on_lost)
+        begin = time.monotonic()
+        assert await keeper.start() == 5
+        generator.next_id()
+        await asyncio.sleep(lease.ttl)
+        await keeper.shutdown()
+        assert len(lost_at) == 1
+        # 在租约过期 (其他实例可以接管) 之前停止发号
+        assert lost_at[0] - begin < lease.ttl
+        with pytest.raises(ValueError):
+            generator.next_id()
+
+    asyncio.run(main())
+
+
+# 数据库配置为 asyncio 驱动时, 表租约使用对应的同步驱动
+def test_table_lease_with_async_link():
+    from sqlalchemy import create_engine
+    from db.engine import to_sync_link
+    from id.lease import TableLease
+    database = os.path.join(tempfile.mkdtemp(), 'lease.db')
+    link = to_sync_link(f'sqlite+aiosqlite:///{database}')
+    assert link == f'sqlite:///{database}'
+    lease = TableLease(create_engine(link), max_worker_id=3, ttl=15)
+    other = TableLease(create_engine(link), max_worker_id=3, ttl=15)
+    first = lease.acquire()
+    second = other.acquire()
+    assert first > -1 and second > -1 and first != second
+    assert lease.renew(first)
+    assert not other.renew(first)
+    assert to_sync_link('mysql+aiomysql://u:p@h/db') == 'mysql+pymysql://u:p@h/db'
+    assert to_sync_link('mysql+pymysql://u:p@h/db') == 'mysql+pymysql://u:p@h/db'
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
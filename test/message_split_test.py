@@ -0,0 +1,73 @@
+import random
+
+from util.message_split_util import split_message, utf16_len, FENCE, TELEGRAM_MESSAGE_LIMIT
+
+WORDS = ['hello', 'world', '你好', '世界', '😀', '𝔘𝔫𝔦', '\\.', '\\\\', '\\_', 'a' * 50]
+FENCES = ['```\n', '```python\n', '```py\n', '```\n']
+
+
+# 随机生成含代码块, 空行, 转义符, 代理对与超长行的文本
+def random_text(rng: random.Random, lines: int) -> str:
+    result = []
+    for _ in range(lines):
+        kind = rng.random()
+        if kind < 0.15:
+            result.append(rng.choice(FENCES))
+        elif kind < 0.3:
+            result.append('\n')
+        elif kind < 0.35:
+            result.append(''.join(rng.choice(WORDS) for _ in range(rng.randint(200, 2000))) + '\n')
+        else:
+            result.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 30))) + '\n')
+    return ''.join(result).rstrip('\n')
+
+
+def trailing_backslashes(text: str) -> int:
+    return len(text) - len(text.rstrip('\\'))
+
+
+def check_parts(text: str, limit: int):
+    parts = split_message(text, limit)
+    for part in parts:
+        assert utf16_len(part) <= limit, (limit, utf16_len(part), part[:80])
+        body = part[:-len(FENCE)].rstrip('\n') if part.endswith(FENCE) else part
+        assert trailing_backslashes(body) % 2 == 0, part[-20:]
+        assert any(line.strip() and not line.lstrip().startswith(FENCE) for line in part.splitlines()), part
+    if FENCE not in text:
+        assert ''.join(''.join(parts).split()) == ''.join(text.split())
+
+
+def test_fence_closing_reserved():
+    limit = TELEGRAM_MESSAGE_LIMIT
+    body = 'x' * (limit - len('```python\n\n```\n\n') - len('```python\n') - 1)
+    text = '```python\n' + body + '\n```\n\n```python\n```\n' + 'tail'
+    check_parts(text, limit)
+
+
+def test_fence_only_part_dropped():
+    assert split_message('```py\n```\n' + 'a' * 20, 12) == ['a' * 12, 'a' * 8]
+
+
+def test_escape_not_cut():
+    for text in ['a' + '\\\\' * 30, '\\.' * 40, 'ab' + '\\' * 40]:
+        for limit in range(2, 20):
+            check_parts(text, limit)
+
+
+def test_fuzz_telegram_limit():
+    rng = random.Random(7)
+    for _ in range(200):
+        check_parts(random_text(rng, rng.randint(1, 400)), TELEGRAM_MESSAGE_LIMIT)
+
+
+def test_fuzz_small_limits():
+    rng = random.Random(11)
+    for _ in range(300):
+        check_parts(random_text(rng, rng.randint(1, 60)), rng.randint(40, 600))
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
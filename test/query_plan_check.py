@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# 未配置数据库时使用临时 sqlite 库
+if os.environ.get('TELEGRAM_DB_TYPE') is None:
+    os.environ['TELEGRAM_DB_TYPE'] = 'sqlite+aiosqlite'
+    os.environ['TELEGRAM_DB_DATABASE'] = os.path.join(tempfile.mkdtemp(), 'query_plan.db')
+
+from db.migration import Migrator
+from db.migrations import MIGRATIONS, CORE_TABLES
+from db.query_plan import QueryRecorder, find_full_scans
+from module.repo.chat.answer_repo import batch_get_answer_in_session_collection, \
+    batch_get_answer_in_question_collection
+from module.repo.chat.question_repo import batch_get_question_in_session_collection, get_latest_question, \
+    get_question_path, batch_get_summary_question_in_parent_collection
+from module.repo.chat.session_repo import get_session_id_by_name, is_exist_session, get_session_by_name, \
+    get_last_session, get_session_page, batch_get_session_in_id_collection, batch_get_session_in_user_collection
+from module.repo.user.user_repo import batch_get_user_in_user_id_list
+from provider.db import TelegramBotDBManager
+
+
+# 执行全部读取查询, 返回记录到的语句
+async def run_queries(engine) -> list[tuple[str, object]]:
+    with QueryRecorder(engine) as recorder:
+        await batch_get_user_in_user_id_list([1])
+        await batch_get_user_in_user_id_list([1, 2])
+        await get_session_id_by_name(1, 'name', 'gpt')
+        await is_exist_session(1, 'gpt', 'name')
+        await get_session_by_name(1, 'name', 'gpt')
+        await get_last_session(1, 'gpt')
+        await get_session_page(1, 'gpt', 5)
+        await get_session_page(1, 'gpt', 5, before_id=100, search='name')
+        await batch_get_session_in_id_collection([1, 2])
+        await batch_get_session_in_user_collection([1], factory='gpt', limit=501)
+        await batch_get_question_in_session_collection([1])
+        await get_latest_question(1)
+        await get_question_path(1, 1)
+        await batch_get_summary_question_in_parent_collection(1, [1, 2])
+        await batch_get_answer_in_session_collection([1])
+        await batch_get_answer_in_question_collection([1, 2])
+    return recorder.statements
+
+
+async def main() -> int:
+    engine = TelegramBotDBManager.get_engine()
+    try:
+        await Migrator(engine, MIGRATIONS).upgrade()
+        tables = {table.name for table in CORE_TABLES}
+        statements = await run_queries(engine)
+        failed = 0
+        for statement, parameters in statements:
+            scans = await find_full_scans(engine, statement, parameters, tables)
+            for scan in scans:
+                print(f'FULL SCAN {scan.table}: {scan.detail}\n  {" ".join(statement.split())}')
+            failed += len(scans)
+        print(f'checked {len(statements)} queries, {failed} full scans')
+        return 1 if failed > 0 else 0
+    finally:
+        await TelegramBotDBManager.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
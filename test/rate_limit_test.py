@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from util.rate_limit_util import (
+    MessageScheduler, TokenBucket, PRIORITY_FINAL, PRIORITY_REPLY, PRIORITY_EDIT,
+)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.consume(now)
+    # 令牌耗尽后按速率补充
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.25) == pytest.approx(0.25)
+    assert bucket.wait_time(now + 0.5) == pytest.approx(0)
+    # 补充不超过容量
+    assert bucket.is_idle(now + 10)
+    assert bucket.tokens == 3
+    # RetryAfter 冻结期间不可消费
+    bucket.block(4, now + 10)
+    assert bucket.wait_time(now + 11) == pytest.approx(3)
+    assert not bucket.is_idle(now + 11)
+
+
+# 私聊令牌桶: 突发容量用完后按速率发送
+def test_chat_rate():
+    async def main():
+        scheduler = MessageScheduler(private_rate=20, private_burst=2)
+        sent = []
+
+        async def send():
+            sent.append(time.monotonic())
+
+        begin = time.monotonic()
+        await asyncio.gather(*[scheduler.submit(1, send) for _ in range(4)])
+        await scheduler.shutdown()
+        assert len(sent) == 4
+        assert sent[1] - begin < 0.04
+        # 第 3, 4 条各需等待一个令牌 (0.05 秒)
+        assert sent[3] - begin >= 0.09
+
+    asyncio.run(main())
+
+
+# 按优先级派发, 同优先级先进先出
+def test_priority_order():
+    async def main():
+        scheduler = MessageScheduler(private_rate=50, private_burst=1)
+        order = []
+
+        def record(name: str):
+            async def send():
+                order.append(name)
+                return name
+            return send
+
+        results = await asyncio.gather(
+            scheduler.submit(1, record('edit'), PRIORITY_EDIT),
+            scheduler.submit(1, record('reply-1'), PRIORITY_REPLY),
+            scheduler.submit(1, record('final'), PRIORITY_FINAL),
+            scheduler.submit(1, record('reply-2'), PRIORITY_REPLY),
+        )
+        await scheduler.shutdown()
+        assert order == ['final', 'reply-1', 'reply-2', 'edit']
+        assert results == ['edit', 'reply-1', 'final', 'reply-2']
+
+    asyncio.run(main())
+
+
+# 同 key 的待发送编辑只保留最新的一个
+def test_coalesce_by_key():
+    async def main():
+        scheduler = MessageScheduler(private_rate=20, private_burst=1)
+        sent = []
+
+        def edit(text: str):
+            async def send():
+                sent.append(text)
+                return text
+            return send
+
+        results = await asyncio.gather(
+            scheduler.submit(1, edit('reply'), PRIORITY_REPLY),
+            scheduler.submit(1, edit('a'), PRIORITY_EDIT, key=(1, 10)),
+            scheduler.submit(1, edit('ab'), PRIORITY_EDIT, key=(1, 10)),
+            scheduler.submit(1, edit('abc'), PRIORITY_EDIT, key=(1, 10)),
+        )
+        await scheduler.shutdown()
+        assert sent == ['reply', 'abc']
+        assert results == ['reply', None, None, 'abc']
+
+    asyncio.run(main())
+
+
+# RetryAfter: 冻结会话后重新排队, 超过重试次数后抛出
+def test_retry_after():
+    async def main():
+        scheduler = MessageScheduler(private_rate=20, max_retries=2)
+        attempts = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RetryAfter(0.2)
+            return 'ok'
+
+        assert await scheduler.submit(1, flaky) == 'ok'
+        assert len(attempts) == 2
+        assert attempts[1] - attempts[0] >= 0.19
+
+        # 超过重试次数后抛出, 退避期间其他会话不受影响
+        blocked = []
+
+        async def flood():
+            blocked.append(time.monotonic())
+            raise RetryAfter(0.1)
+
+        async def other():
+            return time.monotonic()
+
+        async def send_later():
+            await asyncio.sleep(0.02)
+            return await scheduler.submit(3, other)
+
+        results = await asyncio.gather(scheduler.submit(2, flood), send_later(), return_exceptions=True)
+        await scheduler.shutdown()
+        assert isinstance(results[0], RetryAfter)
+        assert len(blocked) == 3
+        assert blocked[2] - blocked[0] >= 0.19
+        assert results[1] < blocked[1]
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from util.markdown_render_util import render_markdown
+from util.message_split_util import split_message
+from util.render_pool_util import RenderPool, RenderPoolConfig
+
+
+# 构造约 60KB、包含大量代码块的回复
+def build_answer(size: int = 60000) -> str:
+    blocks = []
+    length = 0
+    i = 0
+    while length < size:
+        if i % 3 == 0:
+            block = '```python\n' + '\n'.join(f'value_{j} = compute({j}) * 2  # step {j}' for j in range(20)) + '\n```'
+        else:
+            block = f'## Section {i}\n\nSome *markdown* text with `inline code`, [links](https://example.com) and (brackets). ' * 3
+        blocks.append(block)
+        length += len(block)
+        i += 1
+    return '\n\n'.join(blocks)
+
+
+def render_and_split(text: str) -> list:
+    return split_message(render_markdown(text))
+
+
+# 事件循环延迟探针: 每 tick 秒唤醒一次, 记录实际唤醒的最大延迟
+async def measure_lag(stop: asyncio.Event, tick: float = 0.005) -> float:
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(tick)
+        worst = max(worst, loop.time() - start - tick)
+    return worst
+
+
+async def bench(pool: RenderPool, text: str, rounds: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await pool.run(render_and_split, text)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await probe
+    return elapsed, lag
+
+
+async def main():
+    text = build_answer()
+    rounds = 5
+    print(f'answer size: {len(text)} chars, rounds: {rounds}')
+    for kind in ['inline', 'thread', 'process']:
+        pool = RenderPool(RenderPoolConfig(kind=kind, size=2, inline_limit=8000))
+        # 预热 (进程池启动)
+        await pool.run(render_and_split, text)
+        elapsed, lag = await bench(pool, text, rounds)
+        pool.shutdown()
+        print(f'{kind:>8}: total {elapsed * 1000:8.1f} ms, max event-loop lag {lag * 1000:8.1f} ms')
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
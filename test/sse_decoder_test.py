@@ -0,0 +1,73 @@
+from util.sse_util import SSEDecoder
+
+STREAM = (
+    ': keep-alive\n'
+    'event: message_start\n'
+    'data: {"text": "你好, 世界 😀"}\n'
+    '\n'
+    'data: first\n'
+    'data: second\n'
+    'id: 7\n'
+    '\n'
+    '{"error": "bare json"}\n'
+    'data: [DONE]\n'
+    '\n'
+).encode('utf-8')
+
+
+def decode(chunks: list[bytes]) -> list[tuple[str, bytes, str | None]]:
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return [(event.event, bytes(event.data), event.id) for event in events]
+
+
+EXPECTED = decode([STREAM])
+
+
+def test_events():
+    assert EXPECTED == [
+        ('message_start', '{"text": "你好, 世界 😀"}'.encode('utf-8'), None),
+        ('message', b'first\nsecond', '7'),
+        ('message', b'{"error": "bare json"}', None),
+        # 按规范 id 在后续事件中保持
+        ('message', b'[DONE]', '7'),
+    ]
+
+
+# 在任意位置切分 (包括行中间与 UTF-8 多字节字符中间)
+def test_split_anywhere():
+    for i in range(len(STREAM) + 1):
+        assert decode([STREAM[:i], STREAM[i:]]) == EXPECTED, i
+    assert decode([STREAM[i:i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+
+def test_line_endings():
+    for newline in [b'\r\n', b'\r']:
+        stream = STREAM.replace(b'\n', newline)
+        assert decode([stream]) == EXPECTED
+        for i in range(len(stream) + 1):
+            assert decode([stream[:i], stream[i:]]) == EXPECTED, (newline, i)
+
+
+# 单独的 \r 之后紧跟空行: \r\r 是两个换行, 不能与下一个 chunk 的 \n 合并成一个
+def test_lone_cr_then_lf():
+    assert decode([b'data: a\r', b'\n\ndata: b\r\r']) == [('message', b'a', None), ('message', b'b', None)]
+    assert decode([b'data: a\r', b'\r', b'\ndata: b\n\n']) == [('message', b'a', None), ('message', b'b', None)]
+
+
+def test_comments_only():
+    assert decode([b': ping\n\n: ping\r\n\r\n']) == []
+
+
+def test_flush_without_trailing_newline():
+    assert decode([b'data: tail']) == [('message', b'tail', None)]
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import Column, Integer, String, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import DeclarativeBase
+
+from db.config import DBConnConfig, DBPoolConfig, DBWriteConfig
+from db.engine import DBSessionManager
+from db.write_queue import WriteBehindQueue
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class TRow(Base):
+    __tablename__ = 't_row'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(50), nullable=False, unique=True)
+
+
+async def create_manager() -> DBSessionManager:
+    database = os.path.join(tempfile.mkdtemp(), 'write.db')
+    manager = DBSessionManager(DBPoolConfig(size=5, timeout=5, recycle=3600), DBConnConfig(limit=5),
+                               link=f'sqlite+aiosqlite:///{database}')
+    async with manager.get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return manager
+
+
+async def count_rows(manager: DBSessionManager) -> int:
+    async with manager.get_engine().connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(TRow))).scalar()
+
+
+# 并发提交的行在一个事务中批量写入, 主键回填
+def test_group_commit():
+    async def main():
+        manager = await create_manager()
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=200, max_delay=0.05, maxsize=1000))
+        futures = [await queue.submit(TRow(name=f'row-{i}')) for i in range(50)]
+        rows = await asyncio.gather(*futures)
+        assert queue.batches == 1
+        assert queue.rows == 50
+        assert len({row.id for row in rows}) == 50
+        assert await count_rows(manager) == 50
+        await queue.shutdown()
+        await manager.shutdown()
+
+    asyncio.run(main())
+
+
+# 攒够 max_rows 行即提交, 不等待 max_delay
+def test_batch_limit():
+    async def main():
+        manager = await create_manager()
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=10, max_delay=5, maxsize=1000))
+        futures = [await queue.submit(TRow(name=f'row-{i}')) for i in range(20)]
+        async with asyncio.timeout(1):
+            await asyncio.gather(*futures)
+        assert queue.batches == 2
+        assert await count_rows(manager) == 20
+        await queue.shutdown()
+        await manager.shutdown()
+
+    asyncio.run(main())
+
+
+# 批次失败时逐行重试, 只有坏行失败
+def test_failed_row():
+    async def main():
+        manager = await create_manager()
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=200, max_delay=0.05, maxsize=1000))
+        errors = []
+        futures = [await queue.submit(TRow(name=name), callback=lambda row, error: errors.append(error))
+                   for name in ['a', 'b', 'a', 'c']]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert [isinstance(result, IntegrityError) for result in results] == [False, False, True, False]
+        assert len([error for error in errors if error is not None]) == 1
+        assert queue.rows == 3 and queue.failed == 1
+        assert await count_rows(manager) == 3
+        await queue.shutdown()
+        await manager.shutdown()
+
+    asyncio.run(main())
+
+
+# flush() 等待已入队的行落库, shutdown() 排空队列后停止
+def test_flush_and_shutdown():
+    async def main():
+        manager = await create_manager()
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=200, max_delay=0.05, maxsize=1000))
+        futures = [await queue.submit(TRow(name=f'row-{i}')) for i in range(5)]
+        await queue.flush()
+        assert all(future.done() for future in futures)
+        assert await count_rows(manager) == 5
+        await queue.shutdown()
+
+        # 关闭时不等待凑批窗口, 立即写入剩余的行
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=200, max_delay=5, maxsize=1000))
+        futures = [await queue.submit(TRow(name=f'late-{i}')) for i in range(5)]
+        async with asyncio.timeout(1):
+            await queue.shutdown()
+        assert all(future.done() and future.exception() is None for future in futures)
+        assert await count_rows(manager) == 10
+        assert queue.queue is None
+        await manager.shutdown()
+
+    asyncio.run(main())
+
+
+# 借不到会话时整批以超时失败, 写入任务继续运行
+def test_pool_timeout():
+    async def main():
+        manager = await create_manager()
+        manager.configure(DBPoolConfig(size=1, timeout=0.05, recycle=3600), DBConnConfig(limit=1))
+        queue = WriteBehindQueue(manager, DBWriteConfig(max_rows=200, max_delay=0.01, maxsize=1000))
+        session = await manager.borrow_session()
+        futures = [await queue.submit(TRow(name=f'row-{i}')) for i in range(3)]
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.gather(*futures)
+        assert queue.failed == 3
+        await manager.return_session(session)
+        row = await (await queue.submit(TRow(name='after')))
+        assert row.id is not None
+        await queue.shutdown()
+        await manager.shutdown()
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    for name, case in list(globals().items()):
+        if name.startswith('test_'):
+            case()
+            print(f'{name} ok')
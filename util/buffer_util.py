@@ -0,0 +1,70 @@
+from typing import List
+
+
+# 回复内容缓冲区
+class AnswerBuffer:
+    """
+    追加式回复缓冲区
+    - 每个 token 只追加到分片列表, 不复制已有内容
+    - 缓存总长度与版本号, 渲染前可 O(1) 判断内容是否有变化
+    - text() 时才合并分片, 合并结果会被缓存直到下一次追加
+    """
+
+    def __init__(self, text: str = ''):
+        self._chunks: List[str] = []
+        self._length = 0
+        self.version = 0
+        if text:
+            self.append(text)
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return self.text()
+
+    def append(self, text: str):
+        if not text:
+            return
+        self._chunks.append(text)
+        self._length += len(text)
+        self.version += 1
+
+    # 清空内容 (版本号继续递增, 保证变化检测有效)
+    def clear(self):
+        self._chunks = []
+        self._length = 0
+        self.version += 1
+
+    def changed_since(self, version: int) -> bool:
+        return self.version != version
+
+    # 完整内容
+    def text(self) -> str:
+        chunks = self._chunks
+        if len(chunks) == 0:
+            return ''
+        if len(chunks) > 1:
+            self._chunks = [''.join(chunks)]
+        return self._chunks[0]
+
+    # 末尾 size 个字符
+    def tail(self, size: int) -> str:
+        if size <= 0:
+            return ''
+        if size >= self._length:
+            return self.text()
+        parts = []
+        collected = 0
+        for chunk in reversed(self._chunks):
+            parts.append(chunk)
+            collected += len(chunk)
+            if collected >= size:
+                break
+        return ''.join(reversed(parts))[-size:]
+
+    # 从 offset 开始到末尾的内容
+    def text_from(self, offset: int) -> str:
+        if offset <= 0:
+            return self.text()
+        return self.tail(self._length - offset)
@@ -0,0 +1,74 @@
+import os
+from typing import Callable
+
+
+# 流式编辑节奏配置
+class CadenceConfig:
+    def __init__(self, min_interval: float = 0.6, group_min_interval: float = 3.0, max_interval: float = 5.0,
+                 target_bytes: int = 300, rtt_factor: float = 2.0, pressure_factor: float = 2.0,
+                 smoothing: float = 0.3):
+        # 私聊最短编辑间隔 (秒)
+        self.min_interval = min_interval
+        # 群组最短编辑间隔 (秒), 群组限制约 20 条/分钟
+        self.group_min_interval = group_min_interval
+        # 最长编辑间隔 (秒)
+        self.max_interval = max_interval
+        # 期望每次编辑新增的字符数, 增长越慢编辑间隔越长
+        self.target_bytes = target_bytes
+        # 编辑间隔不低于上次编辑耗时的倍数
+        self.rtt_factor = rtt_factor
+        # 全局调度压力满载时编辑间隔的放大系数
+        self.pressure_factor = pressure_factor
+        # 指数平滑系数
+        self.smoothing = smoothing
+
+
+def read_cadence_config_from_system() -> CadenceConfig:
+    env = os.environ
+    return CadenceConfig(
+        min_interval=float(env.get("TELEGRAM_EDIT_MIN_INTERVAL", "0.6")),
+        group_min_interval=float(env.get("TELEGRAM_EDIT_GROUP_MIN_INTERVAL", "3.0")),
+        max_interval=float(env.get("TELEGRAM_EDIT_MAX_INTERVAL", "5.0")),
+        target_bytes=int(env.get("TELEGRAM_EDIT_TARGET_BYTES", "300")),
+        rtt_factor=float(env.get("TELEGRAM_EDIT_RTT_FACTOR", "2.0")),
+        pressure_factor=float(env.get("TELEGRAM_EDIT_PRESSURE_FACTOR", "2.0")),
+    )
+
+
+# 单回复自适应编辑节奏
+class CadenceController:
+    """
+    根据回复增长速度、编辑耗时、会话类型与全局调度压力计算下一次编辑间隔
+    - 增长慢的回复拉长间隔, 使每次编辑带来约 target_bytes 的新内容
+    - 增长快或已积累足够内容时收窄到会话类型允许的最短间隔
+    - 间隔不低于平滑后编辑耗时的 rtt_factor 倍, 避免编辑请求堆积
+    """
+
+    def __init__(self, config: CadenceConfig, chat_type: str = 'private', pressure: Callable[[], float] = None):
+        self.config = config
+        self.min_interval = config.min_interval
+        if chat_type in ['group', 'supergroup', 'channel']:
+            self.min_interval = config.group_min_interval
+        self.max_interval = max(config.max_interval, self.min_interval)
+        self.pressure = pressure
+        # 平滑后的增长速度 (字符/秒) 与编辑耗时 (秒)
+        self.rate: float | None = None
+        self.rtt: float | None = None
+
+    def observe(self, added: int, elapsed: float, rtt: float):
+        alpha = self.config.smoothing
+        if 0 < elapsed < float('inf'):
+            rate = added / elapsed
+            self.rate = rate if self.rate is None else alpha * rate + (1 - alpha) * self.rate
+        if rtt >= 0:
+            self.rtt = rtt if self.rtt is None else alpha * rtt + (1 - alpha) * self.rtt
+
+    def next_interval(self, pending: int = 0) -> float:
+        interval = self.min_interval
+        if pending < self.config.target_bytes and self.rate is not None and self.rate > 0:
+            interval = max(interval, self.config.target_bytes / self.rate)
+        if self.rtt is not None:
+            interval = max(interval, self.rtt * self.config.rtt_factor)
+        if self.pressure is not None:
+            interval *= 1 + self.pressure() * self.config.pressure_factor
+        return min(interval, self.max_interval)
@@ -0,0 +1,135 @@
+import os
+import re
+
+
+# 上下文窗口配置
+class ContextWindowConfig:
+    def __init__(self, default_budget: int = 8000, budgets: dict[str, int] = None, reserve: int = 1024,
+                 pin_first: bool = False, message_overhead: int = 4, image_tokens: int = 85):
+        # 未单独配置的模型的上下文 token 预算
+        self.default_budget = default_budget
+        # 按模型名前缀配置的预算, 最长前缀优先
+        self.budgets = budgets if budgets is not None else {}
+        # 为模型回复预留的 token 数
+        self.reserve = reserve
+        # 是否始终保留第一轮问答
+        self.pin_first = pin_first
+        # 每条消息的格式开销
+        self.message_overhead = message_overhead
+        # 每张图片按固定 token 数估算
+        self.image_tokens = image_tokens
+
+
+# 解析 "gpt-4o=120000,deepseek=60000" 格式的模型预算
+def parse_budgets(value: str) -> dict[str, int]:
+    budgets = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        name, budget = item.split('=', 1)
+        if name.strip() != '':
+            budgets[name.strip()] = int(budget)
+    return budgets
+
+
+def read_context_window_config_from_system() -> ContextWindowConfig:
+    env = os.environ
+    return ContextWindowConfig(
+        default_budget=int(env.get("TELEGRAM_CONTEXT_BUDGET", "8000")),
+        budgets=parse_budgets(env.get("TELEGRAM_CONTEXT_BUDGETS", "")),
+        reserve=int(env.get("TELEGRAM_CONTEXT_RESERVE", "1024")),
+        pin_first=env.get("TELEGRAM_CONTEXT_PIN_FIRST", "false").lower() in ['1', 'true', 'yes'],
+    )
+
+
+# 中日韩等宽字符
+WIDE_CHARS = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\U00020000-\U0002ffff]')
+
+
+# 估算文本 token 数: 中日韩字符约 1 token/字, 其他字符约 4 字符/token (与 cl100k 等 BPE 分词的统计结果接近)
+# 不缓存结果: 按文本缓存会长期持有完整回复, 且对文本取哈希的开销与估算本身相当
+def estimate_text_tokens(text: str) -> int:
+    wide = 0 if text.isascii() else len(WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+# 上下文窗口裁剪
+class ContextWindow:
+    """
+    在加载历史之后、构造请求体之前按模型 token 预算裁剪上下文
+    - system 消息始终保留, 可选保留第一轮问答
+    - 按轮 (user + assistant) 从最新往前保留, 直到预算用完
+    - 文本 token 数按字符类别估算, 不依赖远程分词器
+    """
+
+    def __init__(self, config: ContextWindowConfig):
+        self.config = config
+        self._budget_cache: dict[str, int] = {}
+        # 指标: 裁剪次数, 丢弃的消息数
+        self.trimmed = 0
+        self.dropped = 0
+
+    def budget(self, model: str) -> int:
+        budget = self._budget_cache.get(model)
+        if budget is not None:
+            return budget
+        budget = self.config.default_budget
+        matched = -1
+        for prefix, value in self.config.budgets.items():
+            if model.startswith(prefix) and len(prefix) > matched:
+                budget = value
+                matched = len(prefix)
+        self._budget_cache[model] = budget
+        return budget
+
+    def count_message(self, message: dict) -> int:
+        content = message.get('content')
+        tokens = self.config.message_overhead
+        if isinstance(content, str):
+            return tokens + estimate_text_tokens(content)
+        for item in content or []:
+            if item.get('type') == 'image_url':
+                tokens += self.config.image_tokens
+            elif item.get('text'):
+                tokens += estimate_text_tokens(item['text'])
+        return tokens
+
+    def count(self, messages: list[dict]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    # 按轮切分: 每轮从一条 user 消息开始
+    @staticmethod
+    def split_turns(messages: list[dict]) -> list[list[dict]]:
+        turns = []
+        for message in messages:
+            if message.get('role') == 'user' or len(turns) == 0:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return turns
+
+    def apply(self, messages: list[dict], model: str, prompt: str = '') -> list[dict]:
+        system = [message for message in messages if message.get('role') == 'system']
+        turns = self.split_turns([message for message in messages if message.get('role') != 'system'])
+        available = self.budget(model) - self.config.reserve - self.count(system) - \
+            self.config.message_overhead - estimate_text_tokens(prompt)
+        pinned = []
+        if self.config.pin_first and len(turns) > 0:
+            pinned = turns[0]
+            turns = turns[1:]
+            available -= self.count(pinned)
+        kept = []
+        for turn in reversed(turns):
+            tokens = self.count(turn)
+            if tokens > available:
+                break
+            available -= tokens
+            kept.append(turn)
+        if len(kept) == len(turns):
+            return messages
+        self.trimmed += 1
+        self.dropped += sum(len(turn) for turn in turns[:len(turns) - len(kept)])
+        result = system + pinned
+        for turn in reversed(kept):
+            result.extend(turn)
+        return result
@@ -1,64 +1,108 @@
-import asyncio
-import json
 from telegram import Update
 from telegram.ext import ContextTypes
-import httpx
 from multiprocessing import Value
+from provider.backend import BackendClient
+from util.json_util import loads, JSONDecodeError
 from util.lang_util import get_with_lang
+from util.sse_util import SSEDecoder, SSEEvent
+from util.stream_render_util import ReplyRenderer
 
 
 # 事件流处理
 async def stream_events(target: str, body: any, on_receive, on_error, update: Update,
-                        context: ContextTypes.DEFAULT_TYPE, state,
-                        lock: asyncio.Lock = asyncio.Lock(), save_lock: Value = Value('i', 0)):
+                        context: ContextTypes.DEFAULT_TYPE, state, save_lock: Value = None, on_retry=None):
+    if save_lock is None:
+        save_lock = Value('i', 0)
+    # 根据不同 api 风格进行处理 (openai / claude)
+    decode = decode_openai_event_stream
+    if state['factory'] == 'Claude':
+        decode = decode_claude_event_stream
+    # 每个回复 (每次请求) 只启动一个渲染任务, 事件流读取只负责投递增量
+    async def render(final: bool):
+        await on_receive(update, context, state, save_lock, final)
+
+    def start_renderer() -> ReplyRenderer:
+        started = ReplyRenderer(render, state['content'], state['cadence'])
+        started.start()
+        return started
+
+    renderer = start_renderer() if on_receive is not None else None
     retries = 3
-    for attempt in range(retries):
-        try:
-            async with httpx.AsyncClient(
-                    timeout=httpx.Timeout(timeout=300),
-                    headers={
-                        "Connection": "keep-alive",
-                        "Cache-control": "no-cache",
-                    },
-            ) as client:
+    completed = False
+    try:
+        for attempt in range(retries):
+            try:
+                # 复用应用级连接池, 避免每次请求重新建连
+                client = BackendClient.borrow_client()
                 async with client.stream("POST", target, json=body) as response:
-                    if on_receive is None:
+                    if renderer is None:
                         return
                     # 检查响应状态码
                     response.raise_for_status()
-                    # 循环读取数据流
-                    async for line in response.aiter_lines():
-                        # 过滤掉心跳行（通常会发送空行作为心跳）
-                        if line:
-                            # 根据不同 api 风格进行处理 (openai / claude)
-                            style = 'default'
-                            if state['factory'] == 'Claude':
-                                style = 'claude'
-                            if style == 'default':
-                                await decode_openai_event_stream(line, on_receive, on_error, update, context, state, lock, save_lock)
-                            else:
-                                if style == 'claude':
-                                    await decode_claude_event_stream(line, on_receive, on_error, update, context, state, lock, save_lock)
+                    # 按字节块增量解析事件流 (心跳/注释行由解析器过滤)
+                    decoder = SSEDecoder()
+                    async for chunk in response.aiter_bytes():
+                        for event in decoder.feed(chunk):
+                            await decode(event, renderer, on_error, update, context, state, save_lock)
+                    for event in decoder.flush():
+                        await decode(event, renderer, on_error, update, context, state, save_lock)
                     break
-        except Exception as e:
-            print(f"Request failed: {e}")
-            # 重试后仍然请求失败，执行错误处理
-            if attempt >= retries - 1:
-                user = update.message.from_user
-                error = {
-                    "message": get_with_lang('server_busy_or_error_reply', user.language_code),
-                }
-                await on_error(update, context, state, error, save_lock)
-                raise
-            state['content'] = ''
-            state['finish'] = False
+            except Exception as e:
+                print(f"Request failed: {e}")
+                # 重试后仍然请求失败，执行错误处理
+                if attempt >= retries - 1:
+                    # 先停止渲染, 避免部分内容覆盖错误回复
+                    if renderer is not None:
+                        await renderer.cancel()
+                    user = update.message.from_user
+                    error = {
+                        "message": get_with_lang('server_busy_or_error_reply', user.language_code),
+                    }
+                    await on_error(update, context, state, error, save_lock)
+                    raise
+                if renderer is not None:
+                    # 停止失败请求的渲染任务, 由 on_retry 清理已发出的消息后以新的渲染任务重新输出
+                    await renderer.cancel()
+                    state['content'].clear()
+                    state['finish'] = False
+                    state['live_offset'] = 0
+                    state['live_prefix'] = ''
+                    if on_retry is not None:
+                        await on_retry(update, context, state)
+                    renderer = start_renderer()
+        completed = True
+    finally:
+        # 只有成功时才执行最终渲染 (并保存回复), 失败时已由 on_error 回复
+        if renderer is not None:
+            if completed:
+                state['finish'] = True
+                await renderer.finish()
+            else:
+                await renderer.cancel()
 
 
-async def decode_openai_event_stream(line, on_receive, on_error, update, context, state, lock, save_lock):
-    decoded_line = line
-    decoded_line = decoded_line.replace('data: ', '')
+# 解析事件 data 中的 json, 兼容多行 data 中每行一个 json 的情况
+def decode_event_json(data: bytes) -> list:
     try:
-        chunk = json.loads(decoded_line)
+        return [loads(data)]
+    except JSONDecodeError:
+        if b'\n' not in data:
+            raise
+    return [loads(line) for line in data.split(b'\n') if line]
+
+
+async def decode_openai_event_stream(event: SSEEvent, renderer: ReplyRenderer, on_error, update, context, state, save_lock):
+    data = event.data
+    if data.strip() == b'[DONE]':
+        state['finish'] = True
+        await renderer.finish()
+        return
+    try:
+        chunks = decode_event_json(data)
+    except JSONDecodeError:
+        print(f'no a regular json content, ignore: {data}')
+        return
+    for chunk in chunks:
         finished = None
         # 错误处理
         error = chunk.get('error', None)
@@ -67,74 +111,95 @@ async def decode_openai_event_stream(line, on_receive, on_error, update, context
                 await on_error(update, context, state, error, save_lock)
             return
         for choice in chunk.get('choices', []):
-            reasoning_content: str = choice. \
-                get('delta', {}). \
-                get('reasoning_content', None)
-            content: str = choice. \
-                get('delta', {}). \
-                get('content', '')
+            delta = choice.get('delta') or {}
+            reasoning_content: str = delta.get('reasoning_content', None)
+            content: str = delta.get('content', '')
             finished = choice.get('finish_reason', None)
             # 深度思考兼容
-            if reasoning_content is not None and len(reasoning_content) > 0:
-                reasoning_content = reasoning_content. \
-                    replace('\"', '"'). \
-                    replace('\t', '  '). \
-                    replace('\n', '\n> ')
-                if len(state['content']) == 0:
+            if reasoning_content:
+                if '\t' in reasoning_content:
+                    reasoning_content = reasoning_content.replace('\t', '  ')
+                if '\n' in reasoning_content:
+                    reasoning_content = reasoning_content.replace('\n', '\n> ')
+                if renderer.pushed == 0:
                     user = update.message.from_user
                     reasoning_content = \
                         get_with_lang('deepthink_prefix', user.language_code) + \
                         reasoning_content
-                state['content'] += reasoning_content
-                await on_receive(update, context, state, lock, save_lock)
+                await renderer.push(reasoning_content)
             # 普通模型 content 传参
-            else:
-                if content is not None and len(content) > 0:
-                    content = content. \
-                        replace('\"', '"'). \
-                        replace('\t', '  ')
-                    state['content'] += content
-                    await on_receive(update, context, state, lock, save_lock)
+            elif content:
+                if '\t' in content:
+                    content = content.replace('\t', '  ')
+                await renderer.push(content)
         if finished is not None:
             state['finish'] = True
-            asyncio.create_task(on_receive(update, context, state, lock, save_lock))
-    except json.JSONDecodeError:
-        if "[DONE]" in str(decoded_line):
-            state['finish'] = True
-            await asyncio.create_task(on_receive(update, context, state, lock, save_lock))
-        else:
-            print(f'no a regular json content, ignore: {decoded_line}')
+            await renderer.finish()
 
 
-async def decode_claude_event_stream(line, on_receive, on_error, update, context, state, lock, save_lock):
-    # 解码并打印事件数据
-    decoded_line = line
-    if 'data: ' not in decoded_line:
-        print(f'no data chunk found, ignore: {decoded_line}')
+async def decode_claude_event_stream(event: SSEEvent, renderer: ReplyRenderer, on_error, update, context, state, save_lock):
+    # 心跳事件无需解析
+    if event.event == 'ping':
         return
-    decoded_line = decoded_line.replace('data: ', '')
+    data = event.data
     try:
-        chunk = json.loads(decoded_line)
+        chunks = decode_event_json(data)
+    except JSONDecodeError:
+        if b'"message_stop"' in data:
+            state['finish'] = True
+            await renderer.finish()
+        else:
+            print(f'no a regular json content, ignore: {data}')
+        return
+    for chunk in chunks:
         # 错误处理
         error = chunk.get('error', None)
         if error is not None:
             if on_error is not None:
                 await on_error(update, context, state, error, save_lock)
             return
-        msgType: str = chunk.get('type', '')
-        if msgType != 'content_block_delta':
-            print(f'not a content delta, ignore: {chunk}')
-            if msgType == 'message_stop':
+        msg_type: str = chunk.get('type', '')
+        if msg_type != 'content_block_delta':
+            if msg_type == 'message_stop':
                 state['finish'] = True
-                asyncio.create_task(on_receive(update, context, state, lock, save_lock))
-            return
-        content = chunk.get('delta', {}).get('text', {})
-        if len(content) > 0:
-            state['content'] += content
-            await on_receive(update, context, state, lock, save_lock)
-    except json.JSONDecodeError:
-        if "\"message_stop\"" in str(decoded_line):
-            state['finish'] = True
-            await asyncio.create_task(on_receive(update, context, state, lock, save_lock))
-        else:
-            print(f'no a regular json content, ignore: {decoded_line}')
+                await renderer.finish()
+            continue
+        content = (chunk.get('delta') or {}).get('text', '')
+        if content:
+            await renderer.push(content)
+
+
+# 以非交互方式读取完整事件流回复文本 (用于后台任务, 不渲染到消息)
+async def collect_stream_text(target: str, body: any, factory: str) -> str:
+    client = BackendClient.borrow_client()
+    texts = []
+    decoder = SSEDecoder()
+    async with client.stream("POST", target, json=body) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            for event in decoder.feed(chunk):
+                texts.extend(event_texts(event, factory))
+        for event in decoder.flush():
+            texts.extend(event_texts(event, factory))
+    return ''.join(texts)
+
+
+def event_texts(event: SSEEvent, factory: str) -> list[str]:
+    if event.event == 'ping' or event.data.strip() == b'[DONE]':
+        return []
+    try:
+        chunks = decode_event_json(event.data)
+    except JSONDecodeError:
+        return []
+    result = []
+    for chunk in chunks:
+        error = chunk.get('error', None)
+        if error is not None:
+            raise RuntimeError(f'backend error: {error}')
+        if factory == 'Claude':
+            if chunk.get('type', '') == 'content_block_delta':
+                result.append((chunk.get('delta') or {}).get('text', ''))
+            continue
+        for choice in chunk.get('choices', []):
+            result.append((choice.get('delta') or {}).get('content') or '')
+    return result
@@ -0,0 +1,21 @@
+import json
+
+# 可选的高性能 json 后端
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+
+# 解析 json (支持 str / bytes), 优先使用 orjson
+def loads(data: str | bytes | bytearray | memoryview):
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
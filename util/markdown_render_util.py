@@ -0,0 +1,89 @@
+import telegramify_markdown
+from provider.render import MarkdownRenderPool
+
+FENCE = '```'
+
+
+# 使用 telegram_markdown 解析包转义 markdown 到 markdownV2
+def render_markdown(content: str) -> str:
+    return telegramify_markdown.markdownify(
+        content,
+        max_line_length=None,
+        normalize_whitespace=False
+    )
+
+
+# 在渲染池中渲染 (小输入内联执行)
+async def render_markdown_async(content: str) -> str:
+    return await MarkdownRenderPool.run(render_markdown, content)
+
+
+# 增量 MarkdownV2 渲染器
+class IncrementalMarkdownRenderer:
+    """
+    面向追加式文本的增量渲染
+    - 缓存到最后一个稳定块边界 (代码块外的空行, 或代码块结束行) 为止的渲染结果
+    - 每次只重新渲染边界之后仍在增长的部分
+    - 输入不再以已缓存的前缀开头时自动重置
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # 已缓存渲染结果对应的源文本
+        self.source = ''
+        self.rendered = ''
+        # 已扫描到的位置 (只扫描完整的行) 与该位置是否处于代码块内
+        self._scan = 0
+        self._fence = False
+        # 最后一个稳定块边界
+        self._stable = 0
+
+    def _advance(self, text: str):
+        pos = self._scan
+        while True:
+            end = text.find('\n', pos)
+            if end < 0:
+                break
+            line = text[pos:end]
+            if line.lstrip().startswith(FENCE):
+                self._fence = not self._fence
+                if not self._fence:
+                    self._stable = end + 1
+            elif not self._fence and line.strip() == '':
+                self._stable = end + 1
+            pos = end + 1
+        self._scan = pos
+
+    def _prepare(self, text: str) -> tuple[int, str | None]:
+        if len(text) < self._scan or not text.startswith(self.source):
+            self.reset()
+        self._advance(text)
+        cached = len(self.source)
+        if self._stable > cached:
+            return cached, text[cached:self._stable]
+        return cached, None
+
+    def _commit(self, text: str, rendered: str):
+        self.rendered += rendered
+        self.source = text[:self._stable]
+
+    def render(self, text: str) -> str:
+        cached, block = self._prepare(text)
+        if block is not None:
+            self._commit(text, render_markdown(block))
+            cached = self._stable
+        if cached == len(text):
+            return self.rendered
+        return self.rendered + render_markdown(text[cached:])
+
+    # 同 render, 大块内容在渲染池中执行
+    async def render_async(self, text: str) -> str:
+        cached, block = self._prepare(text)
+        if block is not None:
+            self._commit(text, await render_markdown_async(block))
+            cached = self._stable
+        if cached == len(text):
+            return self.rendered
+        return self.rendered + await render_markdown_async(text[cached:])
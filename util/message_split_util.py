@@ -0,0 +1,179 @@
+from collections import deque
+from typing import List
+
+# Telegram 单条消息长度上限 (UTF-16 编码单元)
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+FENCE = '```'
+
+
+# Telegram 按 UTF-16 编码单元计算消息长度 (BMP 以外字符占 2 个单元)
+def utf16_len(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _char_units(ch: str) -> int:
+    return 2 if ord(ch) > 0xFFFF else 1
+
+
+def _is_fence(line: str) -> bool:
+    return line.lstrip().startswith(FENCE)
+
+
+# 是否含有代码块标记以外的内容
+def _has_content(body: str) -> bool:
+    return any(line.strip() and not _is_fence(line) for line in body.splitlines())
+
+
+# end 是否落在转义序列中间 (前面有奇数个连续的 \)
+def _inside_escape(line: str, start: int, end: int) -> bool:
+    count = 0
+    while end - count > start and line[end - count - 1] == '\\':
+        count += 1
+    return count % 2 == 1
+
+
+# 把超长的单行切成不超过 limit 的若干段 (不拆分代理对, 不在转义符 \ 后断开)
+def _hard_split(line: str, limit: int) -> List[str]:
+    pieces = []
+    start = 0
+    units = 0
+    for i, ch in enumerate(line):
+        width = _char_units(ch)
+        if units + width > limit:
+            end = i
+            if end - start > 1 and _inside_escape(line, start, end):
+                end -= 1
+            pieces.append(line[start:end])
+            start = end
+            units = utf16_len(line[start:i])
+        units += width
+    if start < len(line):
+        pieces.append(line[start:])
+    return pieces
+
+
+# 拆分消息
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    按 Telegram 实际长度 (UTF-16 编码单元, 对 MarkdownV2 文本即转义后的长度) 拆分消息
+    - 优先在段落 (空行) 处断开, 其次在行尾断开, 单行超长时按字符硬切
+    - 在代码块内部断开时补全结束标记, 并在下一段以原始开始行 (含语言) 重新打开代码块
+    """
+    if utf16_len(text) <= limit:
+        return [text] if text else []
+    closing = '\n' + FENCE
+    parts: List[str] = []
+    lines = deque(text.splitlines(keepends=True))
+    current: List[str] = []
+    size = 0
+    fence_opener: str | None = None
+    # 当前段中最后一个段落边界 (代码块外的空行之后) 的位置
+    boundary = -1
+    boundary_size = 0
+
+    def flush(cut: int):
+        nonlocal current, size, boundary, boundary_size
+        body = ''.join(current[:cut])
+        rest = current[cut:]
+        if fence_opener is not None and cut == len(current):
+            body = body.rstrip('\n') + closing
+        if _has_content(body):
+            parts.append(body)
+        current = []
+        size = 0
+        boundary = -1
+        boundary_size = 0
+        return rest
+
+    while lines:
+        line = lines.popleft()
+        units = utf16_len(line)
+        # 加入该行后代码块仍打开 (包括该行打开代码块) 时预留结束标记
+        opened = fence_opener is not None
+        if _is_fence(line):
+            opened = not opened
+        reserve = len(closing) if opened else 0
+        if size + units + reserve > limit and current:
+            if fence_opener is None and boundary > 0 and boundary_size * 2 >= limit:
+                # 在段落边界断开, 边界后的行放回待处理队列 (边界处必然在代码块外)
+                lines.appendleft(line)
+                lines.extendleft(reversed(flush(boundary)))
+                continue
+            flush(len(current))
+            if fence_opener is not None:
+                current.append(fence_opener)
+                size = utf16_len(fence_opener)
+        if size + units + reserve > limit:
+            # 单行超长, 硬切后逐段处理
+            pieces = _hard_split(line, max(1, limit - size - reserve))
+            if len(pieces) > 1:
+                lines.extendleft(reversed(pieces))
+                continue
+        current.append(line)
+        size += units
+        if _is_fence(line):
+            fence_opener = line if fence_opener is None else None
+        elif fence_opener is None and line.strip() == '' and len(current) > 1:
+            boundary = len(current)
+            boundary_size = size
+    if current:
+        body = ''.join(current)
+        if fence_opener is not None:
+            body = body.rstrip('\n') + closing
+        if _has_content(body):
+            parts.append(body)
+    return parts
+
+
+# 取末尾不超过 limit 的内容, 尽量从完整的行开始
+def tail_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> str:
+    if utf16_len(text) <= limit:
+        return text
+    tail = text[-limit:]
+    excess = utf16_len(tail) - limit
+    start = 0
+    while excess > 0:
+        excess -= _char_units(tail[start])
+        start += 1
+    newline = tail.find('\n', start)
+    if 0 <= newline < start + limit // 4:
+        start = newline + 1
+    return tail[start:]
+
+
+# 计算流式消息的封存位置
+def find_seal_point(text: str, limit: int, fence_opener: str | None = None) -> tuple[int, str | None]:
+    """
+    在 text 中找到不超过 limit (预留代码块结束标记) 的断开位置
+    - 优先段落边界, 其次行尾, 都没有时按字符硬切
+    - fence_opener 为 text 开始时已打开的代码块开始行
+    返回 (断开位置, 断开处仍打开的代码块开始行或 None)
+    """
+    reserve = len(FENCE) + 1
+    size = 0
+    pos = 0
+    line_cut, line_opener = 0, fence_opener
+    boundary, boundary_size = 0, 0
+    opener = fence_opener
+    for line in text.splitlines(keepends=True):
+        units = utf16_len(line)
+        if size + units + reserve > limit:
+            break
+        size += units
+        pos += len(line)
+        if _is_fence(line):
+            opener = line if opener is None else None
+        elif opener is None and line.strip() == '':
+            boundary, boundary_size = pos, size
+        if line.endswith('\n'):
+            line_cut, line_opener = pos, opener
+    if boundary > 0 and boundary_size * 2 >= limit:
+        return boundary, None
+    if line_cut > 0:
+        return line_cut, line_opener
+    # 没有可用的换行, 硬切
+    pieces = _hard_split(text, max(1, limit - reserve))
+    return len(pieces[0]), fence_opener
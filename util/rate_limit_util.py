@@ -0,0 +1,234 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Hashable, List
+
+from telegram.error import RetryAfter
+
+# 发送优先级 (数值越小越优先)
+PRIORITY_FINAL = 0
+PRIORITY_REPLY = 1
+PRIORITY_EDIT = 2
+
+
+# 令牌桶
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # RetryAfter 退避截止时间
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    # 距离可以消费一个令牌还需等待的秒数
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        wait = 0.0
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class _Job:
+    def __init__(self, seq: int, chat_id: int, call: Callable[[], Awaitable], priority: int,
+                 key: Hashable | None, future: asyncio.Future):
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.priority = priority
+        self.key = key
+        self.future = future
+        self.attempts = 0
+
+
+# 全局消息发送调度器
+class MessageScheduler:
+    """
+    Telegram Bot API 出站调度
+    - 全局令牌桶 (默认 30 条/秒) + 每个会话的令牌桶 (私聊默认 1 条/秒, 群组默认 20 条/分钟)
+    - 按优先级派发: 最终渲染 > 普通回复 > 流式中间编辑, 同优先级先进先出
+    - 相同 key 的待发送任务 (如同一条消息的编辑) 只保留最新的一个, 被替换的任务返回 None
+    - 遇到 RetryAfter 时冻结对应会话的令牌桶并重新排队
+    """
+
+    def __init__(self, global_rate: float = 30, private_rate: float = 1, private_burst: float = 3,
+                 group_rate: float = 20 / 60, group_burst: float = 3, max_retries: int = 3,
+                 max_buckets: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._jobs: List[_Job] = []
+        self._keys: dict[Hashable, _Job] = {}
+        self._seq = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    # 当前排队压力 (排队任务数 / 全局每秒容量, 上限 1)
+    def pressure(self) -> float:
+        if len(self._jobs) == 0:
+            return 0.0
+        return min(1.0, len(self._jobs) / max(1.0, self.global_bucket.rate))
+
+    def queued(self) -> int:
+        return len(self._jobs)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # 群组/频道 id 为负数
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            self._buckets[chat_id] = bucket
+            self._evict_buckets()
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    # 淘汰长期空闲的会话令牌桶
+    def _evict_buckets(self):
+        if len(self._buckets) <= self.max_buckets:
+            return
+        now = time.monotonic()
+        for chat_id in list(self._buckets.keys()):
+            if len(self._buckets) <= self.max_buckets:
+                break
+            if self._buckets[chat_id].is_idle(now):
+                del self._buckets[chat_id]
+
+    async def submit(self, chat_id: int, call: Callable[[], Awaitable], priority: int = PRIORITY_REPLY,
+                     key: Hashable | None = None) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._seq += 1
+        job = _Job(self._seq, chat_id, call, priority, key, future)
+        if key is not None:
+            old = self._keys.get(key)
+            if old is not None:
+                # 新任务覆盖尚未派发的旧任务
+                self._jobs.remove(old)
+                job.priority = min(job.priority, old.priority)
+                if not old.future.done():
+                    old.future.set_result(None)
+            self._keys[key] = job
+        self._jobs.append(job)
+        self._ensure_worker()
+        self._wakeup.set()
+        return await future
+
+    def _ensure_worker(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    # 选出可以立即派发的最高优先级任务, 否则返回最短等待时间
+    def _pick(self, now: float) -> tuple[_Job | None, float | None]:
+        global_wait = self.global_bucket.wait_time(now)
+        best: _Job | None = None
+        min_wait: float | None = None
+        for job in self._jobs:
+            wait = max(global_wait, self._bucket(job.chat_id).wait_time(now))
+            if wait <= 0:
+                if best is None or (job.priority, job.seq) < (best.priority, best.seq):
+                    best = job
+            elif min_wait is None or wait < min_wait:
+                min_wait = wait
+        return best, min_wait
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                try:
+                    async with asyncio.timeout(wait):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            self._jobs.remove(job)
+            if job.key is not None and self._keys.get(job.key) is job:
+                del self._keys[job.key]
+            if job.future.done():
+                continue
+            self.global_bucket.consume(now)
+            self._bucket(job.chat_id).consume(now)
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job: _Job):
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            print(f'flood control on chat {job.chat_id}, retry after {retry_after}s')
+            self._bucket(job.chat_id).block(float(retry_after), time.monotonic())
+            if job.attempts > self.max_retries:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            self._requeue(job)
+            return
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _requeue(self, job: _Job):
+        if job.key is not None:
+            newer = self._keys.get(job.key)
+            if newer is not None:
+                # 已有更新的同 key 任务, 旧任务无需重发
+                if not job.future.done():
+                    job.future.set_result(None)
+                return
+            self._keys[job.key] = job
+        self._jobs.append(job)
+        self._wakeup.set()
+
+    async def shutdown(self):
+        task = self._task
+        self._task = None
+        if task is not None:
+            task.cancel()
+        for job in self._jobs:
+            if not job.future.done():
+                job.future.cancel()
+        self._jobs = []
+        self._keys = {}
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
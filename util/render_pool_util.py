@@ -0,0 +1,74 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+from util.value_util import get_env_or_default
+
+T = TypeVar('T')
+
+
+# 渲染线程/进程池配置
+class RenderPoolConfig:
+    def __init__(self, kind: str = 'process', size: int = 2, inline_limit: int = 8000):
+        # 池类型: process / thread / inline (不卸载)
+        self.kind = kind
+        self.size = size
+        # 输入长度小于该值时直接在事件循环中执行
+        self.inline_limit = inline_limit
+
+
+def read_render_pool_config_from_system() -> RenderPoolConfig:
+    return RenderPoolConfig(
+        kind=get_env_or_default("TELEGRAM_RENDER_POOL", "process"),
+        size=int(get_env_or_default("TELEGRAM_RENDER_POOL_SIZE", "2")),
+        inline_limit=int(get_env_or_default("TELEGRAM_RENDER_INLINE_LIMIT", "8000")),
+    )
+
+
+# 渲染任务卸载池
+class RenderPool:
+    """
+    把 CPU 密集的 markdown 渲染/消息拆分移出事件循环
+    - 小输入直接内联执行, 避免跨进程序列化开销
+    - 大输入提交到进程池 (forkserver 启动, 或线程池) 执行, 进程池损坏时重建并本次内联执行
+    """
+
+    def __init__(self, config: RenderPoolConfig):
+        self.config = config
+        self.executor: Executor | None = None
+
+    def _executor(self) -> Executor | None:
+        if self.config.kind == 'inline' or self.config.size <= 0:
+            return None
+        if self.executor is None:
+            if self.config.kind == 'thread':
+                self.executor = ThreadPoolExecutor(max_workers=self.config.size, thread_name_prefix='render')
+            else:
+                # 事件循环进程中已有 httpx / aiosqlite / 租约续期等线程, fork 可能复制持有中的锁,
+                # 子进程改由 forkserver 启动
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.config.size, mp_context=multiprocessing.get_context('forkserver'))
+        return self.executor
+
+    async def run(self, fn: Callable[[str], T], text: str) -> T:
+        if len(text) < self.config.inline_limit:
+            return fn(text)
+        executor = self._executor()
+        if executor is None:
+            return fn(text)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, fn, text)
+        except BrokenProcessPool:
+            print('render pool broken, recreate')
+            self.executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            return fn(text)
+
+    def shutdown(self):
+        executor = self.executor
+        self.executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+import re
+from typing import List
+
+# 行结束符: \r\n, \n 或单独的 \r
+LINE_END = re.compile(rb'\r\n|\r|\n')
+
+
+# 事件流 (SSE) 事件
+class SSEEvent:
+    def __init__(self, event: str = 'message', data: bytes = b'', id: str | None = None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self):
+        return f'SSEEvent(event={self.event!r}, data={bytes(self.data)!r})'
+
+
+# 增量事件流解析器
+class SSEDecoder:
+    """
+    按字节块增量解析 text/event-stream
+    - 支持 \\n, \\r\\n 与单独的 \\r 换行, 跨 chunk 的半行会被缓存到下一次 feed
+    - chunk 以 \\r 结尾时立即结束该行, 下一个 chunk 开头的 \\n 视为同一个换行
+    - 支持 event: / data: / id: 字段与多行 data (以 \\n 拼接)
+    - 兼容不带 data: 前缀的裸 json 行 (部分后端直接输出错误 json)
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._event = None
+        self._data: List[bytes] = []
+        self._id = None
+        # 上一个 chunk 以 \r 结尾, 需跳过紧随的 \n
+        self._skip_lf = False
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        events = []
+        if not chunk:
+            return events
+        if self._skip_lf:
+            self._skip_lf = False
+            if chunk[:1] == b'\n':
+                chunk = chunk[1:]
+        self._buffer += chunk
+        buffer = self._buffer
+        start = 0
+        while True:
+            match = LINE_END.search(buffer, start)
+            if match is None:
+                break
+            event = self._process_line(bytes(buffer[start:match.start()]))
+            if event is not None:
+                events.append(event)
+            start = match.end()
+            if match.group() == b'\r' and start == len(buffer):
+                self._skip_lf = True
+        if start > 0:
+            del buffer[:start]
+        return events
+
+    # 流结束时处理残留数据
+    def flush(self) -> List[SSEEvent]:
+        events = []
+        self._skip_lf = False
+        if len(self._buffer) > 0:
+            line = bytes(self._buffer)
+            self._buffer.clear()
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: bytes) -> SSEEvent | None:
+        # 空行: 派发事件
+        if not line:
+            return self._dispatch()
+        # 注释行 (心跳)
+        if line[0] == 0x3A:
+            return None
+        # 裸 json 行, 直接作为独立事件派发
+        if line[0] == 0x7B and not self._data:
+            return SSEEvent(data=line)
+        colon = line.find(b':')
+        if colon < 0:
+            field = line
+            value = b''
+        else:
+            field = line[:colon]
+            value = line[colon + 1:]
+            if value[:1] == b' ':
+                value = value[1:]
+        if field == b'data':
+            self._data.append(value)
+        elif field == b'event':
+            self._event = value.decode('utf-8', errors='replace')
+        elif field == b'id':
+            self._id = value.decode('utf-8', errors='replace')
+        return None
+
+    def _dispatch(self) -> SSEEvent | None:
+        if not self._data:
+            self._event = None
+            return None
+        if len(self._data) == 1:
+            data = self._data[0]
+        else:
+            data = b'\n'.join(self._data)
+        event = SSEEvent(
+            event=self._event if self._event else 'message',
+            data=data,
+            id=self._id,
+        )
+        self._event = None
+        self._data = []
+        return event
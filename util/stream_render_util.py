@@ -0,0 +1,103 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from util.buffer_util import AnswerBuffer
+from util.cadence_util import CadenceController
+
+
+# 单回复渲染管线
+class ReplyRenderer:
+    """
+    流式回复的生产者/消费者管线
+    - 事件流读取方通过 push() 把增量写入有界队列 (队列满时反压读取方)
+    - 每个回复只有一个 run() 渲染任务, 合并队列中的增量后按 CadenceController 给出的间隔触发一次编辑
+    - finish() 之后渲染任务排空队列并执行最终渲染, cancel() 停止渲染任务且不执行最终渲染
+    """
+
+    def __init__(self, on_render: Callable[[bool], Awaitable], buffer: AnswerBuffer,
+                 cadence: CadenceController, maxsize: int = 256):
+        self.on_render = on_render
+        self.buffer = buffer
+        self.cadence = cadence
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # 已推送字符数 (含尚未被渲染任务消费的部分)
+        self.pushed = 0
+        self.renders = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def push(self, text: str):
+        if not text:
+            return
+        self.pushed += len(text)
+        await self.queue.put(text)
+
+    # 结束推送并等待最终渲染完成
+    async def finish(self):
+        task = self._task
+        if task is None or task.done():
+            return
+        await self.queue.put(None)
+        await task
+
+    # 放弃回复 (请求失败), 不再渲染
+    async def cancel(self):
+        task = self._task
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _render(self, final: bool):
+        try:
+            await self.on_render(final)
+            self.renders += 1
+        except Exception as e:
+            print(f'render reply failed: {e}')
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_render = float('-inf')
+        pending = 0
+        finished = False
+        while not finished:
+            # 没有待渲染内容时无限期等待, 否则等到下一次编辑时间
+            deadline = None
+            if pending > 0:
+                deadline = last_render + self.cadence.next_interval(pending)
+            item = None
+            got = False
+            try:
+                async with asyncio.timeout_at(deadline):
+                    item = await self.queue.get()
+                    got = True
+            except TimeoutError:
+                pass
+            # 合并队列中已到达的增量
+            while got:
+                if item is None:
+                    finished = True
+                    break
+                self.buffer.append(item)
+                pending += len(item)
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    got = False
+            if finished or pending == 0:
+                continue
+            now = loop.time()
+            if now - last_render >= self.cadence.next_interval(pending):
+                await self._render(False)
+                done = loop.time()
+                self.cadence.observe(pending, now - last_render, done - now)
+                last_render = done
+                pending = 0
+        await self._render(True)
@@ -1,5 +1,14 @@
+import os
 
 def set_or_default(value, default):
     if value is None:
         return default
     return value
+
+
+# 读取环境变量, 未设置或为空时返回默认值
+def get_env_or_default(key: str, default: str) -> str:
+    value = os.environ.get(key)
+    if value is None or value == '':
+        return default
+    return value